@@ -0,0 +1,47 @@
+"""Crash safe file writes. The new content goes to a temp file next to the
+target, is fsynced and then renamed over it, so a reader (or the next run)
+sees the old file or the new one, never half of one"""
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+
+@contextmanager
+def atomic_open(path, mode="w", encoding="utf-8", newline=None):
+    """File to write the new content of path to, swapped in on success"""
+    path = Path(path)
+    temp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    encoding = None if "b" in mode else encoding
+    try:
+        with temp.open(
+            mode=mode, encoding=encoding, newline=newline
+        ) as file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp, path)
+    except BaseException:
+        temp.unlink(missing_ok=True)
+        raise
+    sync_folder(path.parent)
+
+
+def sync_folder(folder):
+    """fsync a folder so a rename in it survives a power cut"""
+    try:
+        handle = os.open(folder, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(handle)
+    except OSError:
+        # * not every platform can fsync a folder
+        pass
+    finally:
+        os.close(handle)
+
+
+def write_text(path, text, encoding="utf-8"):
+    """Replace a file's text in one step"""
+    with atomic_open(path, encoding=encoding) as file:
+        file.write(text)
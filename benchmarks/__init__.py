@@ -0,0 +1 @@
+"""Benchmarks run against saved Yahoo Finance fixture pages"""
@@ -0,0 +1,89 @@
+"""Pages/sec and peak RSS of the HTTP backend against the browser backend
+on the saved fixture pages:
+
+    python -m benchmarks.bench_backends --pages 200
+"""
+import argparse
+import time
+
+from playwright.sync_api import sync_playwright
+from rich import print
+
+import http_fetch
+import navigation
+import quarterly_data
+import scrap_yahoo_finance as yahoo
+from benchmarks.fixture_server import serve
+from benchmarks.rss import PeakRss
+
+# * page type -> (url, selectors, parser)
+PAGES = {
+    "profile": (
+        "/quote/{}/profile?p={}",
+        ["div[data-test='qsp-profile']"],
+        lambda stock, html: yahoo.parse_profile(html),
+    ),
+    "summary": (
+        "/quote/{}?p={}",
+        ["div#quote-header-info", "div#quote-summary"],
+        yahoo.parse_summary,
+    ),
+    "stats": (
+        "/quote/{}/key-statistics?p={}",
+        ["div#Main"],
+        lambda stock, html: quarterly_data.parse_stats(html),
+    ),
+}
+
+
+def run_http(base_url, stocks):
+    """Fetch and parse every page with the pooled HTTP client"""
+    for stock in stocks:
+        for url, selectors, parser in PAGES.values():
+            url = base_url + url.format(stock, stock)
+            parser(stock, *http_fetch.fetch_fragments(url, selectors))
+    http_fetch.close_client()
+
+
+def run_browser(base_url, stocks):
+    """Fetch and parse every page with Chromium"""
+    with sync_playwright() as play_wright:
+        browser = play_wright.chromium.launch()
+        context = browser.new_context(user_agent=navigation.USER_AGENT)
+        page = context.new_page()
+        navigation.install(page)
+        for stock in stocks:
+            for url, selectors, parser in PAGES.values():
+                url = base_url + url.format(stock, stock)
+                navigation.goto(page, url, selectors[-1])
+                parser(stock, *[page.inner_html(item) for item in selectors])
+        browser.close()
+
+
+def main():
+    """main starting point of program"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = serve(latency=args.latency)
+    stocks = [f"S{number:04d}" for number in range(args.pages // len(PAGES))]
+    pages = len(stocks) * len(PAGES)
+
+    for name, backend in (("http", run_http), ("browser", run_browser)):
+        with PeakRss() as rss:
+            start = time.perf_counter()
+            # * includes browser launch, that is part of the cost
+            backend(server.url, stocks)
+            elapsed = time.perf_counter() - start
+        print(
+            f"{name:>8}: {pages / elapsed:8.1f} pages/sec"
+            f"  peak RSS {rss.peak / 1024 / 1024:7.1f} MB"
+        )
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Wall-clock time of the async engine for 1, 2, 4, 8 workers against the
+local fixture server. Run from the repo root:
+
+    python -m benchmarks.bench_engine --stocks 64 --latency 0.5
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from rich import print
+
+import scrap_yahoo_finance as yahoo
+import scraping_engine
+from benchmarks.fixture_server import serve
+
+
+def main():
+    """main starting point of program"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stocks", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--workers", type=int, nargs="*", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    server = serve(latency=args.latency, jitter=args.jitter)
+    yahoo.BASE_URL = server.url
+    stocks = [f"S{number:04d}" for number in range(args.stocks)]
+
+    baseline = None
+    for workers in args.workers:
+        # * fresh output folder so every run scrapes profiles too
+        with tempfile.TemporaryDirectory() as folder:
+            cwd = os.getcwd()
+            os.chdir(folder)
+            start = time.perf_counter()
+            asyncio.run(scraping_engine.run(stocks, workers=workers))
+            elapsed = time.perf_counter() - start
+            os.chdir(cwd)
+
+        baseline = baseline or elapsed * args.workers[0]
+        print(
+            f"workers={workers:<3} {elapsed:8.2f}s"
+            f"  speedup={baseline / elapsed:5.2f}x"
+        )
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
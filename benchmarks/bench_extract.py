@@ -0,0 +1,161 @@
+"""Parse time per page of the hand written selector loops against the
+declarative extract specs on the fixture pages. Both must give the same
+records:
+
+    python -m benchmarks.bench_extract --runs 2000
+"""
+import argparse
+import time
+
+from rich import print
+from selectolax.parser import HTMLParser
+
+import extract
+import quarterly_data
+import scrap_yahoo_finance as yahoo
+from benchmarks.fixture_server import FIXTURES
+
+# * page type -> (fixture, fragment selectors the scrapers keep)
+PAGES = {
+    "profile": ("profile.html", ["div[data-test='qsp-profile']"]),
+    "summary": (
+        "quote.html",
+        ["div#quote-header-info", "div#quote-summary"],
+    ),
+    "stats": ("key-statistics.html", ["div#Main"]),
+    "income": ("financials.html", ["div#Main"]),
+    "balance": ("balance-sheet.html", ["div#Main"]),
+    "cash": ("cash-flow.html", ["div#Main"]),
+}
+
+
+def old_profile(html) -> dict:
+    """What scrap_yahoo_finance.parse_profile did before"""
+    data = HTMLParser(html)
+    company_list = data.css_first("p").text(separator="*").split("*")
+    if len(company_list) > 5:
+        company_list.pop(0)
+    company = {
+        "name": data.css_first("h3").text(),
+        "address": company_list[0],
+        "citystatezip": company_list[1],
+        "country": company_list[2],
+        "phone": company_list[3],
+        "site": company_list[4],
+    }
+    for item in data.css("p:nth-child(2)"):
+        return company | {
+            item.css("span")[0].text(): item.css("span")[1].text(),
+            item.css("span")[2].text(): item.css("span")[3].text(),
+            item.css("span")[4].text(): item.css("span")[5].text(),
+        }
+
+
+def old_summary(stock, header_html, summary_html) -> dict:
+    """What scrap_yahoo_finance.parse_summary did before"""
+    data = HTMLParser(header_html)
+    stock_dict = {
+        "stock_symbol": stock,
+        "market_price": data.css_first(
+            "fin-streamer[data-test='qsp-price']"
+        ).text(),
+        "market_change": data.css_first(
+            "fin-streamer[data-test='qsp-price-change']"
+        ).text(),
+        "market_percent": data.css_first(
+            "fin-streamer[data-field='regularMarketChangePercent']"
+        ).attrs["value"],
+    }
+    for row in HTMLParser(summary_html).css("table tr"):
+        stock_dict.update({row.css("td")[0].text(): row.css("td")[1].text()})
+    return stock_dict
+
+
+def old_stats(html) -> dict:
+    """What quarterly_data.parse_stats did before"""
+    stats_dict = {}
+    for row in HTMLParser(html).css_first("table").css("tbody tr"):
+        key = row.css_first("td").text().strip()
+        stats_dict.update({key: row.css("td")[2].text()})
+    return stats_dict
+
+
+def old_statement(column):
+    """What quarterly_data.parse_statement did before, for one fin-col"""
+
+    def parse(html) -> dict:
+        statement_dict = {}
+        for item in HTMLParser(html).css("div[data-test='fin-row']"):
+            key = item.css_first("span").text()
+            value = item.css("div[data-test='fin-col']")[column].text()
+            statement_dict.update({key: value})
+        return statement_dict
+
+    return parse
+
+
+# * page type -> (before, after), both take the fragments
+PARSERS = {
+    "profile": (
+        lambda stock, html: old_profile(html),
+        lambda stock, html: yahoo.parse_profile(html),
+    ),
+    "summary": (old_summary, yahoo.parse_summary),
+    "stats": (
+        lambda stock, html: old_stats(html),
+        lambda stock, html: quarterly_data.parse_stats(html),
+    ),
+    **{
+        page: (
+            lambda stock, html, parse=old_statement(column): parse(html),
+            lambda stock, html, page=page: quarterly_data.parse_statement(
+                html, page
+            ),
+        )
+        for page, column in (("income", 1), ("balance", 0), ("cash", 1))
+    },
+}
+
+
+def fragments(page_type, stock) -> list:
+    """Fixture page cut down to the fragments the scraper keeps"""
+    fixture, selectors = PAGES[page_type]
+    html = (FIXTURES / fixture).read_text(encoding="utf-8")
+    data = HTMLParser(html.replace("$SYMBOL", stock))
+    return [data.css_first(selector).html for selector in selectors]
+
+
+def timed(parse, stock, pages, runs) -> float:
+    """Microseconds per parse"""
+    start = time.perf_counter()
+    for _ in range(runs):
+        parse(stock, *pages)
+    return (time.perf_counter() - start) / runs * 1e6
+
+
+def main():
+    """main starting point of program"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{len(extract.PLANS)} specs compiled")
+    for page_type, (before, after) in PARSERS.items():
+        pages = fragments(page_type, "AAPL")
+        old, new = before("AAPL", *pages), after("AAPL", *pages)
+        # * same keys in the same order, json.dumps writes them that way
+        if list(old.items()) != list(new.items()):
+            print(f"[red]{page_type}: records differ[/red]")
+            print(old, new)
+            continue
+
+        old_time = timed(before, "AAPL", pages, args.runs)
+        new_time = timed(after, "AAPL", pages, args.runs)
+        print(
+            f"{page_type:>8}: {len(new):3d} keys, before {old_time:7.1f}us,"
+            f" after {new_time:7.1f}us ({old_time / new_time:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""End to end run of the daily summary, quarterly and historical flows
+against the replay server. Prints stage timings, pages/sec and peak RSS
+per flow and writes them to a results file to compare between commits:
+
+    python -m benchmarks.bench_harness --stocks 20 --latency 0.2 --jitter 0.1
+    python -m benchmarks.bench_harness --compare old.json new.json
+
+Recorded symbols (benchmarks/record.py) are replayed, the rest are served
+from the fixture templates.
+"""
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+from rich import print
+
+import financials_json
+import historical_data
+import http_fetch
+import market_calendar
+import navigation
+import quarterly_data
+import quote_api
+import scrap_yahoo_finance as yahoo
+from benchmarks.fixture_server import RECORDINGS, serve
+from benchmarks.rss import PeakRss
+
+# * steps that are one page or response off the network
+PAGE_STEPS = ["goto", "http_fetch", "download"]
+HISTORY = (date(2014, 1, 2), date(2024, 6, 28))
+
+
+def run_summary(stocks):
+    """scrap_yahoo_finance.main over the stocks"""
+    yahoo.STOCKS = stocks
+    yahoo.main()
+
+
+def run_quarterly(stocks):
+    """quarterly_data.main over the stocks"""
+    quarterly_data.STOCKS = stocks
+    quarterly_data.main()
+
+
+def run_historical(stocks):
+    """Ten years of daily bars for the stocks"""
+    historical_data.download_all(stocks, *HISTORY)
+    http_fetch.close_client()
+
+
+FLOWS = {
+    "summary": run_summary,
+    "quarterly": run_quarterly,
+    "historical": run_historical,
+}
+
+
+def point_at(url):
+    """Send every scraper to the replay server"""
+    yahoo.BASE_URL = url
+    quarterly_data.BASE_URL = url
+    financials_json.BASE_URL = url
+    financials_json.QUERY_URL = url
+    quote_api.QUERY_URL = url
+    http_fetch.COOKIE_URL = url
+    http_fetch.CRUMB_URL = url + "/v1/test/getcrumb"
+    historical_data.BASE_URL = url
+    # * the replay server is open on weekends and holidays too
+    market_calendar.is_trading_day = lambda day=None: True
+
+
+def summarize(timings, totals=None) -> dict:
+    """Count and latency percentiles of one step. With navigation's
+    [runs, total, max] the percentiles come from the kept window and the
+    rest from every run"""
+    ordered = sorted(timings)
+    count, total, worst = totals or (len(ordered), sum(ordered), ordered[-1])
+    return {
+        "count": count,
+        "total": total,
+        "mean": total / count,
+        "p50": ordered[len(ordered) // 2],
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max": worst,
+    }
+
+
+def run_flow(name, stocks) -> dict:
+    """Time one flow from a clean output folder"""
+    navigation.reset_steps()
+    with PeakRss() as rss:
+        start = time.perf_counter()
+        FLOWS[name](stocks)
+        wall = time.perf_counter() - start
+
+    steps = {
+        step: summarize(timings, navigation.STEP_TOTALS[step])
+        for step, timings in navigation.STEP_TIMINGS.items()
+        if timings
+    }
+    pages = sum(steps[step]["count"] for step in PAGE_STEPS if step in steps)
+    return {
+        "wall": wall,
+        "pages": pages,
+        "pages_per_sec": pages / wall if wall else 0.0,
+        "peak_rss": rss.peak,
+        "steps": steps,
+    }
+
+
+def commit() -> str:
+    """Checked out commit the results belong to"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_flow(name, result):
+    """One flow's summary and stage table"""
+    print(
+        f"[bold]{name}[/bold]: {result['wall']:.1f}s,"
+        f" {result['pages']} pages, {result['pages_per_sec']:.2f} pages/s,"
+        f" peak RSS {result['peak_rss'] / 2**20:.0f} MB"
+    )
+    for step, timing in result["steps"].items():
+        print(
+            f"  {step:>12}: {timing['count']:5d} x"
+            f" mean {timing['mean'] * 1000:8.1f}ms"
+            f" p95 {timing['p95'] * 1000:8.1f}ms"
+            f" total {timing['total']:7.2f}s"
+        )
+
+
+def compare(old_path, new_path):
+    """Print the change of every flow and stage between two results"""
+    old = json.loads(Path(old_path).read_text(encoding="utf-8"))
+    new = json.loads(Path(new_path).read_text(encoding="utf-8"))
+    print(f"{old['commit']} -> {new['commit']}")
+
+    def change(before, after) -> str:
+        return f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+
+    for name, result in new["flows"].items():
+        if name not in old["flows"]:
+            continue
+        before = old["flows"][name]
+        print(
+            f"[bold]{name}[/bold]: wall"
+            f" {change(before['wall'], result['wall'])}, pages/s"
+            f" {change(before['pages_per_sec'], result['pages_per_sec'])},"
+            f" peak RSS {change(before['peak_rss'], result['peak_rss'])}"
+        )
+        for step, timing in result["steps"].items():
+            if step in before["steps"]:
+                mean = before["steps"][step]["mean"]
+                print(f"  {step:>12}: mean {change(mean, timing['mean'])}")
+
+
+def main():
+    """main starting point of program"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stocks", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--flows", nargs="*", default=list(FLOWS))
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", nargs=2, default=None)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    # * recorded symbols first, fixture templates for the rest
+    recorded = sorted(
+        path.name for path in RECORDINGS.glob("*") if path.is_dir()
+    )
+    stocks = recorded[: args.stocks] + [
+        f"S{number:04d}" for number in range(args.stocks - len(recorded))
+    ]
+
+    server = serve(
+        latency=args.latency, jitter=args.jitter, recordings=RECORDINGS
+    )
+    point_at(server.url)
+    output = Path(args.output).resolve()
+    results = {
+        "commit": commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "stocks": len(stocks),
+            "recorded": len(recorded[: args.stocks]),
+            "latency": args.latency,
+            "jitter": args.jitter,
+        },
+        "flows": {},
+    }
+
+    cwd = os.getcwd()
+    for name in args.flows:
+        with tempfile.TemporaryDirectory() as folder:
+            os.chdir(folder)
+            try:
+                results["flows"][name] = run_flow(name, stocks)
+            finally:
+                os.chdir(cwd)
+        print_flow(name, results["flows"][name])
+
+    server.shutdown()
+    output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
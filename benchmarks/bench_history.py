@@ -0,0 +1,63 @@
+"""Backfill time of the historical downloader against the fixture v7 CSV
+route, then a rerun that should find nothing missing:
+
+    python -m benchmarks.bench_history --stocks 1500 --years 10
+"""
+import argparse
+import tempfile
+from datetime import date, timedelta
+from pathlib import Path
+
+import pandas as pd
+from rich import print
+
+import historical_data
+from benchmarks.fixture_server import serve
+
+
+def main():
+    """main starting point of program"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stocks", type=int, default=1500)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, default=32)
+    args = parser.parse_args()
+
+    server = serve(latency=args.latency)
+    historical_data.BASE_URL = server.url
+    stocks = [f"S{number:04d}" for number in range(args.stocks)]
+    end = date(2024, 6, 28)
+    start = end - timedelta(days=365 * args.years)
+
+    with tempfile.TemporaryDirectory() as folder:
+        historical_data.DATA_DIR = Path(folder)
+
+        print("Backfill")
+        first = historical_data.download_all(stocks, start, end, args.workers)
+        print("Rerun, nothing missing")
+        rerun = historical_data.download_all(stocks, start, end, args.workers)
+        print("One more week")
+        later = end + timedelta(days=7)
+        week = historical_data.download_all(stocks, start, later, args.workers)
+
+        # * (symbol, Date) stays unique after every merge
+        duplicates = 0
+        for stock in stocks:
+            path = historical_data.DATA_DIR / stock / historical_data.FILE_NAME
+            duplicates += pd.read_csv(path)["Date"].duplicated().sum()
+
+    print(
+        f"backfill {first['elapsed']:.1f}s, rerun {rerun['requests']}"
+        f" requests, one week {week['rows']} rows, {duplicates} duplicates"
+    )
+    assert rerun["requests"] == 0
+    assert week["rows"] == 5 * args.stocks
+    assert duplicates == 0
+
+    historical_data.http_fetch.close_client()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
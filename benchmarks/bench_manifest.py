@@ -0,0 +1,144 @@
+"""Planning a run from the manifest against reading every symbol's JSON
+files, on generated <SYM>.json and quarterly.json files. Planning from the
+manifest must open no file under stock_data/ but the database:
+
+    python -m benchmarks.bench_manifest --stocks 5000 --days 60
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from rich import print
+
+import manifest
+import quarterly_data
+import scrap_yahoo_finance as yahoo
+
+FIELDS = 30
+# * every Nth stock is missing today's summary / the current quarter
+SUMMARY_DUE = 10
+QUARTER_DUE = 7
+
+
+def write_stock(folder, symbol, last, days, quarters):
+    """<SYM>.json with a profile and days of summaries up to last, and
+    quarterly.json with the quarters"""
+    profile = {"company": {"name": symbol, "sector": "Technology"}}
+    summaries = []
+    for day in range(days):
+        summary = {f"field{n}": f"{day + n}.00" for n in range(FIELDS)}
+        summaries.append({str(last - timedelta(days=day)): summary})
+    # * json_data keeps the first day at index 1, newer days go in at 2
+    results = [profile, *summaries[-1:], *summaries[:-1]]
+    quarters = [
+        {quarter: [{"stats": {f"field{n}": n for n in range(FIELDS)}}]}
+        for quarter in quarters
+    ]
+    path = folder / symbol
+    path.mkdir(parents=True)
+    (path / f"{symbol}.json").write_text(json.dumps(results))
+    quarterly = [{"quarterly": quarters}]
+    (path / "quarterly.json").write_text(json.dumps(quarterly))
+
+
+def plan_from_files(symbols, today, quarter) -> tuple:
+    """What process_stocks and check_quarterly_date used to read: a stat
+    and a full parse of both files per symbol"""
+    summary, quarterly = [], []
+    for symbol in symbols:
+        path = Path("stock_data", symbol, f"{symbol}.json")
+        if not path.is_file():
+            summary.append(symbol)
+        else:
+            results = json.loads(path.read_text(encoding="utf-8"))
+            if today not in [key for item in results for key in item]:
+                summary.append(symbol)
+        path = Path("stock_data", symbol, "quarterly.json")
+        if not path.is_file():
+            quarterly.append(symbol)
+            continue
+        results = json.loads(path.read_text(encoding="utf-8"))
+        dates = [key for item in results[0]["quarterly"] for key in item]
+        if quarter not in dates:
+            quarterly.append(symbol)
+    return summary, quarterly
+
+
+def main():
+    """main starting point of program"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stocks", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=60)
+    args = parser.parse_args()
+
+    symbols = [f"S{number:04d}" for number in range(args.stocks)]
+    folder = tempfile.mkdtemp(prefix="bench_manifest_")
+    # * the store opens in the temporary folder
+    os.chdir(folder)
+    now = datetime.now()
+    quarter = quarterly_data.quarterly_date(now)
+    past = [
+        quarterly_data.quarterly_date(now - timedelta(days=91 * n))
+        for n in range(1, 4)
+    ]
+    began = time.perf_counter()
+    for number, symbol in enumerate(symbols):
+        last = date.today() - timedelta(days=number % SUMMARY_DUE == 0)
+        quarters = past if number % QUARTER_DUE == 0 else [quarter, *past]
+        write_stock(Path("stock_data"), symbol, last, args.days, quarters)
+    print(
+        f"Wrote {args.stocks} stocks with {args.days} days"
+        f" in {time.perf_counter() - began:.1f}s"
+    )
+
+    began = time.perf_counter()
+    expected = plan_from_files(symbols, str(date.today()), quarter)
+    files = time.perf_counter() - began
+    print(f"Plan from files: {files * 1000:.0f}ms")
+
+    began = time.perf_counter()
+    manifest.rebuild()
+    size = sum(
+        path.stat().st_size for path in Path("stock_data").glob("stocks.db*")
+    )
+    print(
+        f"Manifest rebuilt once in {time.perf_counter() - began:.1f}s,"
+        f" store {size / 1024:.0f} KB"
+    )
+
+    opened = []
+
+    def audit(event, event_args):
+        """Note files opened while planning"""
+        if event == "open" and "stocks.db" not in str(event_args[0]):
+            opened.append(event_args[0])
+
+    sys.addaudithook(audit)
+    timings = []
+    for _ in range(5):
+        began = time.perf_counter()
+        planned = (yahoo.plan(symbols), quarterly_data.plan(symbols, now))
+        timings.append(time.perf_counter() - began)
+    best = min(timings)
+    print(
+        f"Plan from the manifest: {best * 1000:.1f}ms,"
+        f" {files / best:.0f}x faster, {len(opened)} files opened"
+    )
+
+    failed = []
+    if planned != expected:
+        failed.append("plan differs from the files")
+    if opened:
+        failed.append(f"opened {opened[:3]}")
+    if failed:
+        print(f"[red]Failed: {failed}[/red]")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
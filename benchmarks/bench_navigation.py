@@ -0,0 +1,74 @@
+"""Requests and bytes saved by resource blocking. Loads each quote and
+profile page once with the full page and once in lightweight mode:
+
+    python -m benchmarks.bench_navigation AAPL MSFT
+"""
+import argparse
+import time
+
+from playwright.sync_api import sync_playwright
+from rich import print
+
+import navigation
+import scrap_yahoo_finance as yahoo
+
+PAGES = {
+    "summary": ("/quote/{}?p={}", "div#quote-summary"),
+    "profile": ("/quote/{}/profile?p={}", "div[data-test='qsp-profile']"),
+}
+
+
+def main():
+    """main starting point of program"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url", default=yahoo.BASE_URL)
+    parser.add_argument("stocks", nargs="*", default=yahoo.STOCKS)
+    args = parser.parse_args()
+
+    with sync_playwright() as play_wright:
+        browser = play_wright.chromium.launch()
+        # * the full load goes first, it sizes what blocking skips
+        full = navigation.new_stats()
+        for block in (False, True):
+            # * fresh context so the browser cache doesn't help either mode
+            context = browser.new_context(user_agent=navigation.USER_AGENT)
+            page = context.new_page()
+            stats = navigation.install(page, block=block)
+            totals = navigation.new_stats()
+            start = time.perf_counter()
+            for stock in args.stocks:
+                for url, selector in PAGES.values():
+                    url = args.base_url + url.format(stock, stock)
+                    navigation.goto(page, url, selector)
+                for key in ("requests", "blocked", "bytes", "saved_bytes"):
+                    totals[key] += stats[key]
+                # * report starts the counters over too
+                if block:
+                    navigation.report(stock, stats)
+                else:
+                    stats.update(navigation.new_stats())
+            elapsed = time.perf_counter() - start
+            context.close()
+
+            mode = "blocked" if block else "full"
+            print(
+                f"{mode:>8}: {elapsed:7.2f}s {totals['requests']:6} requests"
+                f" {totals['bytes'] / 1024:9.0f} KB"
+                f" {totals['blocked']:6} blocked"
+            )
+            if block:
+                saved_kb = (full["bytes"] - totals["bytes"]) / 1024
+                blocked_kb = totals["saved_bytes"] / 1024
+                print(
+                    f"   saved: {full['requests'] - totals['requests']}"
+                    f" requests, {saved_kb:.0f} KB"
+                    f" ({blocked_kb:.0f} KB of blocked responses)"
+                    f" over {len(args.stocks)} symbols"
+                )
+            full = totals
+
+        browser.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Vectorized normalize() against a per-cell Python parser on 1M cells:
+
+    python -m benchmarks.bench_normalize --cells 1000000
+"""
+import argparse
+import re
+import time
+
+import numpy as np
+from rich import print
+
+import normalize
+
+# * display formats seen on the summary, statistics and statement pages
+FORMATS = [
+    lambda x: f"{x:.2f}T",
+    lambda x: f"{x:.2f}B",
+    lambda x: f"{x:.2f}%",
+    lambda x: f"-{x:,.0f}",
+    lambda x: f"({x * 1000:,.0f})",
+    lambda x: f"(-{x:.2f}%)",
+    lambda x: f"(+{x:.2f}%)",
+    lambda x: f"{x:.2f}",
+    lambda x: f"{x * 1e6:,.0f}",
+    lambda x: f"{x:.2f} - {x * 1.1:.2f}",
+    lambda x: "N/A",
+    lambda x: "-",
+]
+
+CELL = re.compile(normalize.NUMBER)
+
+
+def parse_cell(text):
+    """The per-cell way every consumer parses today"""
+    match = CELL.match(text.strip())
+    if match is None:
+        return None
+    number = float(match["number"].replace(",", ""))
+    number *= normalize.SCALES.get(match["suffix"], 1.0)
+    # * an explicit sign wins over accounting parentheses
+    if match["sign"] == "-" or (
+        match["open"] and match["close"] and not match["sign"]
+    ):
+        number = -number
+    return number
+
+
+def main():
+    """main starting point of program"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cells", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    numbers = rng.uniform(0, 500, size=args.cells)
+    formats = rng.integers(len(FORMATS), size=args.cells)
+    cells = [FORMATS[kind](x) for kind, x in zip(formats, numbers)]
+
+    start = time.perf_counter()
+    slow = [parse_cell(cell) for cell in cells]
+    per_cell = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fast = normalize.normalize(cells)
+    vectorized = time.perf_counter() - start
+
+    # * signed changes in parentheses keep their sign
+    assert normalize.parse_value("(-0.64%)") == -0.64
+    assert normalize.parse_value("(+0.54%)") == 0.54
+    assert normalize.parse_value("(4,512)") == -4512
+
+    # * both ways must agree
+    expected = np.array([np.nan if x is None else x for x in slow])
+    assert np.allclose(fast["value"], expected, equal_nan=True)
+
+    for name, seconds in (("per cell", per_cell), ("vectorized", vectorized)):
+        print(
+            f"{name:>10}: {seconds:6.2f}s"
+            f" {args.cells / seconds / 1e6:6.2f}M cells/sec"
+        )
+
+
+if __name__ == "__main__":
+    main()
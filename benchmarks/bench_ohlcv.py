@@ -0,0 +1,114 @@
+"""Load time and peak RSS of the historical CSV files against the memmap
+OHLCV store, full history and a one year range for every stock:
+
+    python -m benchmarks.bench_ohlcv --stocks 5000 --years 20
+
+Each loader runs in a fresh process so RSS readings don't mix.
+"""
+import argparse
+import multiprocessing
+import resource
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from rich import print
+
+import ohlcv_store
+
+# * business days in a year
+DAYS = 252
+LAST_DAY = "2024-06-28"
+
+
+def generate(folder, stocks, years):
+    """Random walk prices written as CSV and as the binary store"""
+    ohlcv_store.DATA_DIR = folder
+    dates = pd.bdate_range(end=LAST_DAY, periods=DAYS * years)
+    rng = np.random.default_rng(7)
+    for stock in stocks:
+        close = 50 * np.exp(np.cumsum(rng.normal(0, 0.01, len(dates))))
+        frame = pd.DataFrame(
+            {
+                "Date": dates.strftime("%Y-%m-%d"),
+                "Open": close * 0.99,
+                "High": close * 1.01,
+                "Low": close * 0.98,
+                "Close": close,
+                "Adj Close": close * 0.97,
+                "Volume": rng.integers(10**5, 10**7, len(dates)),
+            }
+        )
+        (folder / stock).mkdir(parents=True)
+        frame.to_csv(folder / stock / ohlcv_store.CSV_NAME, index=False)
+        ohlcv_store.write(stock, ohlcv_store.to_columns(frame))
+
+
+def load_csv(folder, stock, start):
+    """Parse the whole file, then filter"""
+    frame = pd.read_csv(
+        folder / stock / ohlcv_store.CSV_NAME,
+        index_col="Date",
+        parse_dates=True,
+    )
+    return frame.loc[start:] if start else frame
+
+
+def load_store(folder, stock, start):
+    """Binary search and slice the memmaps"""
+    return ohlcv_store.load(stock, start=start)
+
+
+def run(args):
+    """One loader over every stock in this process"""
+    name, folder, stocks, start = args
+    ohlcv_store.DATA_DIR = folder
+    loader = {"csv": load_csv, "ohlcv": load_store}[name]
+
+    begin = time.perf_counter()
+    frames = [loader(folder, stock, start) for stock in stocks]
+    # * touch the data the way an analysis would
+    column = "close" if name == "ohlcv" else "Close"
+    total = sum(float(frame[column].mean()) for frame in frames)
+    elapsed = time.perf_counter() - begin
+    rows = sum(len(frame) for frame in frames)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return elapsed, rows, peak, total
+
+
+def main():
+    """main starting point of program"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stocks", type=int, default=5000)
+    parser.add_argument("--years", type=int, default=20)
+    args = parser.parse_args()
+
+    stocks = [f"S{number:04d}" for number in range(args.stocks)]
+    start = str(pd.Timestamp(LAST_DAY) - pd.DateOffset(years=1))
+    spawn = multiprocessing.get_context("spawn")
+
+    with tempfile.TemporaryDirectory() as folder:
+        folder = Path(folder)
+        begin = time.perf_counter()
+        generate(folder, stocks, args.years)
+        print(
+            f"Generated {args.stocks} stocks x {args.years} years"
+            f" in {time.perf_counter() - begin:.1f}s"
+        )
+
+        for label, range_start in (("full", None), ("1 year", start)):
+            for name in ("csv", "ohlcv"):
+                with spawn.Pool(1) as pool:
+                    elapsed, rows, peak, _ = pool.apply(
+                        run, ((name, folder, stocks, range_start),)
+                    )
+                print(
+                    f"{label:>6} {name:>5}: {elapsed:7.2f}s"
+                    f" {rows:>11,} rows, peak RSS {peak / 2**20:8.1f} MB"
+                )
+
+
+if __name__ == "__main__":
+    main()
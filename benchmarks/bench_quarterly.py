@@ -0,0 +1,64 @@
+"""Time of the old fixed time.sleep(2) after the "Quarterly" click against
+the event driven wait, on the fixture statement pages:
+
+    python -m benchmarks.bench_quarterly --stocks 10
+"""
+import argparse
+import time
+
+from playwright.sync_api import sync_playwright
+from rich import print
+
+import navigation
+from benchmarks.fixture_server import serve
+
+STATEMENTS = ["financials", "balance-sheet", "cash-flow"]
+
+
+def sleep_toggle(page):
+    """What quarterly_data did before"""
+    page.get_by_text("Quarterly").click()
+    time.sleep(2)
+
+
+def main():
+    """main starting point of program"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stocks", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = serve(latency=args.latency)
+    stocks = [f"S{number:04d}" for number in range(args.stocks)]
+
+    with sync_playwright() as play_wright:
+        browser = play_wright.chromium.launch()
+        context = browser.new_context(user_agent=navigation.USER_AGENT)
+        page = context.new_page()
+        navigation.install(page)
+
+        for name, toggle in (
+            ("sleep(2)", sleep_toggle),
+            ("event", navigation.click_quarterly),
+        ):
+            spent = 0.0
+            for stock in stocks:
+                for statement in STATEMENTS:
+                    url = f"{server.url}/quote/{stock}/{statement}?p={stock}"
+                    navigation.goto(page, url, "div#Main")
+                    start = time.perf_counter()
+                    toggle(page)
+                    spent += time.perf_counter() - start
+            toggles = len(stocks) * len(STATEMENTS)
+            print(
+                f"{name:>9}: {spent:7.2f}s for {toggles} toggles,"
+                f" {spent / toggles:.3f}s each"
+            )
+
+        browser.close()
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
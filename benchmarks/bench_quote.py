@@ -0,0 +1,154 @@
+"""Daily summary from the batch quote API against one quote page per
+symbol, on the fixture server. The page run goes first and leaves its
+quote pages in the archive, then the JSON files are dropped and the batch
+run writes them again. Every summary must come out the same, a symbol
+missing from the batch must fall back to its page, and an expired crumb
+must be replaced without failing the batch:
+
+    python -m benchmarks.bench_quote --stocks 1500
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from rich import print
+
+import http_fetch
+import manifest
+import quote_api
+import scrap_yahoo_finance as yahoo
+from benchmarks.bench_harness import point_at
+from benchmarks.fixture_server import serve
+
+
+def kind(url_path) -> str:
+    """Request kind of a served url path"""
+    if url_path.startswith("/v7/finance/quote"):
+        return "batch"
+    if url_path.startswith("/v1/test/getcrumb"):
+        return "crumb"
+    if url_path == "/":
+        return "cookie"
+    if url_path.endswith("/profile"):
+        return "profile"
+    return "page"
+
+
+def check_mapping(url, symbol) -> list:
+    """Keys where the batch quote and the quote page of the fixture
+    differ, for the fields the API has"""
+    fragments = http_fetch.fetch_fragments(
+        f"{url}/quote/{symbol}", yahoo.PAGES["summary"][1]
+    )
+    page = yahoo.parse_summary(symbol, *fragments)
+    response = http_fetch.get_client().get(
+        f"{url}/v7/finance/quote",
+        params={"symbols": symbol, "crumb": http_fetch.crumb()},
+    ).json()
+    record = quote_api.summary(symbol, response["quoteResponse"]["result"][0])
+    return [
+        key
+        for key, field in quote_api.FIELDS.items()
+        if field is not None and record[key] != page[key]
+    ]
+
+
+def run(symbols, source, hits) -> tuple:
+    """Wall time and requests by kind of one summary run"""
+    yahoo.SUMMARY_SOURCE = source
+    hits.clear()
+    began = time.perf_counter()
+    for stock, quotes in yahoo.with_quotes(symbols):
+        yahoo.process_stocks(None, stock, quotes=quotes)
+    wall = time.perf_counter() - began
+    return wall, Counter(kind(url_path) for url_path in hits)
+
+
+def summaries(symbols) -> dict:
+    """symbol -> today's summary saved in its JSON file"""
+    saved = {}
+    for symbol in symbols:
+        path = Path("stock_data", symbol, f"{symbol}.json")
+        results = json.loads(path.read_text(encoding="utf-8"))
+        saved[symbol] = results[1]
+    return saved
+
+
+def drop_files(symbols):
+    """Delete the JSON files and their manifest rows, the caches and the
+    archive stay"""
+    conn = manifest.connect()
+    for symbol in symbols:
+        Path("stock_data", symbol, f"{symbol}.json").unlink()
+        conn.execute("DELETE FROM manifest WHERE symbol = ?", (symbol,))
+    conn.commit()
+
+
+def main():
+    """main starting point of program"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stocks", type=int, default=1500)
+    parser.add_argument("--latency", type=float, default=0.01)
+    args = parser.parse_args()
+
+    hits = []
+    server = serve(latency=args.latency, hits=hits)
+    point_at(server.url)
+    os.chdir(tempfile.mkdtemp(prefix="bench_quote_"))
+    symbols = [f"S{number:04d}" for number in range(args.stocks)]
+    failed = []
+
+    mismatched = check_mapping(server.url, "AAPL")
+    print(f"Batch quote against the quote page: {mismatched or 'same'}")
+    if mismatched:
+        failed.append(f"mapping {mismatched}")
+
+    wall, requests = run(symbols, "page", hits)
+    print(f"page:  {wall:6.1f}s, {dict(requests)}")
+    expected = summaries(symbols)
+
+    drop_files(symbols)
+    wall, requests = run(symbols, "batch", hits)
+    print(f"batch: {wall:6.1f}s, {dict(requests)}")
+    batches = math.ceil(args.stocks / quote_api.BATCH_SIZE)
+    if requests["page"] or requests["batch"] > batches:
+        failed.append(f"requests {dict(requests)}")
+    differ = [
+        symbol
+        for symbol, saved in summaries(symbols).items()
+        if saved != expected[symbol]
+    ]
+    if differ:
+        failed.append(f"{len(differ)} summaries differ, {differ[:3]}")
+
+    # * Yahoo rotated the session, one new crumb and the batch goes through
+    hits.clear()
+    server.session["crumb"] = "rotated"
+    quotes = quote_api.fetch(symbols[:10])
+    requests = Counter(kind(url_path) for url_path in hits)
+    print(f"expired crumb: {len(quotes)} quotes, {dict(requests)}")
+    if len(quotes) != 10 or requests["crumb"] != 1:
+        failed.append(f"crumb refresh {dict(requests)}")
+
+    # * a symbol the batch didn't answer falls back to its page
+    hits.clear()
+    drop_files(symbols[:1])
+    yahoo.process_stocks(None, symbols[0], quotes={})
+    if Counter(kind(url_path) for url_path in hits)["page"] != 1:
+        failed.append("no page fallback")
+
+    http_fetch.close_client()
+    server.shutdown()
+    if failed:
+        print(f"[red]Failed: {failed}[/red]")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
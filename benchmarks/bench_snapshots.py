@@ -0,0 +1,108 @@
+"""Size and decode speed of the snapshot archive on generated daily
+fetches built from the fixture pages, against gzip per fragment:
+
+    python -m benchmarks.bench_snapshots --stocks 200 --days 60
+"""
+import argparse
+import gzip
+import os
+import random
+import re
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from rich import print
+
+import snapshot_archive
+from benchmarks.fixture_server import FIXTURES
+
+# * page type -> (fixture, days between changes)
+PAGES = {
+    "summary": ("quote.html", 1),
+    "stats": ("key-statistics.html", 30),
+    "profile": ("profile.html", 365),
+}
+NUMBER = re.compile(r">(-?[\d.,]+[%BMKT]?)<")
+FIRST_DAY = date(2024, 1, 2)
+
+
+def vary(html, seed) -> str:
+    """Same markup with new numbers, like the next day's page"""
+    rng = random.Random(seed)
+    return NUMBER.sub(lambda _: f">{rng.uniform(0, 500):,.2f}<", html)
+
+
+def main():
+    """main starting point of program"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stocks", type=int, default=200)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--reads", type=int, default=2000)
+    args = parser.parse_args()
+
+    stocks = [f"S{number:04d}" for number in range(args.stocks)]
+    pages = {
+        page: (FIXTURES / fixture).read_text(encoding="utf-8")
+        for page, (fixture, _) in PAGES.items()
+    }
+
+    with tempfile.TemporaryDirectory() as folder:
+        cwd = os.getcwd()
+        os.chdir(folder)
+        raw = gzipped = 0
+        seen = set()
+        began = time.perf_counter()
+        for day in range(args.days):
+            for stock in stocks:
+                for page, (_, every) in PAGES.items():
+                    html = pages[page].replace("$SYMBOL", stock)
+                    fragment = vary(html, f"{stock} {page} {day // every}")
+                    raw += len(fragment.encode())
+                    digest = snapshot_archive.save(
+                        stock, page, [fragment], FIRST_DAY + timedelta(day)
+                    )[0]
+                    if digest not in seen:
+                        seen.add(digest)
+                        gzipped += len(gzip.compress(fragment.encode()))
+        written = time.perf_counter() - began
+
+        archive = snapshot_archive.stats()
+        on_disk = sum(
+            path.stat().st_size for path in Path("stock_data").rglob("*.pack")
+        )
+        # * random access by (symbol, page type, date)
+        rng = random.Random(1)
+        began = time.perf_counter()
+        decoded = 0
+        for _ in range(args.reads):
+            fragments = snapshot_archive.fetch(
+                rng.choice(stocks),
+                rng.choice(list(PAGES)),
+                FIRST_DAY + timedelta(rng.randrange(args.days)),
+            )
+            decoded += sum(len(fragment) for fragment in fragments)
+        read = time.perf_counter() - began
+        os.chdir(cwd)
+
+    fetches = archive["fetches"]
+    per_year = on_disk / (args.stocks * args.days) * 1500 * 252
+    print(
+        f"{fetches} fetches, {archive['objects']} unique fragments,"
+        f" written in {written:.1f}s"
+    )
+    print(
+        f"raw {raw / 2**20:.1f} MB, gzip per fragment"
+        f" {gzipped / 2**20:.1f} MB, archive {on_disk / 2**20:.1f} MB"
+        f" ({raw / on_disk:.0f}x raw, {gzipped / on_disk:.1f}x gzip)"
+    )
+    print(
+        f"decode {args.reads / read:.0f} fetches/s,"
+        f" {decoded / read / 2**20:.1f} MB/s"
+    )
+    print(f"1,500 stocks for a year: about {per_year / 2**20:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
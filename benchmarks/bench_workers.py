@@ -0,0 +1,148 @@
+"""Throughput of the historical download split across 1, 2, 4... local
+worker processes sharing one work queue, against the fixture server.
+With --stall one extra worker leases a batch and hangs, the others must
+take its symbols over once the lease runs out:
+
+    python -m benchmarks.bench_workers --stocks 200 --nodes 1 2 4 --stall
+"""
+import argparse
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+from rich import print
+
+import run_journal
+from benchmarks.fixture_server import serve
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def child(url, name, threads, lease, stall, stocks):
+    """One worker process"""
+    import historical_data
+    import work_queue
+    from benchmarks.bench_harness import point_at
+
+    point_at(url)
+    historical_data.SYMBOLS = stocks
+    work_queue.HISTORY_BATCH = threads
+    if stall:
+        queue = run_journal.run_id("historical")
+        work_queue.fill(queue, stocks)
+        work_queue.lease(queue, name, threads, lease)
+        # * hung worker, holds its lease until it runs out
+        time.sleep(3600)
+    work_queue.work("historical", name, lease, threads)
+
+
+def start_child(folder, args, name, stall=False) -> subprocess.Popen:
+    """Worker process in the shared folder"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [str(ROOT), env.get("PYTHONPATH")])
+    )
+    command = [sys.executable, "-m", "benchmarks.bench_workers", "--child"]
+    command += [args.url, name, str(args.threads), str(args.lease)]
+    command += ["stall" if stall else "work", *args.symbols]
+    return subprocess.Popen(
+        command,
+        cwd=folder,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def run_nodes(args, nodes) -> dict:
+    """Wall time and queue counts of one run with this many workers"""
+    folder = Path(tempfile.mkdtemp(prefix=f"bench_workers_{nodes}_"))
+    stalled = None
+    if args.stall:
+        stalled = start_child(folder, args, "stalled", stall=True)
+        # * let it take its lease first
+        time.sleep(2)
+
+    start = time.perf_counter()
+    processes = [
+        start_child(folder, args, f"node{number}")
+        for number in range(nodes)
+    ]
+    codes = [process.wait() for process in processes]
+    wall = time.perf_counter() - start
+    if stalled is not None:
+        stalled.kill()
+        stalled.wait()
+
+    # * the queue the workers shared
+    conn = sqlite3.connect(folder / "stock_data" / "stocks.db")
+    rows = conn.execute(
+        "SELECT state, worker FROM work_queue WHERE queue = ?",
+        (run_journal.run_id("historical"),),
+    ).fetchall()
+    conn.close()
+    states = Counter(state for state, _ in rows)
+    by_worker = Counter(worker for state, worker in rows if state == "done")
+    saved = sum(
+        (folder / "stock_data" / symbol / "historical_data.csv").is_file()
+        for symbol in args.symbols
+    )
+    return {
+        "wall": wall,
+        "codes": codes,
+        "states": dict(states),
+        "workers": dict(by_worker),
+        "saved": saved,
+    }
+
+
+def main():
+    """main starting point of program"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stocks", type=int, default=200)
+    parser.add_argument("--nodes", type=int, nargs="*", default=[1, 2, 4])
+    parser.add_argument("--threads", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--lease", type=float, default=5.0)
+    parser.add_argument("--stall", action="store_true")
+    parser.add_argument("--child", nargs="+", default=None)
+    args = parser.parse_args()
+
+    if args.child:
+        url, name, threads, lease, mode, *stocks = args.child
+        child(url, name, int(threads), float(lease), mode == "stall", stocks)
+        return
+
+    server = serve(latency=args.latency)
+    args.url = server.url
+    args.symbols = [f"S{number:04d}" for number in range(args.stocks)]
+
+    failed = False
+    base = None
+    for nodes in args.nodes:
+        result = run_nodes(args, nodes)
+        rate = args.stocks / result["wall"]
+        base = base or rate
+        print(
+            f"{nodes} workers: {result['wall']:6.1f}s, {rate:6.1f} stocks/s"
+            f" ({rate / base:.1f}x), {result['states']},"
+            f" per worker {sorted(result['workers'].values())}"
+        )
+        if (
+            any(result["codes"])
+            or result["states"] != {"done": args.stocks}
+            or result["saved"] != args.stocks
+        ):
+            failed = True
+            print(f"[red]{nodes} workers: {result}[/red]")
+    server.shutdown()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Kill the daily summary run at random points and restart it until it
+finishes, against the fixture server in a scratch folder. Every JSON file
+must load with exactly one entry for today, and no symbol the run journal
+had saved may be fetched again after a restart:
+
+    python -m benchmarks.check_crash --stocks 40 --kills 8
+
+Profile and summary are plain HTTP pages, so the run needs no browser.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from collections import Counter
+from datetime import date
+from pathlib import Path
+
+from rich import print
+
+from benchmarks.fixture_server import serve
+
+ROOT = Path(__file__).resolve().parent.parent
+QUOTE_PATH = re.compile(r"^/quote/([^/]+)")
+
+
+def child(url, stocks):
+    """One summary run, the loop of scrap_yahoo_finance.main"""
+    import fetch_cache
+    import http_fetch
+    import parse_stage
+    import run_journal
+    import scrap_yahoo_finance as yahoo
+    from benchmarks.bench_harness import point_at
+
+    point_at(url)
+    run = run_journal.start("summary")
+    with parse_stage.pool(2) as pool:
+        futures = {
+            stock: yahoo.process_stocks(None, stock, pool, run)
+            for stock in stocks
+        }
+        parse_stage.collect(futures, 2)
+    http_fetch.close_client()
+    fetch_cache.report()
+
+
+def saved_units(folder) -> set:
+    """Symbols today's summary run has journaled"""
+    path = folder / "stock_data" / "stocks.db"
+    if not path.is_file():
+        return set()
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute(
+            "SELECT symbol FROM run_journal WHERE run = ?",
+            (f"summary:{date.today()}",),
+        ).fetchall()
+    except sqlite3.OperationalError:
+        # * killed before the journal table was created
+        rows = []
+    conn.close()
+    return {symbol for (symbol,) in rows}
+
+
+def start_child(folder, url, stocks) -> subprocess.Popen:
+    """Run child in the scratch folder, in its own process group so the
+    parse workers die with it"""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [str(ROOT), env.get("PYTHONPATH")])
+    )
+    return subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.check_crash", "--child", url]
+        + stocks,
+        cwd=folder,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def check_files(folder, stocks) -> list:
+    """Problems with the JSON output, empty when every file is whole"""
+    today = str(date.today())
+    problems = []
+    for stock in stocks:
+        path = folder / "stock_data" / stock / f"{stock}.json"
+        try:
+            results = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as error:
+            problems.append(f"{stock}: {error!r}")
+            continue
+        days = [key for item in results[1:] for key in item if key == today]
+        if "company" not in results[0]:
+            problems.append(f"{stock}: no profile")
+        if len(days) != 1:
+            problems.append(f"{stock}: {len(days)} entries for {today}")
+    return problems
+
+
+def main():
+    """main starting point of program"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stocks", type=int, default=40)
+    parser.add_argument("--kills", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--child", nargs="+", default=None)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], args.child[1:])
+        return
+
+    random.seed(args.seed)
+    stocks = [f"S{number:04d}" for number in range(args.stocks)]
+    hits = []
+    server = serve(latency=args.latency, hits=hits)
+    # * a killed run leaves broken pipes behind, they are expected
+    server.handle_error = lambda request, address: None
+    folder = Path(tempfile.mkdtemp(prefix="check_crash_"))
+    print(f"Scratch folder {folder}")
+
+    # * (symbols saved at the kill, requests served before it)
+    kills = []
+    while True:
+        process = start_child(folder, server.url, stocks)
+        if len(kills) < args.kills:
+            try:
+                process.wait(timeout=random.uniform(0.5, 4.0))
+            except subprocess.TimeoutExpired:
+                os.killpg(process.pid, signal.SIGKILL)
+                process.wait()
+                kills.append((saved_units(folder), len(hits)))
+                print(
+                    f"Killed after {len(kills[-1][0])} saved,"
+                    f" {len(hits)} requests"
+                )
+                continue
+        if process.wait() != 0:
+            print(f"[red]Run exited with {process.returncode}[/red]")
+            sys.exit(1)
+        break
+    server.shutdown()
+
+    refetched = Counter()
+    for saved, served in kills:
+        for url_path in hits[served:]:
+            match = QUOTE_PATH.match(url_path)
+            if match and match.group(1) in saved:
+                refetched[match.group(1)] += 1
+    fetched = Counter(
+        QUOTE_PATH.match(url_path).group(1)
+        for url_path in hits
+        if QUOTE_PATH.match(url_path)
+    )
+
+    problems = check_files(folder, stocks)
+    missing = set(stocks) - saved_units(folder)
+    leftovers = list(folder.glob("stock_data/*/.*.tmp"))
+    print(
+        f"{len(kills)} kills, {len(hits)} requests for {len(stocks)} stocks,"
+        f" {sum(count - 2 for count in fetched.values())} extra page"
+        f" fetches, {len(leftovers)} temp files left by kills"
+    )
+    for problem in problems:
+        print(f"[red]{problem}[/red]")
+    if refetched:
+        print(f"[red]Fetched again after saving: {dict(refetched)}[/red]")
+    if missing:
+        print(f"[red]Not in the run journal: {sorted(missing)}[/red]")
+
+    failed = bool(problems or refetched or missing)
+    if not failed:
+        print("Every file whole, no saved symbol fetched again")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
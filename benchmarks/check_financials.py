@@ -0,0 +1,66 @@
+"""Check the JSON statement paths give the same dict as scraping the three
+statement pages, using the fixture server:
+
+    python -m benchmarks.check_financials
+"""
+import sys
+
+from playwright.sync_api import sync_playwright
+from rich import print
+
+import financials_json
+import http_fetch
+import navigation
+import quarterly_data
+from benchmarks.fixture_server import serve
+
+STOCK = "AAPL"
+
+
+def scrape_html(base_url):
+    """The old path, three navigations and three "Quarterly" clicks"""
+    quarterly_data.BASE_URL = base_url
+    quarterly_data.FINANCIALS_MODE = "html"
+    with sync_playwright() as play_wright:
+        browser = play_wright.chromium.launch()
+        context = browser.new_context(user_agent=navigation.USER_AGENT)
+        page = context.new_page()
+        navigation.install(page)
+        financial_dict = quarterly_data.financials(page, STOCK)
+        browser.close()
+    return financial_dict
+
+
+def main():
+    """main starting point of program"""
+    server = serve()
+    financials_json.BASE_URL = server.url
+    financials_json.QUERY_URL = server.url
+
+    expected = scrape_html(server.url)
+    paths = {
+        "timeseries API": financials_json.fetch_timeseries(STOCK),
+        "embedded JSON": financials_json.fetch_embedded(STOCK),
+    }
+    http_fetch.close_client()
+    server.shutdown()
+
+    failed = False
+    for name, series in paths.items():
+        found = financials_json.statements(series or {})
+        if found == expected:
+            print(f"{name}: matches html scrape")
+            continue
+        failed = True
+        print(f"{name}: differs from html scrape")
+        for key in expected:
+            for label, value in expected[key].items():
+                other = found.get(key, {}).get(label)
+                if other != value:
+                    print(f"  {key} / {label}: html {value!r} json {other!r}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
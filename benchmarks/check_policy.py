@@ -0,0 +1,165 @@
+"""Check the request policy against a local server that hangs, fails,
+throttles and has a slow tail. Every call must end inside its deadline
+with a typed result, the breaker must stop the calls once the server
+throttles, and hedging must cut the tail:
+
+    python -m benchmarks.check_policy
+"""
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from rich import print
+
+import http_fetch
+import request_policy
+
+# * path -> requests served, for the flaky route
+SERVED = {}
+SERVED_LOCK = threading.Lock()
+# * seconds of every timed call, hedging waits for their p95
+TIMINGS = []
+
+
+class PolicyHandler(BaseHTTPRequestHandler):
+    """Misbehaving routes"""
+
+    def do_GET(self):
+        """Answer by path"""
+        route = self.path.strip("/").split("/")[0]
+        with SERVED_LOCK:
+            SERVED[self.path] = SERVED.get(self.path, 0) + 1
+            served = SERVED[self.path]
+        if route == "hang":
+            time.sleep(10)
+        elif route == "flaky" and served < 3:
+            self.send_error(500)
+            return
+        elif route == "throttle":
+            self.send_error(429)
+            return
+        elif route == "tail" and random.random() < 0.03:
+            time.sleep(1.5)
+        body = b"<div id='Main'>ok</div>"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Keep the output quiet"""
+
+
+def get(url):
+    """One request the way the scrapers make it"""
+
+    def attempt(timeout):
+        """GET within timeout ms"""
+        response = request_policy.hedged(
+            lambda: http_fetch.get_client().get(url, timeout=timeout / 1000),
+            TIMINGS,
+        )
+        request_policy.check_status(response.status_code, url)
+        response.raise_for_status()
+        return response.text
+
+    return request_policy.call("check", url, attempt)
+
+
+def timed_get(url) -> tuple:
+    """Result and seconds of one call"""
+    start = time.perf_counter()
+    result = get(url)
+    seconds = time.perf_counter() - start
+    TIMINGS.append(seconds)
+    return result, seconds
+
+
+def main():
+    """main starting point of program"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PolicyHandler)
+    server.daemon_threads = True
+    # * clients that gave up on the hung route leave broken pipes
+    server.handle_error = lambda request, address: None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    url = f"http://127.0.0.1:{port}"
+
+    request_policy.DEADLINES["check"] = 3
+    request_policy.BACKOFF_BASE = 0.1
+    request_policy.BREAKER_COOLDOWN = 2.0
+    request_policy.HEDGE_AFTER = 0.2
+    failed = []
+
+    result, seconds = timed_get(f"{url}/hang/1")
+    print(f"hang: {result} in {seconds:.2f}s")
+    if result.outcome != request_policy.TIMEOUT or seconds > 3.5:
+        failed.append("hang")
+
+    result, seconds = timed_get(f"{url}/flaky/1")
+    print(f"flaky: {result} in {seconds:.2f}s")
+    if not result.ok or result.attempts != 3:
+        failed.append("flaky")
+
+    # * another host name, so its breaker is separate
+    throttle_url = f"http://localhost:{port}/throttle"
+    start = time.perf_counter()
+    outcomes = [get(f"{throttle_url}/{n}").outcome for n in range(20)]
+    seconds = time.perf_counter() - start
+    requests = sum(
+        count for path, count in SERVED.items() if "throttle" in path
+    )
+    print(
+        f"throttle: {outcomes.count('circuit_open')} of 20 refused,"
+        f" {requests} requests sent in {seconds:.2f}s"
+    )
+    if requests > request_policy.BREAKER_THRESHOLD or seconds > 3.5:
+        failed.append("throttle")
+
+    # * after the cooldown one trial goes out, it is throttled and the
+    # * breaker opens again
+    time.sleep(request_policy.BREAKER_COOLDOWN)
+    trial = get(f"{throttle_url}/trial")
+    print(f"throttle trial after cooldown: {trial}")
+    if SERVED.get("/throttle/trial") != 1 or trial.ok:
+        failed.append("trial")
+
+    # * a trial that times out opens it again, the next cooldown has a
+    # * trial of its own and a good answer closes the breaker
+    time.sleep(request_policy.breaker(throttle_url).cooldown)
+    trial = get(f"http://localhost:{port}/hang/trial")
+    refused = get(f"http://localhost:{port}/ok/refused")
+    time.sleep(request_policy.breaker(throttle_url).cooldown)
+    closed = get(f"http://localhost:{port}/ok/closed")
+    print(f"hung trial: {trial}, then {refused}, after cooldown {closed}")
+    if trial.outcome != request_policy.TIMEOUT or not closed.ok:
+        failed.append("hung trial")
+    if refused.outcome != request_policy.CIRCUIT_OPEN:
+        failed.append("hung trial")
+
+    for hedge in (False, True):
+        request_policy.HEDGE = hedge
+        TIMINGS.clear()
+        random.seed(1)
+        latencies = sorted(
+            timed_get(f"{url}/tail/{hedge}/{n}")[1] for n in range(100)
+        )
+        print(
+            f"tail, hedge {hedge}: p50 {latencies[50] * 1000:.0f}ms"
+            f" p99 {latencies[98] * 1000:.0f}ms"
+        )
+        if hedge and latencies[98] > 1.0:
+            failed.append("hedge")
+
+    http_fetch.close_client()
+    server.shutdown()
+    request_policy.report()
+    if failed:
+        print(f"[red]Failed: {failed}[/red]")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
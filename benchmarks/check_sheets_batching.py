@@ -0,0 +1,102 @@
+"""Count Sheets API requests for new and existing stock sheets against the
+fake spreadsheet. Writes must be O(1) per run, not one per cell:
+
+    python -m benchmarks.check_sheets_batching --stocks 50
+"""
+import argparse
+import math
+
+from rich import print
+
+import google_sheets_stock as sheets
+from benchmarks.fake_gspread import FakeSpreadsheet
+
+NEW_DATE = "2023-09-01"
+SUMMARY = {
+    "stock_symbol": "AAPL",
+    "market_price": "178.18",
+    "market_change": "-1.15",
+    "market_percent": "-0.006413",
+    "Previous Close": "179.33",
+    "Open": "179.48",
+    "Volume": "51,449,594",
+    "Market Cap": "2.787T",
+    "PE Ratio (TTM)": "29.98",
+}
+PROFILE = {
+    "company": {
+        "name": "Apple Inc.",
+        "address": "One Apple Park Way",
+        "citystatezip": "Cupertino, CA 95014",
+        "site": "https://www.apple.com",
+    },
+    "sector": {
+        "Sector(s)": "Technology",
+        "Industry": "Consumer Electronics",
+        "Full Time Employees": "161,000",
+    },
+}
+
+
+def main():
+    """main starting point of program"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stocks", type=int, default=50)
+    args = parser.parse_args()
+    stocks = [f"S{number:04d}" for number in range(args.stocks)]
+
+    # * new sheets, shape setup_new_sheet reads
+    spreadsheet = FakeSpreadsheet()
+    session = sheets.SheetSession(spreadsheet)
+    new_results = {NEW_DATE: [{"profile": PROFILE}, {"summary": SUMMARY}]}
+    cell_count = 0
+    for stock in stocks:
+        cells = {}
+        worksheet = sheets.setup_new_sheet(
+            stock, session, new_results, NEW_DATE, cells
+        )
+        sheets.write_cells(worksheet, cells)
+        cell_count += len(cells)
+    writes = spreadsheet.requests["write"]
+    print(f"new sheets: {cell_count} cells in {writes} write requests")
+    # * add_worksheet + one batch_update per sheet
+    assert writes == 2 * len(stocks)
+    # * only the worksheet index was read
+    assert spreadsheet.requests["read"] == 1
+
+    # * next day, shape update_summary_data reads
+    next_date = "2023-09-02"
+    update_results = [
+        {"profile": PROFILE},
+        {next_date: [{"summary": SUMMARY}]},
+    ]
+    # * fresh session, so date rows are read back from the fake
+    sheets.open_workbook = lambda: spreadsheet
+    sheets._session = None
+    sheets.open_json_file = lambda stock: update_results
+    spreadsheet.requests.update({"read": 0, "write": 0})
+    batch = []
+    for stock in stocks:
+        sheets.google_sheets(stock, batch)
+    sheets.send_batch(spreadsheet, batch)
+    requests = spreadsheet.requests
+    print(
+        f"update run: {sum(len(item['values']) for item in batch)} cells in"
+        f" {requests['write']} write and {requests['read']} read requests"
+    )
+    # * one values_batch_update for the whole run
+    assert requests["write"] == 1
+    # * one worksheet index plus one batch read of every date row, no
+    # * per-stock auth
+    batch_gets = math.ceil(len(stocks) / sheets.DATE_ROWS_PER_READ)
+    assert requests["read"] == 1 + batch_gets
+
+    # * layout is the same as cell by cell
+    worksheet = spreadsheet.sheets[stocks[0]]
+    assert worksheet.cells[(0, 0)] == stocks[0]
+    assert worksheet.cells[(6, 4)] == next_date
+    assert worksheet.cells[(7, 4)] == SUMMARY["Previous Close"]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Drive google_sheets_stock against a fake spreadsheet that enforces a
+quota. First with the scheduler set to the real quota (no 429s), then set
+too high so the backoff has to recover:
+
+    python -m benchmarks.check_sheets_quota --stocks 40 --quota 20 --window 2
+"""
+import argparse
+
+from rich import print
+
+import google_sheets_stock as sheets
+import rate_limiter
+from benchmarks.check_sheets_batching import PROFILE, SUMMARY
+from benchmarks.fake_gspread import FakeSpreadsheet
+
+
+def run(stocks, quota, window, budget):
+    """One run of main() with the scheduler at budget requests per window"""
+    spreadsheet = FakeSpreadsheet(window=window)
+    # * existing sheets with yesterday's column filled in
+    for stock in stocks:
+        worksheet = spreadsheet.add_worksheet(stock, 1000, 26)
+        worksheet.set_range("A7", [["Summary", "", "", "2023-09-01"]])
+    spreadsheet.requests.update({"read": 0, "write": 0})
+    spreadsheet.quota = {"read": quota, "write": quota}
+
+    sheets.STOCKS = stocks
+    sheets.SCHEDULER = rate_limiter.QuotaScheduler(
+        reads=budget, writes=budget, period=window
+    )
+    opened = []
+    sheets.open_workbook = lambda: opened.append(1) or spreadsheet
+    sheets._session = None
+    sheets.open_json_file = lambda stock: [
+        {"profile": PROFILE},
+        {"2023-09-02": [{"summary": SUMMARY}]},
+    ]
+    sheets.main()
+    # * one authenticated session shared by every worker
+    assert len(opened) == 1, f"workbook opened {len(opened)} times"
+    return spreadsheet
+
+
+def main():
+    """main starting point of program"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stocks", type=int, default=40)
+    parser.add_argument("--quota", type=int, default=20)
+    parser.add_argument("--window", type=float, default=2.0)
+    args = parser.parse_args()
+    stocks = [f"S{number:04d}" for number in range(args.stocks)]
+
+    for budget in (args.quota, args.quota * 3):
+        print(f"scheduler budget {budget} per {args.window}s:")
+        spreadsheet = run(stocks, args.quota, args.window, budget)
+        print(f"  rejected by the fake: {spreadsheet.rejected}")
+        # * every stock still made it in
+        for stock in stocks:
+            assert spreadsheet.sheets[stock].cells[(6, 4)] == "2023-09-02"
+
+
+if __name__ == "__main__":
+    main()
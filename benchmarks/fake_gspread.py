@@ -0,0 +1,135 @@
+"""In-memory stand-in for a gspread Spreadsheet that counts API requests
+and can enforce a Sheets style per-minute quota"""
+import threading
+import time
+from collections import deque
+
+from gspread.exceptions import APIError, WorksheetNotFound
+from xlsxwriter.utility import xl_cell_to_rowcol
+
+
+class QuotaResponse:
+    """Enough of a requests.Response for gspread's APIError"""
+
+    status_code = 429
+    text = "Quota exceeded"
+
+    def json(self):
+        """Body Sheets sends when over quota"""
+        return {
+            "error": {
+                "code": 429,
+                "message": "Quota exceeded for quota metric",
+                "status": "RESOURCE_EXHAUSTED",
+            }
+        }
+
+
+class FakeSpreadsheet:
+    """Spreadsheet with a request counter shared by its worksheets. With a
+    quota, more than quota[kind] requests inside window seconds get a 429"""
+
+    def __init__(self, quota=None, window=60.0):
+        self.sheets = {}
+        self.requests = {"read": 0, "write": 0}
+        self.rejected = {"read": 0, "write": 0}
+        self.quota = quota
+        self.window = window
+        self.recent = {"read": deque(), "write": deque()}
+        self.lock = threading.Lock()
+
+    def count(self, kind):
+        """One API round trip"""
+        with self.lock:
+            if self.quota:
+                now = time.monotonic()
+                recent = self.recent[kind]
+                while recent and recent[0] <= now - self.window:
+                    recent.popleft()
+                if len(recent) >= self.quota[kind]:
+                    self.rejected[kind] += 1
+                    raise APIError(QuotaResponse())
+                recent.append(now)
+            self.requests[kind] += 1
+
+    def worksheet(self, title):
+        """Look up a worksheet by title"""
+        self.count("read")
+        if title not in self.sheets:
+            raise WorksheetNotFound(title)
+        return self.sheets[title]
+
+    def worksheets(self):
+        """Every worksheet, one metadata request"""
+        self.count("read")
+        return list(self.sheets.values())
+
+    def add_worksheet(self, title, rows, cols):
+        """Create a worksheet"""
+        self.count("write")
+        with self.lock:
+            self.sheets[title] = FakeWorksheet(self, title)
+        return self.sheets[title]
+
+    def values_batch_get(self, ranges, params=None):
+        """Read whole rows ("'Title'!7:7") across worksheets in one
+        request, value ranges in the order asked"""
+        self.count("read")
+        value_ranges = []
+        for a1_range in ranges:
+            title, rows = a1_range.rsplit("!", 1)
+            worksheet = self.sheets[title[1:-1].replace("''", "'")]
+            values = worksheet.read_row(int(rows.split(":")[0]))
+            value_range = {"range": a1_range, "majorDimension": "ROWS"}
+            if values:
+                value_range["values"] = [values]
+            value_ranges.append(value_range)
+        return {"valueRanges": value_ranges}
+
+    def values_batch_update(self, body):
+        """Write ranges across worksheets in one request"""
+        self.count("write")
+        for item in body["data"]:
+            title, a1_range = item["range"].split("!")
+            self.sheets[title.strip("'")].set_range(a1_range, item["values"])
+
+
+class FakeWorksheet:
+    """Cells kept in a dict keyed by (row, col), 0 based"""
+
+    def __init__(self, spreadsheet, title):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.cells = {}
+
+    def set_range(self, a1_range, values):
+        """Write a block of values starting at the range's first cell"""
+        row, col = xl_cell_to_rowcol(a1_range.split(":")[0])
+        for row_offset, row_values in enumerate(values):
+            for col_offset, value in enumerate(row_values):
+                self.cells[(row + row_offset, col + col_offset)] = value
+
+    def update_acell(self, label, value):
+        """Write one cell"""
+        self.spreadsheet.count("write")
+        self.set_range(label, [[value]])
+
+    def batch_update(self, data, value_input_option=None):
+        """Write many ranges in one request"""
+        self.spreadsheet.count("write")
+        for item in data:
+            self.set_range(item["range"], item["values"])
+
+    def row_values(self, row):
+        """Values of a 1 based row up to the last filled column"""
+        self.spreadsheet.count("read")
+        return self.read_row(row)
+
+    def read_row(self, row):
+        """Row values without counting a request"""
+        cols = [col for cell_row, col in self.cells if cell_row == row - 1]
+        if not cols:
+            return []
+        return [
+            self.cells.get((row - 1, col), "") for col in range(max(cols) + 1)
+        ]
@@ -0,0 +1,230 @@
+"""Local HTTP server that serves saved Yahoo Finance pages for benchmarks.
+Pages recorded from Yahoo (benchmarks/record.py) are replayed for their
+symbols, every other symbol gets the fixture templates"""
+import json
+import math
+import random
+import re
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURES = Path(__file__).parent / "fixtures"
+RECORDINGS = Path(__file__).parent / "recordings"
+
+# * url path -> saved page, "$SYMBOL" in the page is swapped for the symbol
+ROUTES = [
+    (re.compile(r"^/quote/([^/]+)/profile/?$"), "profile.html"),
+    (re.compile(r"^/quote/([^/]+)/key-statistics/?$"), "key-statistics.html"),
+    (re.compile(r"^/quote/([^/]+)/financials/?$"), "financials.html"),
+    (re.compile(r"^/quote/([^/]+)/balance-sheet/?$"), "balance-sheet.html"),
+    (re.compile(r"^/quote/([^/]+)/cash-flow/?$"), "cash-flow.html"),
+    (
+        re.compile(r"^/ws/fundamentals-timeseries/v1/finance/timeseries/(.+)"),
+        "timeseries.json",
+    ),
+    (re.compile(r"^/quote/([^/]+)/?$"), "quote.html"),
+]
+
+# * v7 multi-symbol quote API, one result per symbol in "symbols". Like
+# * Yahoo it wants the session cookie and the crumb handed out for it
+QUOTE = re.compile(r"^/v7/finance/quote/?$")
+# * any other path sets the cookie on its 404, like fc.yahoo.com
+CRUMB = re.compile(r"^/v1/test/getcrumb/?$")
+COOKIE = "A3"
+UNAUTHORIZED = json.dumps(
+    {
+        "finance": {
+            "result": None,
+            "error": {"code": "Unauthorized", "description": "Invalid Crumb"},
+        }
+    }
+).encode()
+
+# * v7 CSV download, rows are generated for the requested period
+DOWNLOAD = re.compile(r"^/v7/finance/download/([^/]+)$")
+CSV_HEADER = "Date,Open,High,Low,Close,Adj Close,Volume"
+
+
+def history_csv(symbol, query):
+    """Weekday OHLCV rows from period1 up to period2, None if there are
+    none. Prices only depend on the symbol and day so reruns match"""
+    params = parse_qs(query)
+    day = datetime.fromtimestamp(int(params["period1"][0]), timezone.utc)
+    stop = datetime.fromtimestamp(int(params["period2"][0]), timezone.utc)
+    base = 20 + zlib.crc32(symbol.encode()) % 400
+
+    lines = [CSV_HEADER]
+    while day < stop:
+        if day.weekday() < 5:
+            ordinal = day.toordinal()
+            close = base * (1 + 0.2 * math.sin(ordinal / 40))
+            lines.append(
+                f"{day.date()},{close * 0.99:.6f},{close * 1.01:.6f},"
+                f"{close * 0.98:.6f},{close:.6f},{close * 0.97:.6f},"
+                f"{1_000_000 + ordinal % 977 * 1000}"
+            )
+        day += timedelta(days=1)
+
+    if len(lines) == 1:
+        return None
+    return "\n".join(lines) + "\n"
+
+
+def recorded_csv(path, query):
+    """Rows of a recorded download inside the requested period"""
+    params = parse_qs(query)
+    first = datetime.fromtimestamp(int(params["period1"][0]), timezone.utc)
+    stop = datetime.fromtimestamp(int(params["period2"][0]), timezone.utc)
+    header, *rows = path.read_text(encoding="utf-8").splitlines()
+    lines = [header] + [
+        row
+        for row in rows
+        if str(first.date()) <= row.split(",")[0] < str(stop.date())
+    ]
+    if len(lines) == 1:
+        return None
+    return "\n".join(lines) + "\n"
+
+
+def quote_json(symbols, recording) -> bytes:
+    """Batch quote response put together from each symbol's recorded
+    single-symbol response, or the fixture template"""
+    template = (FIXTURES / "quote.json").read_text(encoding="utf-8")
+    results = []
+    for symbol in symbols:
+        recorded = recording(symbol, "quote.json")
+        if recorded:
+            text = recorded.read_text(encoding="utf-8")
+        else:
+            text = template.replace("$SYMBOL", symbol)
+        results += json.loads(text)["quoteResponse"]["result"]
+    response = {"quoteResponse": {"result": results, "error": None}}
+    return json.dumps(response).encode()
+
+
+def content_type(page) -> str:
+    """Content type from the fixture file name"""
+    if page.endswith(".json"):
+        return "application/json"
+    return "text/html"
+
+
+def make_handler(latency, jitter, recordings=None, hits=None, session=None):
+    """Build a request handler that delays every response. With a hits
+    list every requested url path is appended to it. session holds the
+    cookie and crumb currently accepted, change them to expire a session"""
+    session = session if session is not None else {}
+    session.setdefault("cookie", "fixture")
+    session.setdefault("crumb", "fixture-crumb")
+
+    class FixtureHandler(BaseHTTPRequestHandler):
+        """Serve fixture pages for any stock symbol"""
+
+        def has_cookie(self) -> bool:
+            """Check the request carries the session cookie"""
+            cookies = self.headers.get("Cookie", "")
+            return f"{COOKIE}={session['cookie']}" in cookies.split("; ")
+
+        def do_GET(self):
+            """Answer a page request from the fixtures folder"""
+            time.sleep(latency + random.uniform(0, jitter))
+            url = urlsplit(self.path)
+            url_path = url.path
+            if hits is not None:
+                hits.append(url_path)
+            match = DOWNLOAD.match(url_path)
+            if match:
+                recorded = recording(match.group(1), "download.csv")
+                if recorded:
+                    csv = recorded_csv(recorded, url.query)
+                else:
+                    csv = history_csv(match.group(1), url.query)
+                if csv is None:
+                    self.send_error(404, "No data found")
+                else:
+                    self.send_body(csv.encode(), "text/csv")
+                return
+
+            if CRUMB.match(url_path):
+                if not self.has_cookie():
+                    self.send_body(UNAUTHORIZED, "application/json", 401)
+                    return
+                self.send_body(session["crumb"].encode(), "text/plain")
+                return
+
+            if QUOTE.match(url_path):
+                query = parse_qs(url.query)
+                crumb = query.get("crumb", [""])[0]
+                if not self.has_cookie() or crumb != session["crumb"]:
+                    self.send_body(UNAUTHORIZED, "application/json", 401)
+                    return
+                symbols = query.get("symbols", [""])[0]
+                body = quote_json(
+                    [symbol for symbol in symbols.split(",") if symbol],
+                    recording,
+                )
+                self.send_body(body, "application/json")
+                return
+
+            for pattern, page in ROUTES:
+                match = pattern.match(url_path)
+                if match:
+                    recorded = recording(match.group(1), page)
+                    if recorded:
+                        body = recorded.read_bytes()
+                    else:
+                        html = (FIXTURES / page).read_text(encoding="utf-8")
+                        body = html.replace("$SYMBOL", match.group(1))
+                        body = body.encode()
+                    self.send_body(body, content_type(page))
+                    return
+
+            # * the cookie page answers 404 too
+            self.send_response(404)
+            self.send_header(
+                "Set-Cookie", f"{COOKIE}={session['cookie']}; Path=/"
+            )
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def send_body(self, body, kind, status=200):
+            """Response with a body"""
+            self.send_response(status)
+            self.send_header("Content-Type", kind)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            """Keep the benchmark output quiet"""
+
+    def recording(symbol, page):
+        """Recorded copy of a page for a symbol, None to use the fixture"""
+        if recordings is None:
+            return None
+        path = Path(recordings, symbol, page)
+        return path if path.is_file() else None
+
+    return FixtureHandler
+
+
+def serve(port=0, latency=0.0, jitter=0.0, recordings=None, hits=None):
+    """Start the fixture server on a background thread. With a recordings
+    folder, recorded symbols are replayed. server.session is the cookie
+    and crumb it accepts"""
+    session = {}
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", port),
+        make_handler(latency, jitter, recordings, hits, session),
+    )
+    server.session = session
+    server.daemon_threads = True
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
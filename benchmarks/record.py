@@ -0,0 +1,88 @@
+"""Record real Yahoo Finance responses once so benchmarks can replay them
+offline from the fixture server:
+
+    python -m benchmarks.record AAPL MSFT F
+
+Statement tabs aren't recorded, their "Quarterly" toggle runs Yahoo's
+scripts. The replay server answers those with the fixture templates.
+"""
+import argparse
+import time
+
+import httpx
+from rich import print
+
+import financials_json
+import http_fetch
+from benchmarks.fixture_server import RECORDINGS
+
+FINANCE_URL = "https://finance.yahoo.com"
+QUERY_URL = "https://query1.finance.yahoo.com"
+
+# * file the replay server looks for -> (url, query params)
+RESPONSES = {
+    "quote.html": (FINANCE_URL + "/quote/{0}", {"p": "{0}"}),
+    "profile.html": (FINANCE_URL + "/quote/{0}/profile", {"p": "{0}"}),
+    "key-statistics.html": (
+        FINANCE_URL + "/quote/{0}/key-statistics",
+        {"p": "{0}"},
+    ),
+    "timeseries.json": (
+        QUERY_URL + "/ws/fundamentals-timeseries/v1/finance/timeseries/{0}",
+        {
+            "symbol": "{0}",
+            "type": ",".join(financials_json.quarterly_types()),
+            "merge": "false",
+            "padTimeSeries": "true",
+            "period1": "493590046",
+            "period2": "{now}",
+        },
+    ),
+    # * one symbol per recording, the replay server batches them
+    "quote.json": (QUERY_URL + "/v7/finance/quote", {"symbols": "{0}"}),
+    "download.csv": (
+        QUERY_URL + "/v7/finance/download/{0}",
+        {
+            "period1": "0",
+            "period2": "{now}",
+            "interval": "1d",
+            "events": "history",
+            "includeAdjustedClose": "true",
+        },
+    ),
+}
+
+
+def record(symbol, folder=RECORDINGS):
+    """Save every response for one symbol"""
+    now = str(int(time.time()))
+    (folder / symbol).mkdir(exist_ok=True, parents=True)
+    for name, (url, params) in RESPONSES.items():
+        params = {
+            key: value.format(symbol, now=now) for key, value in params.items()
+        }
+        try:
+            response = http_fetch.get_client().get(
+                url.format(symbol), params=params
+            )
+            response.raise_for_status()
+        except httpx.HTTPError as error:
+            print(f"{symbol} {name} not recorded: {error!r}")
+            continue
+        (folder / symbol / name).write_text(response.text, encoding="utf-8")
+        print(f"{symbol} {name}: {len(response.content):,} bytes")
+
+
+def main():
+    """main starting point of program"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("symbols", nargs="+")
+    args = parser.parse_args()
+
+    for symbol in args.symbols:
+        record(symbol)
+    http_fetch.close_client()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""Peak resident memory of this process and its children (Chromium)"""
+import threading
+import time
+
+from memory import tree_rss
+
+
+class PeakRss:
+    """Sample RSS of the process tree on a background thread"""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0
+        self.running = False
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+
+    def sample(self):
+        """Keep the highest reading"""
+        while self.running:
+            self.peak = max(self.peak, tree_rss())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.running = True
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.running = False
+        self.thread.join()
+        self.peak = max(self.peak, tree_rss())
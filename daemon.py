@@ -0,0 +1,302 @@
+"""Long running scraper. Keeps Chromium and the parse pool warm, runs the
+daily summary and quarterly jobs when they are due and answers ad-hoc
+symbol requests from a local socket between stocks:
+
+    python daemon.py run
+    python daemon.py ask TSLA [summary|profile]
+"""
+import json
+import queue
+import socket
+import socketserver
+import sys
+import threading
+import time
+from datetime import datetime
+from datetime import time as day_time
+from pathlib import Path
+
+from playwright.sync_api import sync_playwright
+from rich import print
+
+import atomic_file
+import fetch_cache
+import http_fetch
+import market_calendar
+import memory
+import navigation
+import parse_stage
+import quarterly_data
+import request_policy
+import run_journal
+import scrap_yahoo_finance as yahoo
+import tracing
+
+SOCKET_PATH = Path("stock_data", "daemon.sock")
+STATE_PATH = Path("stock_data", "daemon.json")
+
+# * New York closes at 16:00, the summary job runs after this local time
+SUMMARY_AFTER = day_time(16, 30)
+# * a fresh context after this many navigations or this much memory
+RECYCLE_PAGES = 500
+RSS_LIMIT = 2 * 2**30
+# * seconds between checks for due jobs
+POLL = 60
+# * seconds a socket client waits for its answer
+ANSWER_TIMEOUT = 300
+
+AD_HOC_PAGES = ["summary", "profile"]
+
+
+class BrowserPool:
+    """One warm Chromium. The context is closed and a new one opened after
+    recycle_pages navigations or once the browser's processes pass
+    rss_limit, so memory held by old pages doesn't pile up"""
+
+    def __init__(
+        self, play_wright, recycle_pages=RECYCLE_PAGES, rss_limit=RSS_LIMIT
+    ):
+        self.browser = play_wright.chromium.launch()
+        self.recycle_pages = recycle_pages
+        self.rss_limit = rss_limit
+        self.page = None
+        self.nav_stats = None
+        self.pages = 0
+
+    def count(self, frame):
+        """Navigation of the main frame"""
+        if frame == self.page.main_frame:
+            self.pages += 1
+
+    def get(self):
+        """Page for the next stock, recycled first when it is worn out"""
+        if self.page is None:
+            self.open()
+        elif self.pages >= self.recycle_pages:
+            self.recycle(f"{self.pages} pages")
+        else:
+            rss = memory.browser_rss()
+            if rss > self.rss_limit:
+                self.recycle(f"RSS {rss / 2**20:.0f} MB")
+        return self.page
+
+    def open(self):
+        """New context and page"""
+        self.page, self.nav_stats = navigation.new_page(self.browser)
+        self.page.on("framenavigated", self.count)
+        self.pages = 0
+
+    def recycle(self, reason):
+        """Throw the context away and open a new one"""
+        print(f"Recycling browser context after {reason}")
+        self.page.context.close()
+        tracing.count("context_recycles")
+        self.open()
+
+    def report(self, stock):
+        """Request counters of the stock just scraped"""
+        navigation.report(stock, self.nav_stats)
+
+
+class RequestServer(socketserver.ThreadingUnixStreamServer):
+    """Local socket taking one JSON line request per connection"""
+
+    daemon_threads = True
+
+    def __init__(self, path, requests):
+        self.requests = requests
+        super().__init__(str(path), RequestHandler)
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Queue the request for the scraping thread and wait for the answer"""
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError as error:
+            answer = {"error": f"bad request: {error}"}
+        else:
+            reply = queue.Queue(maxsize=1)
+            self.server.requests.put((request, reply))
+            try:
+                answer = reply.get(timeout=ANSWER_TIMEOUT)
+            except queue.Empty:
+                answer = {"error": "timed out waiting for the scraper"}
+        self.wfile.write(json.dumps(answer).encode() + b"\n")
+
+
+def main():
+    """main starting point of program"""
+    command = sys.argv[1:2]
+    if command == ["run"]:
+        run()
+    elif command == ["ask"] and len(sys.argv) > 2:
+        page_type = sys.argv[3] if len(sys.argv) > 3 else "summary"
+        print(ask(sys.argv[2], page_type))
+    else:
+        print("usage: python daemon.py run | ask SYMBOL [summary|profile]")
+
+
+def run(poll=POLL):
+    """Serve until interrupted"""
+    SOCKET_PATH.parent.mkdir(exist_ok=True, parents=True)
+    # * a socket file left behind by a killed daemon
+    SOCKET_PATH.unlink(missing_ok=True)
+    requests = queue.Queue()
+    server = RequestServer(SOCKET_PATH, requests)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Listening on {SOCKET_PATH}")
+
+    state = read_state()
+    try:
+        with sync_playwright() as play_wright, parse_stage.pool() as workers:
+            browsers = BrowserPool(play_wright)
+            while True:
+                now = datetime.now()
+                if summary_due(state, now):
+                    summary_job(browsers, workers, requests)
+                    state["summary"] = str(now.date())
+                    write_state(state)
+                if quarterly_due(state, now):
+                    quarterly_job(browsers, requests)
+                    state["quarterly"] = str(now.date())
+                    state["quarter"] = quarterly_data.quarterly_date(now)
+                    write_state(state)
+                answer_requests(browsers, requests, timeout=poll)
+    except KeyboardInterrupt:
+        print("Stopping")
+    finally:
+        server.shutdown()
+        server.server_close()
+        SOCKET_PATH.unlink(missing_ok=True)
+        http_fetch.close_client()
+
+
+def read_state() -> dict:
+    """Dates the jobs last finished, so a restart doesn't run them again"""
+    if STATE_PATH.is_file():
+        return json.loads(STATE_PATH.read_text(encoding="utf-8"))
+    return {}
+
+
+def write_state(state):
+    """Save the job dates"""
+    atomic_file.write_text(STATE_PATH, json.dumps(state))
+
+
+def summary_due(state, now) -> bool:
+    """Once per trading day, after the close"""
+    return (
+        market_calendar.is_trading_day(now.date())
+        and now.time() >= SUMMARY_AFTER
+        and state.get("summary") != str(now.date())
+    )
+
+
+def quarterly_due(state, now) -> bool:
+    """First run in a new quarter, then daily through the reporting window
+    so late reports are picked up. Each stock still skips itself while its
+    data is fresh"""
+    if state.get("quarter") != quarterly_data.quarterly_date(now):
+        return True
+    ran_today = state.get("quarterly") == str(now.date())
+    return quarterly_data.reporting(now) and not ran_today
+
+
+def summary_job(browsers, workers, requests):
+    """scrap_yahoo_finance's daily run on the warm browser and parse pool"""
+    print("[bold]Summary job[/bold]")
+    navigation.reset_steps()
+    run = run_journal.start("summary")
+    futures = {}
+    for stock, quotes in yahoo.with_quotes(yahoo.plan(yahoo.STOCKS)):
+        print(stock)
+        with tracing.span("stock", symbol=stock):
+            futures[stock] = yahoo.process_stocks(
+                browsers.get(), stock, workers, run, quotes
+            )
+        browsers.report(stock)
+        answer_requests(browsers, requests)
+
+    parse_stage.collect(futures)
+    fetch_cache.report()
+    request_policy.report()
+
+
+def quarterly_job(browsers, requests):
+    """quarterly_data's run on the warm browser"""
+    print("[bold]Quarterly job[/bold]")
+    navigation.reset_steps()
+    run = run_journal.start("quarterly")
+    for stock in quarterly_data.plan(quarterly_data.STOCKS):
+        print(stock)
+        with tracing.span("stock", symbol=stock):
+            quarterly_data.process_stocks(browsers.get(), stock, run)
+        browsers.report(stock)
+        answer_requests(browsers, requests)
+
+    navigation.report_steps()
+    fetch_cache.report()
+    request_policy.report()
+
+
+def answer_requests(browsers, requests, timeout=0):
+    """Scrape every waiting ad-hoc request, waiting up to timeout seconds
+    for the first one"""
+    while True:
+        try:
+            if timeout:
+                request, reply = requests.get(timeout=timeout)
+            else:
+                request, reply = requests.get_nowait()
+        except queue.Empty:
+            return
+        timeout = 0
+        # * a bad symbol or a broken page must not take the daemon down
+        try:
+            answer = lookup(browsers, request)
+        except Exception as error:
+            print(f"[red]Request {request} failed: {error!r}[/red]")
+            answer = {"error": repr(error)}
+        reply.put(answer)
+
+
+def lookup(browsers, request) -> dict:
+    """Fetch and parse one page for a socket client"""
+    stock = str(request.get("symbol", "")).upper()
+    page_type = request.get("page", "summary")
+    if not stock or page_type not in AD_HOC_PAGES:
+        return {"error": f"want a symbol and a page in {AD_HOC_PAGES}"}
+
+    start = time.perf_counter()
+    with tracing.span("ad_hoc", symbol=stock, page=page_type):
+        # * an intraday lookup isn't the day's snapshot, nor saved output
+        fragments = yahoo.fetch_page(
+            browsers.get(), stock, page_type, archive=False
+        )
+        # * nothing is saved, drop the held back cache row
+        fetch_cache.take(stock)
+        if fragments is None:
+            _, _, outcome, _ = request_policy.FAILURES[-1]
+            return {"symbol": stock, "error": outcome}
+        record = parse_stage.PARSERS[page_type](stock, fragments)
+    return {
+        "symbol": stock,
+        **record,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def ask(stock, page_type="summary") -> dict:
+    """Send one request to a running daemon"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(str(SOCKET_PATH))
+        request = {"symbol": stock, "page": page_type}
+        client.sendall(json.dumps(request).encode() + b"\n")
+        with client.makefile("rb") as answer:
+            return json.loads(answer.readline())
+
+
+if __name__ == "__main__":
+    main()
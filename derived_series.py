@@ -0,0 +1,259 @@
+"""Weekly, monthly and quarterly bars plus returns, volatility and moving
+averages computed from the daily OHLCV store instead of downloading each
+interval. Results are cached per stock and only the rows appended since
+the last run are computed:
+
+    python derived_series.py update [SYMBOL ...]
+    python derived_series.py rebuild [SYMBOL ...]
+"""
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+from rich import print
+
+import atomic_file
+import ohlcv_store
+
+FOLDER = "derived"
+META = "meta.json"
+
+# * bar period -> pandas offset alias (pandas 2.1 names)
+PERIODS = {"weekly": "W-FRI", "monthly": "M", "quarterly": "Q"}
+BAR_AGG = {
+    "open": "first",
+    "high": "max",
+    "low": "min",
+    "close": "last",
+    "adj_close": "last",
+    "volume": "sum",
+}
+MA_WINDOWS = (20, 50, 200)
+VOL_WINDOW = 20
+TRADING_DAYS = 252
+# * rows before the first new one that the rolling windows look at
+LOOKBACK = max(*MA_WINDOWS, VOL_WINDOW + 1)
+# * stocks per 2-D pass, bounds memory on a full rebuild
+CHUNK = 500
+
+
+def main():
+    """main starting point of program"""
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command not in ("update", "rebuild"):
+        print("usage: python derived_series.py update|rebuild [SYMBOL ...]")
+        return
+
+    symbols = sys.argv[2:] or [
+        path.parent.name
+        for path in ohlcv_store.DATA_DIR.glob(f"*/{ohlcv_store.FOLDER}")
+    ]
+    update(symbols, rebuild=command == "rebuild")
+
+
+def series_names() -> list:
+    """Names of the daily derived series"""
+    return (
+        ["return", f"volatility_{VOL_WINDOW}"]
+        + [f"sma_{window}" for window in MA_WINDOWS]
+    )
+
+
+def folder(symbol):
+    """Cache folder of a stock"""
+    return ohlcv_store.DATA_DIR / symbol / FOLDER
+
+
+def read_meta(symbol) -> dict:
+    """Rows of the store the cache was built from"""
+    path = folder(symbol) / META
+    if not path.is_file():
+        return {}
+
+    with path.open(mode="r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def write_meta(symbol, columns, generation):
+    """Remember how far the cache got and which rewrite of the store it
+    was built from"""
+    path = folder(symbol) / META
+    rows = len(columns["date"])
+    atomic_file.write_text(
+        path, json.dumps({"rows": rows, "generation": generation})
+    )
+
+
+def cached_rows(symbol, columns, generation) -> int:
+    """Store rows already in the cache, 0 when it has to be rebuilt"""
+    meta = read_meta(symbol)
+    rows = meta.get("rows", 0)
+    if rows == 0:
+        return 0
+
+    # * a merge that rewrote stored rows (a revised close, a split) keeps
+    # * the count and last date, the store's generation tells
+    if rows > len(columns["date"]):
+        return 0
+    if meta.get("generation") != generation:
+        return 0
+    # * a run stopped between the appends and the meta file
+    for name in series_names():
+        path = folder(symbol) / f"{name}.bin"
+        if not path.is_file() or path.stat().st_size != rows * 8:
+            return 0
+    return rows
+
+
+def update(symbols, rebuild=False):
+    """Bring the cache of every stock up to its store"""
+    updated = 0
+    for start in range(0, len(symbols), CHUNK):
+        stores, cached, generations = {}, {}, {}
+        for symbol in symbols[start : start + CHUNK]:
+            # * read before the columns, a rewrite in between rebuilds
+            # * next time instead of being missed
+            generations[symbol] = ohlcv_store.generation(symbol)
+            columns = ohlcv_store.open_columns(symbol)
+            if len(columns["date"]) == 0:
+                continue
+            stores[symbol] = columns
+            cached[symbol] = (
+                0
+                if rebuild
+                else cached_rows(symbol, columns, generations[symbol])
+            )
+
+        todo = [
+            symbol
+            for symbol in stores
+            if len(stores[symbol]["date"]) > cached[symbol]
+        ]
+        if not todo:
+            continue
+
+        for symbol in todo:
+            folder(symbol).mkdir(exist_ok=True, parents=True)
+        update_series(todo, stores, cached)
+        update_bars(todo, cached)
+        for symbol in todo:
+            write_meta(symbol, stores[symbol], generations[symbol])
+        updated += len(todo)
+
+    print(f"Derived series: {updated} of {len(symbols)} stocks updated")
+
+
+def compute_series(matrix) -> dict:
+    """Daily series for a (rows, stocks) price matrix in one pass"""
+    prices = pd.DataFrame(matrix)
+    returns = prices.pct_change(fill_method=None)
+    series = {
+        "return": returns,
+        f"volatility_{VOL_WINDOW}": returns.rolling(VOL_WINDOW).std()
+        * np.sqrt(TRADING_DAYS),
+    }
+    for window in MA_WINDOWS:
+        series[f"sma_{window}"] = prices.rolling(window).mean()
+    return {name: frame.to_numpy() for name, frame in series.items()}
+
+
+def update_series(symbols, stores, cached):
+    """Compute the new rows of every stock and append them to its files.
+    Columns are right aligned so each window only sees its own stock"""
+    new = {
+        symbol: len(stores[symbol]["date"]) - cached[symbol]
+        for symbol in symbols
+    }
+    depth = max(
+        new[symbol] + min(cached[symbol], LOOKBACK) for symbol in symbols
+    )
+    matrix = np.full((depth, len(symbols)), np.nan)
+    for index, symbol in enumerate(symbols):
+        first = max(cached[symbol] - LOOKBACK, 0)
+        values = stores[symbol]["adj_close"][first:]
+        matrix[depth - len(values) :, index] = values
+
+    results = compute_series(matrix)
+    for index, symbol in enumerate(symbols):
+        mode = "ab" if cached[symbol] else "wb"
+        for name, values in results.items():
+            tail = values[depth - new[symbol] :, index]
+            path = folder(symbol) / f"{name}.bin"
+            with path.open(mode=mode) as file:
+                tail.astype("<f8").tofile(file)
+
+
+def resample(frames, rule) -> dict:
+    """Bars for many stocks in one groupby, dict of symbol -> bars"""
+    frames = {symbol: frame for symbol, frame in frames.items() if len(frame)}
+    if not frames:
+        return {}
+
+    daily = pd.concat(frames, names=["symbol", "date"])
+    bars = (
+        daily.groupby(
+            [pd.Grouper(level="symbol"), pd.Grouper(level="date", freq=rule)]
+        )
+        .agg(BAR_AGG)
+        .dropna(subset=["close"])
+    )
+    return {
+        symbol: group.droplevel("symbol")
+        for symbol, group in bars.groupby(level="symbol")
+    }
+
+
+def update_bars(symbols, cached):
+    """Rebuild each stock's bars from the start of its last cached period,
+    that bar may have been a partial week, month or quarter"""
+    for period, rule in PERIODS.items():
+        frames, kept = {}, {}
+        for symbol in symbols:
+            path = folder(symbol) / f"bars_{period}.csv"
+            bars = pd.DataFrame()
+            if cached[symbol] and path.is_file():
+                bars = pd.read_csv(path, index_col="date", parse_dates=True)
+
+            start = None
+            if len(bars) > 1:
+                start = bars.index[-2] + pd.Timedelta(days=1)
+            kept[symbol] = bars.iloc[:-1] if start is not None else None
+            frames[symbol] = ohlcv_store.load(symbol, start=start)
+
+        rebuilt = resample(frames, rule)
+        for symbol in symbols:
+            parts = [kept[symbol], rebuilt.get(symbol)]
+            parts = [part for part in parts if part is not None]
+            if parts:
+                bars = pd.concat(parts)
+                bars.index.name = "date"
+                with atomic_file.atomic_open(
+                    folder(symbol) / f"bars_{period}.csv", newline=""
+                ) as file:
+                    bars.to_csv(file)
+
+
+def load_series(symbol, name, start=None, end=None) -> pd.Series:
+    """A cached daily series over a date range, backed by a memmap"""
+    dates = ohlcv_store.open_columns(symbol)["date"]
+    rows = min(read_meta(symbol).get("rows", 0), len(dates))
+    values = np.empty(0)
+    if rows:
+        path = folder(symbol) / f"{name}.bin"
+        values = np.memmap(path, dtype="<f8", mode="r", shape=(rows,))
+
+    dates = dates[:rows]
+    window = ohlcv_store.date_slice(dates, start, end)
+    index = pd.DatetimeIndex(dates[window].view("datetime64[s]"), name="date")
+    return pd.Series(values[window], index=index, name=name, copy=False)
+
+
+def load_bars(symbol, period) -> pd.DataFrame:
+    """Cached weekly, monthly or quarterly bars"""
+    path = folder(symbol) / f"bars_{period}.csv"
+    return pd.read_csv(path, index_col="date", parse_dates=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Declarative extraction for the page parsers. Each page type is a spec of
+fields (first node matching a selector) and rows (a key cell and a value
+cell inside every node matching the row selector), compiled once at import
+and run on the lexbor parser. A cell selector is queried once per row even
+when it gives both the key and the value"""
+from selectolax.lexbor import LexborHTMLParser
+
+import tracing
+
+STATEMENT_ROW = "div[data-test='fin-row']"
+STATEMENT_COL = "div[data-test='fin-col']"
+
+# * page type -> spec
+# *   fields: name -> (selector, "text" | "lines" | "@attribute")
+# *   rows: (row selector, (key cell, index), (value cell, index))
+# *   within: rows are only read inside the first node matching this
+# *   strip: strip whitespace off the row keys
+# *   pairs: (selector, cell, count) the first match's cells read as
+# *          key, value, key, value... for count pairs
+SPECS = {
+    "profile": {
+        "fields": {"name": ("h3", "text"), "address": ("p", "lines")},
+        "pairs": ("p:nth-child(2)", "span", 3),
+    },
+    "header": {
+        "fields": {
+            "market_price": (
+                "fin-streamer[data-test='qsp-price']",
+                "text",
+            ),
+            "market_change": (
+                "fin-streamer[data-test='qsp-price-change']",
+                "text",
+            ),
+            "market_percent": (
+                "fin-streamer[data-field='regularMarketChangePercent']",
+                "@value",
+            ),
+        },
+    },
+    "summary": {"rows": ("table tr", ("td", 0), ("td", 1))},
+    "stats": {
+        "within": "table",
+        "rows": ("tbody tr", ("td", 0), ("td", 2)),
+        "strip": True,
+    },
+    # * the fin-col each statement reads, balance takes the first
+    "income": {"rows": (STATEMENT_ROW, ("span", 0), (STATEMENT_COL, 1))},
+    "balance": {"rows": (STATEMENT_ROW, ("span", 0), (STATEMENT_COL, 0))},
+    "cash": {"rows": (STATEMENT_ROW, ("span", 0), (STATEMENT_COL, 1))},
+}
+
+
+def check_selector(selector) -> str:
+    """Raise on a selector lexbor can't parse, at import not mid scrape"""
+    LexborHTMLParser("<p></p>").css(selector)
+    return selector
+
+
+def compile_spec(spec) -> dict:
+    """Checked selectors of a spec, row cells grouped by selector so each
+    is queried once per row"""
+    plan = {
+        "fields": [
+            (name, check_selector(selector), how)
+            for name, (selector, how) in spec.get("fields", {}).items()
+        ],
+        "within": spec.get("within") and check_selector(spec["within"]),
+        "rows": None,
+        "pairs": None,
+        "strip": spec.get("strip", False),
+    }
+    if "rows" in spec:
+        row, key, value = spec["rows"]
+        cells = {}
+        for role, (selector, index) in (("key", key), ("value", value)):
+            cells.setdefault(check_selector(selector), []).append(
+                (role, index)
+            )
+        plan["rows"] = (check_selector(row), list(cells.items()))
+    if "pairs" in spec:
+        selector, cell, count = spec["pairs"]
+        plan["pairs"] = (
+            check_selector(selector),
+            check_selector(cell),
+            count * 2,
+        )
+    return plan
+
+
+PLANS = {page_type: compile_spec(spec) for page_type, spec in SPECS.items()}
+
+
+def read(node, how) -> str:
+    """Text, "*" separated text or an attribute of a node"""
+    if how == "text":
+        return node.text()
+    if how == "lines":
+        return node.text(separator="*")
+    return node.attrs[how[1:]]
+
+
+def extract(page_type, html) -> dict:
+    """Fields, rows and pairs of a page type from one fragment. A missing
+    field raises like the hand written parsers did"""
+    plan = PLANS[page_type]
+    with tracing.span("html_parser", bytes=len(html)):
+        data = LexborHTMLParser(html)
+
+    record = {}
+    with tracing.span("selectors"):
+        for name, selector, how in plan["fields"]:
+            record[name] = read(data.css_first(selector), how)
+
+        if plan["rows"] is not None:
+            row_selector, cells = plan["rows"]
+            scope = data.css_first(plan["within"]) if plan["within"] else data
+            for row in scope.css(row_selector):
+                found = {}
+                for selector, wanted in cells:
+                    nodes = row.css(selector)
+                    for role, index in wanted:
+                        found[role] = nodes[index].text()
+                key = found["key"].strip() if plan["strip"] else found["key"]
+                record[key] = found["value"]
+
+        if plan["pairs"] is not None:
+            selector, cell, limit = plan["pairs"]
+            node = data.css_first(selector)
+            texts = [item.text() for item in node.css(cell)[:limit]]
+            record.update(zip(texts[::2], texts[1::2]))
+
+    return record
@@ -0,0 +1,206 @@
+"""Fetch cache keyed by (symbol, page type). Skips pages still inside their
+TTL, sends ETag/Last-Modified so unchanged pages come back 304, and skips
+the parse when the extracted fragment hashes the same as last time"""
+import hashlib
+from datetime import datetime, timedelta
+
+from rich import print
+
+import market_calendar
+import stock_store
+import tracing
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fetch_cache (
+    symbol TEXT NOT NULL,
+    page TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    content_hash TEXT,
+    fetched_at TEXT NOT NULL,
+    PRIMARY KEY (symbol, page)
+) WITHOUT ROWID;
+"""
+stock_store.register(SCHEMA)
+
+PROFILE_TTL = timedelta(days=30)
+# * after a quarter end companies report over weeks, poll this often
+REPORTING_WINDOW = timedelta(days=60)
+REPORTING_POLL = timedelta(days=7)
+
+# * returned by fetchers when the page hasn't changed
+UNCHANGED = "unchanged"
+
+# * lookups, then how each page that was looked at or fetched came out
+STATS = {
+    "lookups": 0,
+    "fresh": 0,
+    "not_modified": 0,
+    "unchanged": 0,
+    "changed": 0,
+}
+
+# * symbol -> {page: row} of changed pages whose output isn't saved yet
+_pending = {}
+
+
+def connect():
+    """Store connection, the cache table comes with it"""
+    return stock_store.connect()
+
+
+def entry(symbol, page):
+    """Cached row for a symbol and page, None if never fetched"""
+    return (
+        connect()
+        .execute(
+            "SELECT etag, last_modified, content_hash, fetched_at"
+            " FROM fetch_cache WHERE symbol = ? AND page = ?",
+            (symbol, page),
+        )
+        .fetchone()
+    )
+
+
+def fetched_at(symbol, page):
+    """When a page was last fetched, None if never"""
+    row = (
+        connect()
+        .execute(
+            "SELECT fetched_at FROM fetch_cache"
+            " WHERE symbol = ? AND page = ?",
+            (symbol, page),
+        )
+        .fetchone()
+    )
+    return None if row is None else datetime.fromisoformat(row[0])
+
+
+def expires(page, fetched_at) -> datetime:
+    """When a page fetched at fetched_at goes stale"""
+    if page == "profile":
+        return fetched_at + PROFILE_TTL
+
+    if page == "summary":
+        # * good until the next trading day opens
+        day = fetched_at.date() + timedelta(days=1)
+        while not market_calendar.is_trading_day(day):
+            day += timedelta(days=1)
+        return market_calendar.session_open(day)
+
+    # * statistics and statements change after quarter end
+    quarter_end = market_calendar.last_quarter_end(fetched_at.date())
+    next_end = market_calendar.last_quarter_end(
+        quarter_end + timedelta(days=100)
+    )
+    if fetched_at.date() - quarter_end < REPORTING_WINDOW:
+        poll = fetched_at + REPORTING_POLL
+        return min(poll, datetime.combine(next_end, datetime.min.time()))
+    return datetime.combine(next_end, datetime.min.time())
+
+
+def is_fresh(symbol, page, now=None) -> bool:
+    """Check if a page is still inside its TTL, counted for the hit rate"""
+    now = now or datetime.now()
+    STATS["lookups"] += 1
+    fetched = fetched_at(symbol, page)
+    if fetched is None:
+        return False
+
+    if now < expires(page, fetched):
+        STATS["fresh"] += 1
+        tracing.count("cache_hits", page)
+        return True
+    return False
+
+
+def validators(symbol, page) -> dict:
+    """Conditional request headers from the last response"""
+    row = entry(symbol, page)
+    headers = {}
+    if row and row[0]:
+        headers["If-None-Match"] = row[0]
+    if row and row[1]:
+        headers["If-Modified-Since"] = row[1]
+    return headers
+
+
+def not_modified(symbol, page):
+    """Server answered 304, start the TTL over"""
+    STATS["not_modified"] += 1
+    tracing.count("cache_hits", page)
+    conn = connect()
+    conn.execute(
+        "UPDATE fetch_cache SET fetched_at = ? WHERE symbol = ? AND page = ?",
+        (datetime.now().isoformat(), symbol, page),
+    )
+    conn.commit()
+
+
+def digest(fragments) -> str:
+    """Hash of the fragments of one fetch"""
+    return hashlib.sha256("".join(fragments).encode()).hexdigest()
+
+
+def changed(symbol, page, fragments) -> bool:
+    """Check if fragments differ from the last fetch, without saving them"""
+    row = entry(symbol, page)
+    return row is None or row[2] != digest(fragments)
+
+
+def update(symbol, page, fragments, headers=None, defer=False) -> bool:
+    """Save the fragment hash and validators. False if nothing changed.
+    With defer a changed page is held until take hands it to whoever saves
+    its output, so a parse that fails fetches the page again"""
+    content_hash = digest(fragments)
+    row = entry(symbol, page)
+    changed = row is None or row[2] != content_hash
+    if not changed:
+        STATS["unchanged"] += 1
+        tracing.count("cache_hits", page)
+    else:
+        STATS["changed"] += 1
+
+    headers = headers or {}
+    row = (
+        symbol,
+        page,
+        headers.get("etag"),
+        headers.get("last-modified"),
+        content_hash,
+        datetime.now().isoformat(),
+    )
+    if defer and changed:
+        _pending.setdefault(symbol, {})[page] = row
+    else:
+        save([row])
+    return changed
+
+
+def take(symbol) -> list:
+    """Rows held back for a symbol's pages, to save once its output is on
+    disk"""
+    return list(_pending.pop(symbol, {}).values())
+
+
+def save(rows):
+    """Write cache rows"""
+    conn = connect()
+    conn.executemany(
+        "INSERT OR REPLACE INTO fetch_cache VALUES (?, ?, ?, ?, ?, ?)", rows
+    )
+    conn.commit()
+
+
+def report():
+    """Print the cache hit rate for the run, the share of pages that
+    weren't fetched or came back the same"""
+    hits = STATS["fresh"] + STATS["not_modified"] + STATS["unchanged"]
+    pages = hits + STATS["changed"]
+    rate = hits / pages * 100 if pages else 0.0
+    print(
+        f"Fetch cache: {STATS['lookups']} lookups, {STATS['fresh']} fresh,"
+        f" {STATS['not_modified']} not modified,"
+        f" {STATS['unchanged']} unchanged, {STATS['changed']} changed,"
+        f" hit rate {rate:.0f}%"
+    )
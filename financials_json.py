@@ -0,0 +1,255 @@
+"""Quarterly income, balance and cash flow from Yahoo's JSON instead of
+three page loads. The statement tables are built from the timeseries data
+the page downloads, either straight from the timeseries API or from the
+store embedded in the financials page"""
+import json
+import re
+import time
+
+from rich import print
+
+import http_fetch
+import navigation
+import request_policy
+import snapshot_archive
+
+# * point at a local fixture server for benchmarks
+BASE_URL = "https://finance.yahoo.com"
+QUERY_URL = "https://query1.finance.yahoo.com"
+
+# * row label on the page -> timeseries type, in page order
+STATEMENTS = {
+    "income": {
+        "Total Revenue": "TotalRevenue",
+        "Cost of Revenue": "CostOfRevenue",
+        "Gross Profit": "GrossProfit",
+        "Operating Expense": "OperatingExpense",
+        "Operating Income": "OperatingIncome",
+        "Net Non Operating Interest Income Expense": (
+            "NetNonOperatingInterestIncomeExpense"
+        ),
+        "Other Income Expense": "OtherIncomeExpense",
+        "Pretax Income": "PretaxIncome",
+        "Tax Provision": "TaxProvision",
+        "Net Income Common Stockholders": "NetIncomeCommonStockholders",
+        "Diluted NI Available to Com Stockholders": (
+            "DilutedNIAvailtoComStockholders"
+        ),
+        "Basic EPS": "BasicEPS",
+        "Diluted EPS": "DilutedEPS",
+        "Basic Average Shares": "BasicAverageShares",
+        "Diluted Average Shares": "DilutedAverageShares",
+        "Total Operating Income as Reported": (
+            "TotalOperatingIncomeAsReported"
+        ),
+        "Total Expenses": "TotalExpenses",
+        "Net Income from Continuing & Discontinued Operation": (
+            "NetIncomeFromContinuingAndDiscontinuedOperation"
+        ),
+        "Normalized Income": "NormalizedIncome",
+        "Interest Income": "InterestIncome",
+        "Interest Expense": "InterestExpense",
+        "Net Interest Income": "NetInterestIncome",
+        "EBIT": "EBIT",
+        "EBITDA": "EBITDA",
+        "Reconciled Cost of Revenue": "ReconciledCostOfRevenue",
+        "Reconciled Depreciation": "ReconciledDepreciation",
+        "Net Income from Continuing Operation Net Minority Interest": (
+            "NetIncomeFromContinuingOperationNetMinorityInterest"
+        ),
+        "Normalized EBITDA": "NormalizedEBITDA",
+        "Tax Rate for Calcs": "TaxRateForCalcs",
+        "Tax Effect of Unusual Items": "TaxEffectOfUnusualItems",
+    },
+    "balance": {
+        "Total Assets": "TotalAssets",
+        "Total Liabilities Net Minority Interest": (
+            "TotalLiabilitiesNetMinorityInterest"
+        ),
+        "Total Equity Gross Minority Interest": (
+            "TotalEquityGrossMinorityInterest"
+        ),
+        "Total Capitalization": "TotalCapitalization",
+        "Common Stock Equity": "CommonStockEquity",
+        "Net Tangible Assets": "NetTangibleAssets",
+        "Working Capital": "WorkingCapital",
+        "Invested Capital": "InvestedCapital",
+        "Tangible Book Value": "TangibleBookValue",
+        "Total Debt": "TotalDebt",
+        "Net Debt": "NetDebt",
+        "Share Issued": "ShareIssued",
+        "Ordinary Shares Number": "OrdinarySharesNumber",
+        "Treasury Shares Number": "TreasurySharesNumber",
+    },
+    "cash": {
+        "Operating Cash Flow": "OperatingCashFlow",
+        "Investing Cash Flow": "InvestingCashFlow",
+        "Financing Cash Flow": "FinancingCashFlow",
+        "End Cash Position": "EndCashPosition",
+        "Income Tax Paid Supplemental Data": "IncomeTaxPaidSupplementalData",
+        "Interest Paid Supplemental Data": "InterestPaidSupplementalData",
+        "Capital Expenditure": "CapitalExpenditure",
+        "Issuance of Debt": "IssuanceOfDebt",
+        "Repayment of Debt": "RepaymentOfDebt",
+        "Repurchase of Capital Stock": "RepurchaseOfCapitalStock",
+        "Free Cash Flow": "FreeCashFlow",
+    },
+}
+
+# * shown as is. Everything else the page shows in thousands
+UNSCALED = {"BasicEPS", "DilutedEPS", "TaxRateForCalcs"}
+
+EMBEDDED_JSON = re.compile(r"root\.App\.main = (\{.*?\});\n", re.DOTALL)
+
+
+def fetch(stock):
+    """Statements from the API, then the embedded JSON. None if neither"""
+    for source in (fetch_timeseries, fetch_embedded):
+        series = source(stock)
+        if series:
+            tables = statements(series)
+            if any(tables.values()):
+                return tables
+
+    return None
+
+
+def quarterly_types() -> list:
+    """Every timeseries type the three statements need"""
+    return [
+        f"quarterly{name}"
+        for rows in STATEMENTS.values()
+        for name in rows.values()
+    ]
+
+
+def get(stock, page_type, url, params=None):
+    """Body of one request through the request policy, None when it gave
+    up"""
+
+    def attempt(timeout):
+        """One request within timeout ms"""
+        with navigation.timed("http_fetch", page=page_type) as span:
+            response = http_fetch.get_client().get(
+                url, params=params, timeout=timeout / 1000
+            )
+            span.set(bytes=len(response.content))
+        request_policy.check_status(response.status_code, url)
+        response.raise_for_status()
+        return response.text
+
+    result = request_policy.call(page_type, url, attempt)
+    request_policy.record(stock, page_type, result)
+    return result.value if result.ok else None
+
+
+def fetch_timeseries(stock):
+    """All quarterly statement series in one API request"""
+    params = {
+        "symbol": stock,
+        "type": ",".join(quarterly_types()),
+        "merge": "false",
+        "padTimeSeries": "true",
+        "period1": "493590046",
+        "period2": str(int(time.time())),
+    }
+    url = QUERY_URL + "/ws/fundamentals-timeseries/v1/finance/timeseries/"
+    text = get(stock, "timeseries", url + stock, params)
+    if text is None:
+        print("Timeseries API failed....")
+        return None
+    try:
+        series = timeseries_series(text)
+    except (ValueError, KeyError, TypeError) as error:
+        print(f"Timeseries API failed: {error!r}")
+        return None
+
+    snapshot_archive.save(stock, "timeseries", [text])
+    return series
+
+
+def timeseries_series(text) -> dict:
+    """Series by type name from a timeseries API response body"""
+    results = json.loads(text)["timeseries"]["result"]
+    # * one result per type, keyed by the type name
+    series = {}
+    for result in results:
+        for name in result["meta"]["type"]:
+            if result.get(name):
+                series[name] = result[name]
+
+    return series
+
+
+def store_series(text):
+    """Series from the embedded store JSON text"""
+    try:
+        stores = json.loads(text)["context"]["dispatcher"]["stores"]
+        series = stores["QuoteTimeSeriesStore"]["timeSeries"]
+    except (ValueError, KeyError, TypeError):
+        return None
+
+    # * newer pages encrypt the stores, that comes back as a string
+    if not isinstance(series, dict):
+        return None
+
+    return series
+
+
+def fetch_embedded(stock):
+    """One financials page load, statements from its embedded JSON"""
+    url = (BASE_URL + "/quote/{}/financials?p={}").format(stock, stock)
+    text = get(stock, "embedded", url)
+    if text is None:
+        print("Financials page failed....")
+        return None
+
+    match = EMBEDDED_JSON.search(text)
+    if match is None:
+        return None
+
+    # * only the store is archived, not the whole page
+    snapshot_archive.save(stock, "embedded", [match.group(1)])
+    return store_series(match.group(1))
+
+
+def format_value(name, raw) -> str:
+    """Format a raw number the way the statement table shows it"""
+    if name in UNSCALED:
+        return f"{raw:,.2f}"
+    return f"{raw / 1000:,.0f}"
+
+
+def statement(series, rows) -> dict:
+    """Latest quarter of one statement, same keys as the html scrape"""
+    # * the latest quarter is the newest date in any row of the statement
+    points = {}
+    for label, name in rows.items():
+        found = {
+            point["asOfDate"]: point["reportedValue"]["raw"]
+            for point in series.get(f"quarterly{name}") or []
+            if point and point.get("reportedValue")
+        }
+        if found:
+            points[label] = (name, found)
+
+    dates = {day for _, found in points.values() for day in found}
+    if not dates:
+        return {}
+
+    latest = max(dates)
+    table = {}
+    for label, (name, found) in points.items():
+        if latest in found:
+            table[label] = format_value(name, found[latest])
+        else:
+            table[label] = "-"
+
+    return table
+
+
+def statements(series) -> dict:
+    """Same {"income", "balance", "cash"} dict financials() returns"""
+    return {
+        key: statement(series, rows) for key, rows in STATEMENTS.items()
+    }
@@ -1,6 +1,6 @@
 """Update to Google Sheets from JSON files"""
 import json
-import time
+import threading
 
 # from datetime import date
 from pathlib import Path
@@ -9,6 +9,10 @@ import gspread
 import xlsxwriter
 from gspread.exceptions import WorksheetNotFound
 from rich import print
+from xlsxwriter.utility import xl_cell_to_rowcol, xl_rowcol_to_cell
+
+import rate_limiter
+import tracing
 
 # //TODO:
 # * Check for stock sheet. If true,
@@ -22,6 +26,16 @@ from rich import print
 STOCKS = ["AAPL"]
 # STOCKS = ["AAPL", "AMC", "AMZN", "F", "GOOGL", "MSFT"]
 
+# * row of each stock sheet holding the dates already written
+DATE_ROW = 7
+# * worksheets whose date row is read per values_batch_get, keeps the
+# * GET url short
+DATE_ROWS_PER_READ = 100
+
+# * every API call goes through here to stay inside the Sheets quota, its
+# * worker pool is opened and closed by each main()
+SCHEDULER = rate_limiter.QuotaScheduler()
+
 
 def main():
     """summary"""
@@ -30,15 +44,32 @@ def main():
     # today = str(date.today())
     # today = str(date(2023, 8, 27))
 
-    for stock in STOCKS:
-        google_sheets(stock)
-        time.sleep(15)
+    SCHEDULER.start()
+    # * opened before the workers start so they all share it
+    session = open_session()
+    # * every stock's cells go out in one values_batch_update at the end
+    batch = []
+    futures = {
+        stock: SCHEDULER.submit(google_sheets, stock, batch)
+        for stock in STOCKS
+    }
+    for stock, future in futures.items():
+        try:
+            future.result()
+        except Exception as error:
+            print(f"{stock} failed: {error!r}")
+
+    try:
+        send_batch(session.sheet, batch)
+    finally:
+        SCHEDULER.shutdown()
+    SCHEDULER.report()
 
 
-def google_sheets(stock):
+def google_sheets(stock, batch=None):
     """summary"""
     print(stock)
-    sheet = open_workbook()
+    session = open_session()
     results = open_json_file(stock)
 
     date_list = []
@@ -52,21 +83,183 @@ def google_sheets(stock):
     # * create profile & summary dictionaries
     # * check if sheet named "stock" is present
     # * if present add new date column and only summary data values
+    cells = {}
     try:
-        update_summary_data(stock, sheet, results, new_date)
+        worksheet = update_summary_data(
+            stock, session, results, new_date, cells
+        )
         print("Sending data to Google Sheets....")
     # * Exception if worksheet isn't found and creates new sheet
     except WorksheetNotFound:
-        setup_new_sheet(stock, sheet, results, new_date)
+        worksheet = setup_new_sheet(stock, session, results, new_date, cells)
+
+    # * no batch, one batch_update for this worksheet
+    if batch is None:
+        write_cells(worksheet, cells)
+    else:
+        batch.extend(cell_ranges(cells, sheet_title=stock))
+
+
+def cell_ranges(cells, sheet_title=None) -> list:
+    """Merge {"A1": value} cells into column ranges for a batch update"""
+    positions = sorted(
+        (xl_cell_to_rowcol(a1)[::-1], value) for a1, value in cells.items()
+    )
+    ranges = []
+    for (col, row), value in positions:
+        last = ranges[-1] if ranges else None
+        # * next row down in the same column joins the open range
+        if last and last["col"] == col and last["end"] == row - 1:
+            last["end"] = row
+            last["values"].append([value])
+        else:
+            ranges.append(
+                {"col": col, "start": row, "end": row, "values": [[value]]}
+            )
+
+    data = []
+    for item in ranges:
+        first = xl_rowcol_to_cell(item["start"], item["col"])
+        last = xl_rowcol_to_cell(item["end"], item["col"])
+        a1_range = first if first == last else f"{first}:{last}"
+        if sheet_title:
+            a1_range = sheet_range(sheet_title, a1_range)
+        data.append({"range": a1_range, "values": item["values"]})
+
+    return data
+
+
+def sheet_range(title, a1_range) -> str:
+    """A1 range on a named sheet. A1 notation doubles a quote inside the
+    quoted title"""
+    quoted = title.replace("'", "''")
+    return f"'{quoted}'!{a1_range}"
+
+
+def write_cells(worksheet, cells):
+    """All cells of one worksheet in a single batch_update"""
+    if cells:
+        with tracing.span(
+            "sheets_update", symbol=worksheet.title, cells=len(cells)
+        ):
+            SCHEDULER.call(
+                "write",
+                worksheet.batch_update,
+                cell_ranges(cells),
+                value_input_option="USER_ENTERED",
+            )
+
+
+def send_batch(sheet, batch):
+    """Every worksheet's cells in a single values_batch_update"""
+    if batch:
+        with tracing.span("sheets_update", ranges=len(batch)):
+            SCHEDULER.call(
+                "write",
+                sheet.values_batch_update,
+                {"valueInputOption": "USER_ENTERED", "data": batch},
+            )
+        print(f"Sent {len(batch)} ranges to Google Sheets....")
 
 
 def open_workbook():
     """open google sheets workbook"""
     google_creds = gspread.service_account(filename="client_secret.json")
-    sheet = google_creds.open("Stock Data")
+    sheet = SCHEDULER.call("read", google_creds.open, "Stock Data")
     return sheet
 
 
+class SheetSession:
+    """One authenticated workbook per run. Worksheet titles come from a
+    single metadata call, the date rows of every worksheet from one batch
+    read, then both are kept up to date locally"""
+
+    def __init__(self, sheet):
+        self.sheet = sheet
+        self.index = None
+        self.date_rows = {}
+        self.lock = threading.Lock()
+
+    def load_index(self):
+        """Every worksheet and its date row, in one request each"""
+        with self.lock:
+            if self.index is None:
+                worksheets = SCHEDULER.call("read", self.sheet.worksheets)
+                self.index = {item.title: item for item in worksheets}
+                for title, values in self.read_date_rows(self.index):
+                    self.date_rows.setdefault(title, values)
+
+    def read_date_rows(self, titles):
+        """(title, date row values) of many worksheets, one
+        values_batch_get per DATE_ROWS_PER_READ of them"""
+        titles = list(titles)
+        for start in range(0, len(titles), DATE_ROWS_PER_READ):
+            chunk = titles[start : start + DATE_ROWS_PER_READ]
+            ranges = [
+                sheet_range(title, f"{DATE_ROW}:{DATE_ROW}") for title in chunk
+            ]
+            response = SCHEDULER.call(
+                "read", self.sheet.values_batch_get, ranges
+            )
+            # * value ranges come back in the order asked, an empty row
+            # * has no "values"
+            for title, value_range in zip(chunk, response["valueRanges"]):
+                rows = value_range.get("values") or [[]]
+                yield title, rows[0]
+
+    def worksheet(self, title):
+        """Worksheet by title without an API call"""
+        self.load_index()
+        if title not in self.index:
+            raise WorksheetNotFound(title)
+        return self.index[title]
+
+    def add_worksheet(self, title, rows, cols):
+        """Create a worksheet and add it to the index"""
+        self.load_index()
+        worksheet = SCHEDULER.call(
+            "write",
+            self.sheet.add_worksheet,
+            title=title,
+            rows=rows,
+            cols=cols,
+        )
+        with self.lock:
+            self.index[title] = worksheet
+        return worksheet
+
+    def date_row(self, worksheet):
+        """Values of the date row, from the batch read of load_index"""
+        self.load_index()
+        if worksheet.title not in self.date_rows:
+            # * a worksheet added by someone else since the index was read
+            self.date_rows[worksheet.title] = SCHEDULER.call(
+                "read", worksheet.row_values, DATE_ROW
+            )
+        return self.date_rows[worksheet.title]
+
+    def set_date(self, worksheet, col, new_date):
+        """Record a queued date cell so the next empty column moves on"""
+        row_values = self.date_rows.setdefault(worksheet.title, [])
+        row_values.extend([""] * (col + 1 - len(row_values)))
+        row_values[col] = new_date
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def open_session():
+    """Authenticate and open the workbook once per run, also when workers
+    ask for it at the same time"""
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            _session = SheetSession(open_workbook())
+    return _session
+
+
 def open_json_file(stock):
     """open json files to get data"""
     # * read stock json file to get dictionary data
@@ -77,24 +270,24 @@ def open_json_file(stock):
     return results
 
 
-def update_summary_data(stock, sheet, results, new_date):
+def update_summary_data(stock, session, results, new_date, cells):
     """summary"""
     summary_items = results[1][new_date][0]["summary"]
-    worksheet = sheet.worksheet(f"{stock}")
+    worksheet = session.worksheet(f"{stock}")
     print("This sheet is found.....")
 
     # * set row of spreadshet
-    row = 7
+    row = DATE_ROW
     # * get the row vaules do determine next empty column
-    row_values = worksheet.row_values(row)
+    row_values = session.date_row(worksheet)
 
     # * check if date already in sheet
     if new_date in row_values:
-        return
+        return worksheet
     # * set market price and change per date
-    worksheet.update_acell("B1", summary_items["market_price"])
-    worksheet.update_acell("C1", summary_items["market_change"])
-    worksheet.update_acell("D1", summary_items["market_percent"])
+    cells["B1"] = summary_items["market_price"]
+    cells["C1"] = summary_items["market_change"]
+    cells["D1"] = summary_items["market_percent"]
 
     # * get first empty column in row
     col = len(row_values)
@@ -102,7 +295,8 @@ def update_summary_data(stock, sheet, results, new_date):
     col_letter = xlsxwriter.utility.xl_col_to_name(col)
 
     # * set today's date for when data was grabbed
-    worksheet.update_acell(f"{col_letter}{row}", new_date)
+    cells[f"{col_letter}{row}"] = new_date
+    session.set_date(worksheet, col, new_date)
     row += 1
 
     # * update column with summary values
@@ -116,8 +310,8 @@ def update_summary_data(stock, sheet, results, new_date):
                 "market_percent",
             ]
             if key not in skip_list:
-                # worksheet.update_acell(f"{col_letter}{row}", key)
-                worksheet.update_acell(f"{col_letter}{row}", val)
+                # cells[f"{col_letter}{row}"] = key
+                cells[f"{col_letter}{row}"] = val
                 row += 1
             else:
                 continue
@@ -125,36 +319,40 @@ def update_summary_data(stock, sheet, results, new_date):
         print("problem occured....")
 
     print("Sheet updated...")
+    return worksheet
 
 
-def setup_new_sheet(stock, sheet, results, new_date):
+def setup_new_sheet(stock, session, results, new_date, cells):
     """summary"""
     # * if sheet not present create and add profile information & summary data
     print("Nope not here....")
     # * create new sheet with stock symbol
-    worksheet = sheet.add_worksheet(title=f"{stock}", rows=1000, cols=26)
+    worksheet = session.add_worksheet(title=f"{stock}", rows=1000, cols=26)
     print("New sheet created.....")
     # * set profile information
     # * Get company info from company_items, sector_items, summary_items
     # * Build profile section of sheet (A1 - E5)
     print("Creating Profile Section.....")
-    set_summary_items(worksheet, results, new_date)
-    set_company_items(worksheet, results, new_date)
-    set_sector_items(worksheet, results, new_date)
-    worksheet.update_acell("A1", stock)
-    worksheet.update_acell("A7", "Summary")
-    worksheet.update_acell("D7", new_date)
+    set_summary_items(cells, results, new_date)
+    set_company_items(cells, results, new_date)
+    set_sector_items(cells, results, new_date)
+    cells["A1"] = stock
+    cells["A7"] = "Summary"
+    cells["D7"] = new_date
+    session.set_date(worksheet, 0, "Summary")
+    session.set_date(worksheet, 3, new_date)
 
     print("Sheet Updated...")
+    return worksheet
 
 
-def set_summary_items(worksheet, results, new_date):
+def set_summary_items(cells, results, new_date):
     """summary"""
     print("Creating Summary Section....")
     summary_items = results[new_date][1]["summary"]
-    worksheet.update_acell("B1", summary_items["market_price"])
-    worksheet.update_acell("C1", summary_items["market_change"])
-    worksheet.update_acell("D1", summary_items["market_percent"])
+    cells["B1"] = summary_items["market_price"]
+    cells["C1"] = summary_items["market_change"]
+    cells["D1"] = summary_items["market_percent"]
     row = 8
     for key, val in summary_items.items():
         skip_list = [
@@ -164,32 +362,32 @@ def set_summary_items(worksheet, results, new_date):
             "market_percent",
         ]
         if key not in skip_list:
-            worksheet.update_acell(f"A{row}", key)
-            worksheet.update_acell(f"D{row}", val)
+            cells[f"A{row}"] = key
+            cells[f"D{row}"] = val
             row += 1
 
         else:
             continue
 
 
-def set_company_items(worksheet, results, new_date):
+def set_company_items(cells, results, new_date):
     """summary"""
     print("Creating Company Section....")
     company_items = results[new_date][0]["profile"]["company"]
-    worksheet.update_acell("A2", company_items["name"])
-    worksheet.update_acell("A3", company_items["address"])
-    worksheet.update_acell("A4", company_items["citystatezip"])
-    worksheet.update_acell("A5", company_items["site"])
+    cells["A2"] = company_items["name"]
+    cells["A3"] = company_items["address"]
+    cells["A4"] = company_items["citystatezip"]
+    cells["A5"] = company_items["site"]
 
 
-def set_sector_items(worksheet, results, new_date):
+def set_sector_items(cells, results, new_date):
     """summary"""
     print("Creating Sector Section....")
     sector_items = results[new_date][0]["profile"]["sector"]
     row = 3
     for key, val in sector_items.items():
-        worksheet.update_acell(f"D{row}", key)
-        worksheet.update_acell(f"E{row}", val)
+        cells[f"D{row}"] = key
+        cells[f"E{row}"] = val
         row += 1
 
 
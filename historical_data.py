@@ -1,32 +1,289 @@
-"""Get historical data from Yahoo Finance by month store as csv"""
-import datetime
+"""Get historical data from Yahoo Finance store as csv. Only the date ranges
+missing from each stock's file are downloaded, many stocks at once:
+
+    python historical_data.py --start 2013-01-01 AAPL MSFT
+    python historical_data.py --symbols-file watchlist.txt --workers 32
+"""
+import argparse
+import io
+import json
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta, timezone
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
+from rich import print
+
+import atomic_file
+import derived_series
+import http_fetch
+import market_calendar
+import navigation
+import ohlcv_store
+
+# * single stock
+# SYMBOLS = ["AAPL"]
+# * make list of stocks
+SYMBOLS = ["AAPL", "AMC", "AMZN", "F", "GOOGL", "MSFT"]
+
+# * point at a local fixture server for benchmarks
+BASE_URL = "https://query1.finance.yahoo.com"
+START = date(2023, 2, 28)
+# * weekly and monthly bars come from derived_series, not a download
+INTERVAL = "1d"
+# * downloads running at the same time, shares the http_fetch pool
+WORKERS = 16
+
+# * "csv" writes stock_data/<SYM>/historical_data.csv
+# * "ohlcv" appends to the memory mapped columns in ohlcv_store
+STORAGE = "csv"
+
+DATA_DIR = Path("stock_data")
+FILE_NAME = "historical_data.csv"
+# * the old script appended to this file without checking for duplicates
+LEGACY_FILE = "historical_data_by_month.csv"
+# * window already requested per stock, so early gaps before a listing
+# * date aren't asked for on every run
+RANGE_FILE = "historical_range.json"
 
-symbol = "AAPL"
-period1 = int(time.mktime(datetime.datetime(2023, 2, 28, 23, 59).timetuple()))
-period2 = int(time.mktime(datetime.datetime(2023, 3, 31, 23, 59).timetuple()))
-interval = "1d"  # "1w" "1m"
-path = Path(f"stock_data/{symbol}", "historical_data_by_month.csv")
 
+def main():
+    """main starting point of program"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--start", type=date.fromisoformat, default=START)
+    parser.add_argument("--end", type=date.fromisoformat, default=None)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--symbols-file", type=Path, default=None)
+    parser.add_argument("symbols", nargs="*", default=None)
+    args = parser.parse_args()
 
-url = f"https://query1.finance.yahoo.com/v7/finance/download/{symbol}?period1={period1}&period2={period2}&interval={interval}&events=history&includeAdjustedClose=true"
+    symbols = args.symbols or SYMBOLS
+    if args.symbols_file:
+        symbols = args.symbols_file.read_text(encoding="utf-8").split()
 
-df = pd.read_csv(url)
-print(df)
+    download_all(symbols, args.start, args.end, args.workers)
+    http_fetch.close_client()
+    # * weekly/monthly bars and rolling series from the new daily rows
+    if STORAGE == "ohlcv":
+        derived_series.update(symbols)
 
-if path.is_file():
-    # Append DataFrame to existing CSV File
-    df.to_csv(
-        f"stock_data/{symbol}/historical_data_by_month.csv",
-        header=False,
-        index=False,
-        mode="a",
+
+def download_all(
+    symbols, start, end=None, workers=WORKERS, done=None
+) -> dict:
+    """Fill the missing ranges of every stock, returns download counters.
+    done(symbol, error) as each stock finishes"""
+    # * a bar is final once its session closed, a run during market hours
+    # * would store today's partial bar as covered
+    closed = market_calendar.last_closed_day()
+    end = min(end or closed, closed)
+    # * one pooled connection per worker, set before the client is made
+    http_fetch.MAX_CONNECTIONS = max(http_fetch.MAX_CONNECTIONS, workers)
+    totals = {"symbols": len(symbols), "requests": 0, "rows": 0, "failed": 0}
+    begin = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(update_symbol, symbol, start, end): symbol
+            for symbol in symbols
+        }
+        for future in as_completed(futures):
+            try:
+                requests, rows = future.result()
+            except Exception as error:
+                print(f"{futures[future]} download failed: {error!r}")
+                totals["failed"] += 1
+                if done is not None:
+                    done(futures[future], error)
+                continue
+            totals["requests"] += requests
+            totals["rows"] += rows
+            if done is not None:
+                done(futures[future], None)
+
+    totals["elapsed"] = time.perf_counter() - begin
+    print(
+        f"Historical data: {totals['symbols']} stocks,"
+        f" {totals['requests']} requests, {totals['rows']} new rows,"
+        f" {totals['failed']} failed in {totals['elapsed']:.1f}s"
     )
-else:
-    df.to_csv(
-        f"stock_data/{symbol}/historical_data_by_month.csv",
-        index=False,
+    return totals
+
+
+def update_symbol(symbol, start, end) -> tuple:
+    """Download and merge one stock's missing ranges, (requests, new rows)"""
+    folder = DATA_DIR / symbol
+    covered, checked = read_range(folder)
+    dates = stored_dates(symbol)
+    if covered is None and len(dates):
+        covered = dates[0].astype(object), dates[-1].astype(object)
+    # * a gap between stored days is asked for once, a day the calendar
+    # * doesn't know was closed stays missing
+    gaps = [gap for gap in interior_gaps(dates) if gap not in checked]
+    ranges = missing_ranges(covered, start, end) + gaps
+    if not ranges:
+        return 0, 0
+
+    frames = [download(symbol, *gap) for gap in ranges]
+    folder.mkdir(exist_ok=True, parents=True)
+    with navigation.timed("store_write"):
+        if STORAGE == "ohlcv":
+            added = ohlcv_store.merge(symbol, pd.concat(frames))
+        else:
+            stored = read_history(folder)
+            merged = merge(stored, frames)
+            with atomic_file.atomic_open(
+                folder / FILE_NAME, newline=""
+            ) as file:
+                merged.to_csv(file, index=False)
+            added = len(merged) - len(stored)
+
+    if covered:
+        start, end = min(start, covered[0]), max(end, covered[1])
+    write_range(folder, start, end, checked | set(gaps))
+
+    return len(ranges), added
+
+
+def stored_dates(symbol) -> np.ndarray:
+    """Stored days as sorted datetime64[D], empty if nothing is stored"""
+    if STORAGE == "ohlcv":
+        dates = np.asarray(ohlcv_store.open_columns(symbol)["date"])
+        return dates.view("datetime64[s]").astype("datetime64[D]")
+
+    folder = DATA_DIR / symbol
+    path = folder / FILE_NAME
+    if path.is_file():
+        stored = pd.read_csv(path, usecols=["Date"])
+    else:
+        stored = read_history(folder)
+    if stored.empty:
+        return np.empty(0, "datetime64[D]")
+    return np.sort(pd.to_datetime(stored["Date"]).to_numpy("datetime64[D]"))
+
+
+def interior_gaps(dates) -> list:
+    """(first, last) day of each run of trading days missing between the
+    sorted stored days"""
+    if len(dates) < 2:
+        return []
+    years = range(
+        dates[0].astype(object).year, dates[-1].astype(object).year + 1
+    )
+    closed = sorted(
+        day for year in years for day in market_calendar.holidays(year)
     )
+    # * trading days strictly between each stored day and the next
+    missing = np.busday_count(dates[:-1] + 1, dates[1:], holidays=closed)
+    return [
+        ((dates[i] + 1).astype(object), (dates[i + 1] - 1).astype(object))
+        for i in np.flatnonzero(missing > 0)
+    ]
+
+
+def missing_ranges(covered, start, end) -> list:
+    """Date ranges in start..end not inside the covered (first, last)"""
+    if covered is None:
+        return [(start, end)]
+
+    first, last = covered
+    ranges = []
+    if start < first:
+        ranges.append((start, first - timedelta(days=1)))
+    # * nothing new until the market has traded after the last stored day
+    if market_calendar.last_trading_day(end) > last:
+        ranges.append((last + timedelta(days=1), end))
+    return ranges
+
+
+def period(day) -> int:
+    """Unix time of midnight UTC on a day"""
+    return int(
+        datetime.combine(day, datetime.min.time(), timezone.utc).timestamp()
+    )
+
+
+def download(symbol, start, end) -> pd.DataFrame:
+    """One v7 download request, an empty frame when there is no data"""
+    url = f"{BASE_URL}/v7/finance/download/{symbol}"
+    params = {
+        "period1": period(start),
+        # * period2 is exclusive
+        "period2": period(end + timedelta(days=1)),
+        "interval": INTERVAL,
+        "events": "history",
+        "includeAdjustedClose": "true",
+    }
+    with navigation.timed("download", symbol=symbol, page="history") as span:
+        response = http_fetch.get_client().get(
+            url, params=params, headers={"Accept": "text/csv"}
+        )
+        span.set(bytes=len(response.content), status=response.status_code)
+    # * a range before the stock listed has no rows
+    if response.status_code == 404:
+        return pd.DataFrame()
+    response.raise_for_status()
+
+    return pd.read_csv(io.StringIO(response.text))
+
+
+def merge(stored, frames) -> pd.DataFrame:
+    """Stored and downloaded rows, one per Date, oldest first"""
+    frames = [frame for frame in [stored, *frames] if not frame.empty]
+    if not frames:
+        return stored
+
+    merged = pd.concat(frames, ignore_index=True)
+    return (
+        merged.drop_duplicates(subset="Date", keep="last")
+        .sort_values("Date")
+        .reset_index(drop=True)
+    )
+
+
+def read_history(folder) -> pd.DataFrame:
+    """Saved rows for a stock, picks up the old appended file once"""
+    path = folder / FILE_NAME
+    if path.is_file():
+        return pd.read_csv(path)
+
+    legacy = folder / LEGACY_FILE
+    if legacy.is_file():
+        return merge(pd.DataFrame(), [pd.read_csv(legacy)])
+    return pd.DataFrame()
+
+
+def read_range(folder) -> tuple:
+    """Requested (start, end) already downloaded, None if never run, and
+    the set of gaps between stored days already asked for"""
+    path = folder / RANGE_FILE
+    if not path.is_file():
+        return None, set()
+
+    with path.open(mode="r", encoding="utf-8") as file:
+        saved = json.load(file)
+    covered = (
+        date.fromisoformat(saved["start"]),
+        date.fromisoformat(saved["end"]),
+    )
+    checked = {
+        tuple(date.fromisoformat(day) for day in gap)
+        for gap in saved.get("gaps", [])
+    }
+    return covered, checked
+
+
+def write_range(folder, start, end, checked=()):
+    """Save the requested window and gaps after a merge"""
+    path = folder / RANGE_FILE
+    gaps = [[str(first), str(last)] for first, last in sorted(checked)]
+    atomic_file.write_text(
+        path,
+        json.dumps({"start": str(start), "end": str(end), "gaps": gaps}),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Browserless fetch path. Pooled keep-alive HTTP client for the tabs
+that are plain server rendered HTML, parsed with selectolax"""
+import threading
+
+import httpx
+from rich import print
+from selectolax.parser import HTMLParser
+
+import fetch_cache
+import navigation
+import request_policy
+import tracing
+
+# * backend per page type. "browser" pages need JS (the "Quarterly" toggle)
+PAGE_BACKENDS = {
+    "profile": "http",
+    "summary": "http",
+    "stats": "http",
+    "income": "browser",
+    "balance": "browser",
+    "cash": "browser",
+}
+
+# * HTTP/2 needs the h2 package, falls back to HTTP/1.1 keep-alive
+HTTP2 = False
+MAX_CONNECTIONS = 10
+TIMEOUT = 30
+
+# * Yahoo's JSON APIs want a session cookie, set by any fc.yahoo.com
+# * response, and the crumb handed out for it. Point both at a local
+# * fixture server for benchmarks
+COOKIE_URL = "https://fc.yahoo.com"
+CRUMB_URL = "https://query1.finance.yahoo.com/v1/test/getcrumb"
+
+_client = None
+_lock = threading.Lock()
+_crumb = None
+_crumb_lock = threading.Lock()
+
+
+def use_http(page_type) -> bool:
+    """Check if a page type is fetched without the browser"""
+    return PAGE_BACKENDS.get(page_type) == "http"
+
+
+def get_client() -> httpx.Client:
+    """One pooled client for the whole run, made once when threads ask for
+    it at the same time"""
+    global _client
+
+    if _client is not None:
+        return _client
+    with _lock:
+        if _client is not None:
+            return _client
+        try:
+            import h2  # noqa: F401
+
+            http2 = HTTP2
+        except ImportError:
+            http2 = False
+
+        _client = httpx.Client(
+            http2=http2,
+            headers={
+                "User-Agent": navigation.USER_AGENT,
+                "Accept": "text/html,application/xhtml+xml",
+                # * br is decoded when the brotli package is installed
+                "Accept-Encoding": "gzip, deflate, br",
+            },
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_CONNECTIONS,
+            ),
+            timeout=TIMEOUT,
+            follow_redirects=True,
+        )
+
+    return _client
+
+
+def close_client():
+    """Close the pooled connections, the session cookie goes with them"""
+    global _client, _crumb
+
+    if _client is not None:
+        _client.close()
+        _client = None
+    _crumb = None
+
+
+def crumb(refresh=False) -> str:
+    """Crumb for Yahoo's query APIs. The session cookie lands in the shared
+    client's jar, so every request made with the client carries it. Made
+    once per client, again with refresh after the API turned it down"""
+    global _crumb
+
+    with _crumb_lock:
+        if _crumb is None or refresh:
+            client = get_client()
+            # * the cookie comes with a 404, only the Set-Cookie matters
+            with navigation.timed("http_fetch", page="cookie"):
+                client.get(COOKIE_URL, timeout=TIMEOUT)
+                response = client.get(CRUMB_URL, timeout=TIMEOUT)
+            response.raise_for_status()
+            text = response.text.strip()
+            # * an HTML or empty body means the cookie wasn't accepted
+            if not text or "<" in text:
+                raise httpx.HTTPError(f"no crumb from {CRUMB_URL}")
+            _crumb = text
+    return _crumb
+
+
+def fetch_fragments(
+    url, selectors, cache_key=None, timeout=None, defer=False
+):
+    """Get the html of each selector, None when the page needs the browser.
+    With a (symbol, page type) cache_key the request is conditional and
+    fetch_cache.UNCHANGED comes back for a 304 or an identical fragment,
+    defer holds a changed hash back until fetch_cache.take.
+    Raises request_policy.Throttled on a throttling status"""
+    headers = fetch_cache.validators(*cache_key) if cache_key else {}
+    timeout = min(timeout or TIMEOUT, TIMEOUT)
+    try:
+        with navigation.timed("http_fetch", url=url) as span:
+            response = request_policy.hedged(
+                lambda: get_client().get(
+                    url, headers=headers, timeout=timeout
+                ),
+                navigation.STEP_TIMINGS.get("http_fetch"),
+            )
+            span.set(
+                bytes=len(response.content), status=response.status_code
+            )
+        request_policy.check_status(response.status_code, url)
+        if response.status_code == 304 and cache_key:
+            fetch_cache.not_modified(*cache_key)
+            return fetch_cache.UNCHANGED
+        response.raise_for_status()
+    except httpx.HTTPError as error:
+        print(f"HTTP fetch failed, using browser: {error!r}")
+        return None
+
+    with tracing.span("html_parser", bytes=len(response.content)):
+        data = HTMLParser(response.text)
+    fragments = []
+    with tracing.span("selectors"):
+        for selector in selectors:
+            node = data.css_first(selector)
+            # * missing fragment means it is rendered client side
+            if node is None:
+                print(f"{selector} not in static HTML, using browser")
+                tracing.count("browser_fallbacks")
+                return None
+            fragments.append(node.html)
+
+    if cache_key and not fetch_cache.update(
+        *cache_key, fragments, response.headers, defer
+    ):
+        return fetch_cache.UNCHANGED
+
+    return fragments
+
+
+def fetch_fragment(url, selector, cache_key=None, timeout=None):
+    """Get the html of one selector, None when the page needs the browser"""
+    fragments = fetch_fragments(url, [selector], cache_key, timeout)
+    if fragments == fetch_cache.UNCHANGED:
+        return fetch_cache.UNCHANGED
+    return fragments and fragments[0]
@@ -0,0 +1,199 @@
+"""Manifest of what is saved per symbol: the last summary date, the last
+quarter, the profile hash and the last error. It is a table in
+stock_data/stocks.db updated by every JSON write, so a run plans its work
+from one query instead of opening every symbol's files. A symbol the
+manifest hasn't seen is read from its files once:
+
+    python manifest.py [SYMBOL ...]
+    python manifest.py rebuild
+"""
+import hashlib
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from rich import print
+
+import stock_store
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS manifest (
+    symbol TEXT PRIMARY KEY,
+    summary_date TEXT,
+    quarter TEXT,
+    profile_hash TEXT,
+    error TEXT,
+    error_at TEXT,
+    updated_at TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+stock_store.register(SCHEMA)
+
+COLUMNS = ("summary_date", "quarter", "profile_hash", "error", "error_at")
+
+DATA_DIR = Path("stock_data")
+
+
+def connect():
+    """Store connection, the manifest table comes with it"""
+    return stock_store.connect()
+
+
+def digest(record) -> str:
+    """Hash of a parsed record, the same whatever its key order"""
+    text = json.dumps(record, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def summary_fields(results) -> dict:
+    """Manifest fields of the list saved in <SYM>.json"""
+    dates = [key for item in results for key in item if key != "company"]
+    profiles = [item for item in results if "company" in item]
+    return {
+        "summary_date": max(dates, default=None),
+        "profile_hash": digest(profiles[0]) if profiles else None,
+    }
+
+
+def quarter_fields(results) -> dict:
+    """Manifest fields of the list saved in quarterly.json, the newest
+    quarter is first"""
+    quarterly = results[0]["quarterly"] if results else []
+    return {"quarter": next(iter(quarterly[0]), None) if quarterly else None}
+
+
+def scan(symbol, root=DATA_DIR) -> dict:
+    """Manifest fields read from a symbol's JSON files"""
+    fields = {"summary_date": None, "quarter": None, "profile_hash": None}
+    for name, read in (
+        (f"{symbol}.json", summary_fields),
+        ("quarterly.json", quarter_fields),
+    ):
+        path = Path(root, symbol, name)
+        if not path.is_file():
+            continue
+        try:
+            fields |= read(json.loads(path.read_text(encoding="utf-8")))
+        except (ValueError, LookupError, TypeError) as error:
+            print(f"[red]{path} unreadable: {error!r}[/red]")
+    return fields
+
+
+def write(conn, symbol, fields):
+    """Insert or update the given fields of a symbol's row"""
+    names = [name for name in fields if name in COLUMNS]
+    conn.execute(
+        f"INSERT INTO manifest (symbol, updated_at, {', '.join(names)})"
+        f" VALUES (?, ?{', ?' * len(names)})"
+        " ON CONFLICT (symbol) DO UPDATE"
+        " SET updated_at = excluded.updated_at"
+        + "".join(f", {name} = excluded.{name}" for name in names),
+        (symbol, datetime.now().isoformat(), *(fields[n] for n in names)),
+    )
+
+
+def as_dicts(cursor) -> list:
+    """Rows of a manifest query keyed by column"""
+    names = [column[0] for column in cursor.description]
+    return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+
+def get(symbol) -> dict:
+    """Manifest row of a symbol, read from its files the first time or
+    when a file the row lists is gone"""
+    conn = connect()
+    cursor = conn.execute("SELECT * FROM manifest WHERE symbol = ?", (symbol,))
+    found = as_dicts(cursor)
+    if found and on_disk(found[0]):
+        return found[0]
+    if found:
+        print(f"[red]{symbol} files missing, rescanning[/red]")
+
+    write(conn, symbol, scan(symbol))
+    conn.commit()
+    return get(symbol)
+
+
+def on_disk(entry, root=DATA_DIR) -> bool:
+    """Check that the files a manifest row lists still exist. A stat each,
+    planning a run from rows doesn't do it"""
+    symbol = entry["symbol"]
+    for column, name in (
+        ("summary_date", f"{symbol}.json"),
+        ("quarter", "quarterly.json"),
+    ):
+        if entry[column] is not None:
+            if not Path(root, symbol, name).is_file():
+                return False
+    return True
+
+
+def rows(symbols=None) -> dict:
+    """symbol -> manifest row, for every symbol or those given. One query,
+    symbols the manifest hasn't seen are left out"""
+    cursor = connect().execute("SELECT * FROM manifest")
+    entries = {entry["symbol"]: entry for entry in as_dicts(cursor)}
+    if symbols is None:
+        return entries
+    return {symbol: entries[symbol] for symbol in symbols if symbol in entries}
+
+
+def update(symbol, **fields):
+    """Save a symbol's fields in one transaction, called after each write"""
+    conn = connect()
+    if fields.keys() < set(COLUMNS) and not exists(conn, symbol):
+        # * the rest of the row comes from the files written before it
+        fields = scan(symbol) | fields
+    write(conn, symbol, fields)
+    conn.commit()
+
+
+def exists(conn, symbol) -> bool:
+    """Check if the manifest has a row for a symbol"""
+    return (
+        conn.execute(
+            "SELECT 1 FROM manifest WHERE symbol = ?", (symbol,)
+        ).fetchone()
+        is not None
+    )
+
+
+def failed(symbol, page, outcome):
+    """Note the last page of a symbol that could not be fetched"""
+    update(
+        symbol,
+        error=f"{page} {outcome}",
+        error_at=datetime.now().isoformat(timespec="seconds"),
+    )
+
+
+def rebuild(root=DATA_DIR) -> int:
+    """Rescan every stock folder, returns how many were read"""
+    folders = sorted(path for path in Path(root).iterdir() if path.is_dir())
+    conn = connect()
+    for folder in folders:
+        write(conn, folder.name, scan(folder.name, root))
+    conn.commit()
+    return len(folders)
+
+
+def main():
+    """main starting point of program"""
+    if sys.argv[1:2] == ["rebuild"]:
+        print(f"Manifest rebuilt from {rebuild()} stock folders")
+        return
+
+    entries = rows(sys.argv[1:] or None)
+    for symbol, entry in sorted(entries.items()):
+        print(
+            f"{symbol}: summary {entry['summary_date']},"
+            f" quarter {entry['quarter']},"
+            f" profile {(entry['profile_hash'] or '-')[:12]},"
+            f" error {entry['error'] or '-'}"
+        )
+    print(f"{len(entries)} symbols in the manifest")
+
+
+if __name__ == "__main__":
+    main()
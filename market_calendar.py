@@ -0,0 +1,105 @@
+"""NYSE trading days. Weekends and exchange holidays are closed"""
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+EXCHANGE_TZ = ZoneInfo("America/New_York")
+# * regular session, half days are treated as closing at 16:00 too
+OPEN = time(9, 30)
+CLOSE = time(16, 0)
+
+
+def easter(year) -> date:
+    """Easter Sunday, anonymous Gregorian algorithm"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7  # noqa: E741
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def nth_weekday(year, month, weekday, nth) -> date:
+    """nth (1 based, -1 for last) weekday (Mon=0) of a month"""
+    if nth > 0:
+        first = date(year, month, 1)
+        offset = (weekday - first.weekday()) % 7
+        return first + timedelta(days=offset + 7 * (nth - 1))
+    following = date(year + month // 12, month % 12 + 1, 1)
+    last = following - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def observed(day) -> date:
+    """Saturday holidays close Friday, Sunday holidays close Monday"""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+@lru_cache(maxsize=None)
+def holidays(year) -> frozenset:
+    """NYSE full day closures for a year"""
+    days = {
+        nth_weekday(year, 1, 0, 3),  # * Martin Luther King Jr. Day
+        nth_weekday(year, 2, 0, 3),  # * Washington's Birthday
+        easter(year) - timedelta(days=2),  # * Good Friday
+        nth_weekday(year, 5, 0, -1),  # * Memorial Day
+        observed(date(year, 7, 4)),
+        nth_weekday(year, 9, 0, 1),  # * Labor Day
+        nth_weekday(year, 11, 3, 4),  # * Thanksgiving
+        observed(date(year, 12, 25)),
+    }
+    # * a Saturday New Year is not moved back into December
+    new_year = observed(date(year, 1, 1))
+    if new_year.year == year:
+        days.add(new_year)
+    if year >= 2022:
+        days.add(observed(date(year, 6, 19)))  # * Juneteenth
+    return frozenset(days)
+
+
+def is_trading_day(day=None) -> bool:
+    """Check if the market is open on a day"""
+    day = day or date.today()
+    return day.weekday() < 5 and day not in holidays(day.year)
+
+
+def last_trading_day(day=None) -> date:
+    """The day itself if the market is open, else the one before"""
+    day = day or date.today()
+    while not is_trading_day(day):
+        day -= timedelta(days=1)
+    return day
+
+
+def last_closed_day(now=None) -> date:
+    """Last trading day whose session has closed, today only after the
+    close. now is exchange time, the current time by default"""
+    now = now or datetime.now(EXCHANGE_TZ)
+    day = now.date()
+    if is_trading_day(day) and now.time() >= CLOSE:
+        return day
+    return last_trading_day(day - timedelta(days=1))
+
+
+def session_open(day) -> datetime:
+    """When the market opens on a day, as naive local time"""
+    opens = datetime.combine(day, OPEN, EXCHANGE_TZ)
+    return opens.astimezone().replace(tzinfo=None)
+
+
+def last_quarter_end(day=None) -> date:
+    """Most recent calendar quarter end on or before a day"""
+    day = day or date.today()
+    month = (day.month - 1) // 3 * 3
+    if month == 0:
+        return date(day.year - 1, 12, 31)
+    return date(day.year, month + 1, 1) - timedelta(days=1)
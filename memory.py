@@ -0,0 +1,63 @@
+"""Resident memory of this process and its children (Chromium, the parse
+pool) from /proc"""
+import os
+from pathlib import Path
+
+
+def process_rss(pid) -> int:
+    """RSS of one process in bytes, 0 if it is gone"""
+    try:
+        status = Path(f"/proc/{pid}/status").read_text()
+    except OSError:
+        return 0
+    for line in status.splitlines():
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1]) * 1024
+    return 0
+
+
+def command(pid) -> str:
+    """Command line of a process, empty if it is gone"""
+    try:
+        cmdline = Path(f"/proc/{pid}/cmdline").read_bytes()
+    except OSError:
+        return ""
+    return cmdline.replace(b"\0", b" ").decode(errors="replace")
+
+
+def direct_children(pid) -> list:
+    """Children of a process, not their descendants"""
+    children = []
+    for task in Path(f"/proc/{pid}/task").glob("*"):
+        try:
+            found = (task / "children").read_text().split()
+        except OSError:
+            continue
+        children.extend(int(child) for child in found)
+    return children
+
+
+def child_pids(pid) -> list:
+    """Every descendant of a process"""
+    children = []
+    for child in direct_children(pid):
+        children.append(child)
+        children.extend(child_pids(child))
+    return children
+
+
+def tree_rss(pid=None) -> int:
+    """RSS of a process plus all of its children in bytes"""
+    pid = pid or os.getpid()
+    return sum(process_rss(number) for number in [pid, *child_pids(pid)])
+
+
+def browser_rss(pid=None) -> int:
+    """RSS of the Playwright driver and the Chromium it started in bytes,
+    other children such as the parse pool workers are left out"""
+    pid = pid or os.getpid()
+    return sum(
+        tree_rss(child)
+        for child in direct_children(pid)
+        if "playwright" in command(child)
+    )
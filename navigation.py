@@ -0,0 +1,290 @@
+"""Shared Playwright navigation. Block the page weight we never read
+(ads, images, fonts, analytics, third-party scripts) and wait only for
+the fragment we parse instead of the full page load"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from rich import print
+
+import request_policy
+import tracing
+
+USER_AGENT = (
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 13_5)"
+    " AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0"
+    " Safari/537.36"
+)
+
+# * False loads the full page, used to measure what blocking saves
+BLOCK_RESOURCES = True
+
+# * resource types the parsers never need
+BLOCKED_TYPES = {
+    "image",
+    "media",
+    "font",
+    "stylesheet",
+    "texttrack",
+    "eventsource",
+    "websocket",
+    "manifest",
+    "ping",
+    "other",
+}
+
+# * hosts we keep. "Quarterly" toggle needs yahoo's own scripts and XHR
+ALLOWED_HOSTS = {
+    "finance.yahoo.com",
+    "query1.finance.yahoo.com",
+    "query2.finance.yahoo.com",
+    "s.yimg.com",
+}
+
+# * first party hosts that only stream quotes or serve ads/analytics
+BLOCKED_HOSTS = {
+    "streamer.finance.yahoo.com",
+    "geo.yahoo.com",
+    "udc.yahoo.com",
+    "beap.gemini.yahoo.com",
+    "consent.yahoo.com",
+}
+
+# * ms a page action may take before Playwright's TimeoutError
+PAGE_TIMEOUT = 120000
+
+# * ms allowed for the "Quarterly" click plus the columns swapping over
+QUARTERLY_BUDGET = 10000
+
+# * the statement shows quarters once the dated column headers are a
+# * quarter apart, annual ones are a year apart. Values alone can repeat
+FIN_QUARTERLY_JS = """() => {
+    const days = Array.from(
+        document.querySelectorAll("div#Main div[data-test='fin-hdr']")
+    )
+        .map((hdr) => Date.parse(hdr.textContent))
+        .filter((day) => !isNaN(day));
+    return days.length > 1 && Math.abs(days[0] - days[1]) < 200 * 864e5;
+}"""
+
+# * url -> content-length seen on a full page load, what blocking it saves
+RESPONSE_SIZES = {}
+# * urls kept, older ones drop off first
+SIZES_KEPT = 5000
+
+# * latencies kept per step for percentiles (the hedge delay), older ones
+# * drop off so a long running daemon stays flat
+STEP_WINDOW = 2000
+# * step name -> deque of the latest seconds
+STEP_TIMINGS = {}
+# * step name -> [runs, total seconds, max seconds] since the last reset
+STEP_TOTALS = {}
+
+_steps_lock = threading.Lock()
+
+
+def new_stats() -> dict:
+    """Counters for one symbol"""
+    return {
+        "requests": 0,
+        "blocked": 0,
+        "bytes": 0,
+        "saved_bytes": 0,
+        "saved_sized": 0,
+        "blocked_types": {},
+    }
+
+
+def should_block(request, page_host) -> bool:
+    """Decide if a request is page weight the parsers never read"""
+    if request.resource_type in BLOCKED_TYPES:
+        return True
+
+    host = urlsplit(request.url).hostname or ""
+    if host in BLOCKED_HOSTS:
+        return True
+    # * anything not from yahoo (or the fixture server) is third party
+    return host != page_host and host not in ALLOWED_HOSTS
+
+
+def count_response(stats, response, block):
+    """Add a loaded response to the counters. Without blocking its size is
+    kept for what blocking it later saves"""
+    size = int(response.headers.get("content-length", 0))
+    stats["requests"] += 1
+    stats["bytes"] += size
+    if not block and size:
+        RESPONSE_SIZES.pop(response.url, None)
+        RESPONSE_SIZES[response.url] = size
+        if len(RESPONSE_SIZES) > SIZES_KEPT:
+            del RESPONSE_SIZES[next(iter(RESPONSE_SIZES))]
+
+
+def count_blocked(stats, request):
+    """Add a blocked request to the counters, with its size when a full
+    load has seen it"""
+    blocked_types = stats["blocked_types"]
+    stats["blocked"] += 1
+    size = RESPONSE_SIZES.get(request.url)
+    if size is not None:
+        stats["saved_bytes"] += size
+        stats["saved_sized"] += 1
+    blocked_types[request.resource_type] = (
+        blocked_types.get(request.resource_type, 0) + 1
+    )
+
+
+def page_host(page) -> str:
+    """Host of the page being loaded"""
+    return urlsplit(page.url).hostname or ""
+
+
+def install(page, block=None) -> dict:
+    """Route every request of a sync page through the block list"""
+    block = BLOCK_RESOURCES if block is None else block
+    stats = new_stats()
+
+    def handle_route(route):
+        request = route.request
+        # * the document itself always goes through
+        if request.is_navigation_request():
+            route.continue_()
+        elif block and should_block(request, page_host(page)):
+            count_blocked(stats, request)
+            route.abort()
+        else:
+            route.continue_()
+
+    page.route("**/*", handle_route)
+    page.on(
+        "response", lambda response: count_response(stats, response, block)
+    )
+    return stats
+
+
+async def install_async(page, block=None) -> dict:
+    """Route every request of an async page through the block list"""
+    block = BLOCK_RESOURCES if block is None else block
+    stats = new_stats()
+
+    async def handle_route(route):
+        request = route.request
+        if request.is_navigation_request():
+            await route.continue_()
+        elif block and should_block(request, page_host(page)):
+            count_blocked(stats, request)
+            await route.abort()
+        else:
+            await route.continue_()
+
+    await page.route("**/*", handle_route)
+    page.on(
+        "response", lambda response: count_response(stats, response, block)
+    )
+    return stats
+
+
+def new_page(browser, timeout=PAGE_TIMEOUT) -> tuple:
+    """Page in a fresh context with our user agent and the block list,
+    returns it with its request counters"""
+    context = browser.new_context(user_agent=USER_AGENT)
+    page = context.new_page()
+    page.set_default_timeout(timeout)
+    return page, install(page)
+
+
+def goto(page, url, selector, timeout=PAGE_TIMEOUT):
+    """Open url and return once selector is in the DOM, both within timeout
+    ms. Raises request_policy.Throttled on a throttling status"""
+    start = time.perf_counter()
+    with timed("goto", url=url):
+        response = page.goto(url, wait_until="commit", timeout=timeout)
+        request_policy.check_status(response and response.status, url)
+        page.wait_for_selector(
+            selector, state="attached", timeout=remaining(start, timeout)
+        )
+
+
+async def goto_async(page, url, selector, timeout=PAGE_TIMEOUT):
+    """Open url and return once selector is in the DOM, both within timeout
+    ms. Raises request_policy.Throttled on a throttling status"""
+    start = time.perf_counter()
+    with tracing.span("goto", url=url):
+        response = await page.goto(url, wait_until="commit", timeout=timeout)
+        request_policy.check_status(response and response.status, url)
+        await page.wait_for_selector(
+            selector, state="attached", timeout=remaining(start, timeout)
+        )
+
+
+def remaining(start, timeout) -> float:
+    """ms left of a timeout that started at start"""
+    return max(timeout - (time.perf_counter() - start) * 1000, 1)
+
+
+def report(stock, stats):
+    """Print the counters for a symbol then start them over. Bytes saved
+    only count the blocked requests a full load has sized"""
+    print(
+        f"{stock}: {stats['requests']} requests,"
+        f" {stats['bytes'] / 1024:.0f} KB loaded,"
+        f" {stats['blocked']} requests blocked {stats['blocked_types']},"
+        f" {stats['saved_bytes'] / 1024:.0f} KB saved"
+        f" ({stats['saved_sized']} of them sized)"
+    )
+    stats.update(new_stats())
+
+
+def record_step(step, seconds):
+    """Keep the latency of one step"""
+    with _steps_lock:
+        if step not in STEP_TIMINGS:
+            STEP_TIMINGS[step] = deque(maxlen=STEP_WINDOW)
+            STEP_TOTALS[step] = [0, 0.0, 0.0]
+        STEP_TIMINGS[step].append(seconds)
+        totals = STEP_TOTALS[step]
+        totals[0] += 1
+        totals[1] += seconds
+        totals[2] = max(totals[2], seconds)
+
+
+def reset_steps():
+    """Start the step latencies over, once per job"""
+    with _steps_lock:
+        STEP_TIMINGS.clear()
+        STEP_TOTALS.clear()
+
+
+@contextmanager
+def timed(step, **attributes):
+    """Record how long the block took as one run of a step, traced as a
+    span with the attributes"""
+    start = time.perf_counter()
+    try:
+        with tracing.span(step, **attributes) as span:
+            yield span
+    finally:
+        record_step(step, time.perf_counter() - start)
+
+
+def report_steps():
+    """Print count, mean and worst latency for every step"""
+    for step, (runs, total, worst) in STEP_TOTALS.items():
+        print(
+            f"{step}: {runs} runs, mean {total / runs:.3f}s,"
+            f" max {worst:.3f}s, total {total:.1f}s"
+        )
+
+
+def click_quarterly(page, budget=QUARTERLY_BUDGET):
+    """Click "Quarterly" and return as soon as the quarterly columns are in
+    the DOM. Raises the Playwright TimeoutError when over budget"""
+    start = time.perf_counter()
+    page.get_by_text("Quarterly").click(timeout=budget)
+
+    # * whatever the click used up comes off the wait
+    spent = (time.perf_counter() - start) * 1000
+    page.wait_for_function(FIN_QUARTERLY_JS, timeout=max(budget - spent, 1))
+    record_step("quarterly", time.perf_counter() - start)
@@ -0,0 +1,128 @@
+"""Turn scraped display strings ("2.87T", "28.5%", "(4,512)", "N/A") into
+numbers. Works on a whole day of the store at once with pandas/NumPy"""
+import argparse
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from rich import print
+
+import stock_store
+
+# * display suffix -> multiplier
+SCALES = {"k": 1e3, "K": 1e3, "M": 1e6, "B": 1e9, "T": 1e12}
+
+# * "(4,512)" is negative, "%" sets the unit, a suffix sets the scale. A
+# * signed number in parentheses, like the change "(-0.64%)", keeps its sign
+NUMBER = (
+    r"^(?P<open>\()?(?P<sign>[-+])?(?P<number>[\d,]*\.?\d+)"
+    r"(?P<suffix>[kKMBT])?(?P<percent>%)?(?P<close>\))?$"
+)
+
+
+def normalize(raw) -> pd.DataFrame:
+    """Parse a column of display strings in one vectorized pass. Returns
+    raw, value (float64), unit, scale and an is_null mask"""
+    text = pd.Series(raw, dtype="object").astype("string").str.strip()
+    # * scraped text repeats a lot ("N/A", "-", ranges), parse each once
+    codes, uniques = pd.factorize(text)
+    parts = pd.Series(uniques, dtype="string").str.extract(NUMBER)
+
+    number = pd.to_numeric(
+        parts["number"].str.replace(",", "", regex=False), errors="coerce"
+    ).to_numpy(dtype="float64", na_value=np.nan)
+    scale = parts["suffix"].map(SCALES).fillna(1.0).to_numpy(dtype="float64")
+    signed = parts["sign"].notna()
+    negative = (
+        (parts["sign"] == "-").fillna(False)
+        | (parts["open"].notna() & parts["close"].notna() & ~signed)
+    ).to_numpy(dtype=bool)
+    percent = parts["percent"].notna().to_numpy()
+    value = np.where(negative, -number, number) * scale
+
+    # * missing text has code -1, point it at an extra NaN slot
+    value = np.append(value, np.nan)[codes]
+    scale = np.append(scale, 1.0)[codes]
+    percent = np.append(percent, False)[codes]
+
+    return pd.DataFrame(
+        {
+            "raw": text.to_numpy(dtype=object),
+            "value": value,
+            "unit": np.where(percent, "%", ""),
+            "scale": scale,
+            "is_null": np.isnan(value),
+        },
+        index=text.index,
+    )
+
+
+def parse_value(text):
+    """One display string to a float, None when it isn't a number"""
+    value = normalize([text])["value"].iloc[0]
+    return None if np.isnan(value) else float(value)
+
+
+def normalize_day(conn, day, pages=None) -> int:
+    """Normalize every field scraped on one date, or only those of some
+    pages, and save it next to the raw text. Returns the number of cells"""
+    # * date isn't first in any index, with the page it is a range lookup
+    pages = pages or stock_store.pages(conn)
+    frame = pd.read_sql_query(
+        "SELECT symbol, page, date, field, value FROM observations"
+        f" WHERE page IN ({','.join('?' * len(pages))}) AND date = ?",
+        conn,
+        params=[*pages, day],
+    )
+    numbers = normalize(frame["value"])
+    rows = pd.concat(
+        [
+            frame[["symbol", "page", "date", "field"]],
+            numbers[["value", "unit", "scale"]],
+            numbers["is_null"].astype(int),
+        ],
+        axis=1,
+    )
+    # * NaN goes in as NULL
+    rows = rows.astype(object).where(rows.notna(), None)
+    conn.executemany(
+        "INSERT OR REPLACE INTO numbers VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        rows.itertuples(index=False, name=None),
+    )
+    conn.commit()
+    return len(rows)
+
+
+def read_numbers(conn, page, symbols=None, start=None, end=None):
+    """Numeric version of stock_store.read_frame, float64 columns"""
+    query = "SELECT symbol, date, field, value FROM numbers WHERE page = ?"
+    params = [page]
+    if symbols:
+        query += f" AND symbol IN ({','.join('?' * len(symbols))})"
+        params.extend(symbols)
+    if start:
+        query += " AND date >= ?"
+        params.append(start)
+    if end:
+        query += " AND date <= ?"
+        params.append(end)
+
+    frame = pd.read_sql_query(query, conn, params=params)
+    return frame.pivot(
+        index=["symbol", "date"], columns="field", values="value"
+    ).astype("float64")
+
+
+def main():
+    """main starting point of program"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--date", default=str(date.today()))
+    parser.add_argument("--db", default=str(stock_store.DB_PATH))
+    args = parser.parse_args()
+
+    cells = normalize_day(stock_store.connect(args.db), args.date)
+    print(f"Normalized {cells} cells for {args.date}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""Binary OHLCV store. One fixed width file per column under
+stock_data/<SYM>/ohlcv, opened with numpy.memmap. The sorted date column is
+the index, so a date range is a binary search and a zero-copy slice:
+
+    python ohlcv_store.py import AAPL MSFT
+"""
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from rich import print
+
+import atomic_file
+
+DATA_DIR = Path("stock_data")
+FOLDER = "ohlcv"
+CSV_NAME = "historical_data.csv"
+# * bumped each time stored rows are rewritten instead of appended to
+GENERATION = "generation"
+
+# * column -> little endian dtype, date is seconds since epoch (UTC)
+COLUMNS = {
+    "date": "<i8",
+    "open": "<f8",
+    "high": "<f8",
+    "low": "<f8",
+    "close": "<f8",
+    "adj_close": "<f8",
+    "volume": "<i8",
+}
+# * Yahoo v7 CSV header -> store column
+CSV_COLUMNS = {
+    "Date": "date",
+    "Open": "open",
+    "High": "high",
+    "Low": "low",
+    "Close": "close",
+    "Adj Close": "adj_close",
+    "Volume": "volume",
+}
+
+
+def main():
+    """main starting point of program"""
+    if sys.argv[1:2] != ["import"]:
+        print("usage: python ohlcv_store.py import [SYMBOL ...]")
+        return
+
+    symbols = sys.argv[2:] or [
+        path.parent.name for path in DATA_DIR.glob(f"*/{CSV_NAME}")
+    ]
+    for symbol in symbols:
+        rows = from_csv(symbol)
+        print(f"{symbol}: {rows} rows")
+
+
+def column_path(symbol, column) -> Path:
+    """File holding one column of a stock"""
+    return DATA_DIR / symbol / FOLDER / f"{column}.bin"
+
+
+def length(symbol) -> int:
+    """Rows in the store. A column cut short by a crash caps the length"""
+    sizes = []
+    for column, dtype in COLUMNS.items():
+        path = column_path(symbol, column)
+        size = path.stat().st_size if path.is_file() else 0
+        sizes.append(size // np.dtype(dtype).itemsize)
+    return min(sizes)
+
+
+def generation(symbol) -> int:
+    """How many times the stored rows were rewritten, an append keeps it.
+    Caches built from the store compare it to tell a rewrite"""
+    path = DATA_DIR / symbol / FOLDER / GENERATION
+    if not path.is_file():
+        return 0
+    return int(path.read_text(encoding="utf-8"))
+
+
+def open_columns(symbol) -> dict:
+    """Read only memmap of every column, empty arrays for a new stock"""
+    rows = length(symbol)
+    if rows == 0:
+        return {
+            column: np.empty(0, dtype) for column, dtype in COLUMNS.items()
+        }
+
+    return {
+        column: np.memmap(
+            column_path(symbol, column), dtype=dtype, mode="r", shape=(rows,)
+        )
+        for column, dtype in COLUMNS.items()
+    }
+
+
+def seconds(day) -> int:
+    """Date, string or Timestamp as seconds since epoch"""
+    return int(pd.Timestamp(day).value // 10**9)
+
+
+def date_slice(dates, start=None, end=None) -> slice:
+    """Rows from start to end inclusive on the sorted date column"""
+    low = 0 if start is None else np.searchsorted(dates, seconds(start))
+    high = (
+        len(dates)
+        if end is None
+        else np.searchsorted(dates, seconds(end), side="right")
+    )
+    return slice(int(low), int(high))
+
+
+def load(symbol, start=None, end=None) -> pd.DataFrame:
+    """DataFrame of a date range backed by the memmaps, no copy made"""
+    columns = open_columns(symbol)
+    rows = date_slice(columns["date"], start, end)
+    index = pd.DatetimeIndex(
+        columns.pop("date")[rows].view("datetime64[s]"), name="date"
+    )
+    # * copy=False keeps each column its own block instead of consolidating
+    return pd.DataFrame(
+        {column: values[rows] for column, values in columns.items()},
+        index=index,
+        copy=False,
+    )
+
+
+def to_columns(frame) -> dict:
+    """Column arrays from a Yahoo CSV frame, sorted with one row per date"""
+    frame = frame.rename(columns=CSV_COLUMNS)
+    dates = pd.to_datetime(frame["date"]).to_numpy("datetime64[s]")
+    order = np.argsort(dates, kind="stable")
+    dates = dates[order].astype("<i8")
+    # * keep the last row for a repeated date
+    keep = np.append(dates[1:] != dates[:-1], True)
+
+    columns = {"date": dates[keep]}
+    for column, dtype in COLUMNS.items():
+        if column == "date":
+            continue
+        values = frame[column].to_numpy()[order][keep]
+        if dtype == "<i8":
+            values = np.nan_to_num(values.astype("<f8"))
+        columns[column] = values.astype(dtype)
+    return columns
+
+
+def write(symbol, columns):
+    """Replace a stock's files, each written in full then renamed. The
+    generation goes up first, a crash halfway still reads as a rewrite"""
+    folder = DATA_DIR / symbol / FOLDER
+    folder.mkdir(exist_ok=True, parents=True)
+    atomic_file.write_text(folder / GENERATION, str(generation(symbol) + 1))
+    for column, dtype in COLUMNS.items():
+        path = column_path(symbol, column)
+        with atomic_file.atomic_open(path, mode="wb") as file:
+            np.ascontiguousarray(columns[column], dtype).tofile(file)
+
+
+def append(symbol, columns):
+    """Add rows newer than the last stored date to the end of each file.
+    Each file is first cut to the stored length, so a tail left by an
+    append that was killed halfway can't shift its dates from the prices"""
+    rows = length(symbol)
+    for column, dtype in COLUMNS.items():
+        with column_path(symbol, column).open(mode="r+b") as file:
+            file.truncate(rows * np.dtype(dtype).itemsize)
+            file.seek(0, os.SEEK_END)
+            np.ascontiguousarray(columns[column], dtype).tofile(file)
+
+
+def merge(symbol, frame) -> int:
+    """Add a Yahoo CSV frame to the store, returns new rows. Appends when
+    every row is newer, otherwise rewrites with downloaded rows winning"""
+    if frame.empty:
+        return 0
+
+    new = to_columns(frame)
+    stored = open_columns(symbol)
+    before = len(stored["date"])
+    if before == 0:
+        write(symbol, new)
+        return len(new["date"])
+
+    if new["date"][0] > stored["date"][-1]:
+        del stored
+        append(symbol, new)
+        return len(new["date"])
+
+    # * overlapping dates, the later copy of a date is kept
+    combined = {
+        column: np.concatenate([stored[column], new[column]])
+        for column in COLUMNS
+    }
+    order = np.argsort(combined["date"], kind="stable")
+    dates = combined["date"][order]
+    keep = np.append(dates[1:] != dates[:-1], True)
+    merged = {
+        column: values[order][keep] for column, values in combined.items()
+    }
+    # * drop the memmaps before the files are replaced
+    del stored
+    write(symbol, merged)
+    return len(merged["date"]) - before
+
+
+def from_csv(symbol) -> int:
+    """Import a stock's historical_data.csv, returns rows stored"""
+    frame = pd.read_csv(DATA_DIR / symbol / CSV_NAME)
+    columns = to_columns(frame)
+    write(symbol, columns)
+    return len(columns["date"])
+
+
+if __name__ == "__main__":
+    main()
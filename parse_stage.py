@@ -0,0 +1,410 @@
+"""Stage 2 of the scrape. Fragments fetched by the browser or HTTP client
+are parsed into records on a process pool, so selectolax work runs beside
+the network instead of behind it. reparse rebuilds every JSON file from
+the snapshot archive without touching the network:
+
+    python parse_stage.py reparse [SYMBOL ...]
+"""
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from rich import print
+
+import atomic_file
+import fetch_cache
+import financials_json
+import manifest
+import navigation
+import quarterly_data
+import quote_api
+import run_journal
+import scrap_yahoo_finance as yahoo
+import snapshot_archive
+import tracing
+
+WORKERS = os.cpu_count() or 1
+
+SUMMARY_PAGES = ["profile", "summary", "quote"]
+STATEMENT_PAGES = ["income", "balance", "cash"]
+
+
+def parse_profile(stock, fragments) -> dict:
+    """Profile tab record"""
+    return {"company": yahoo.parse_profile(fragments[0])}
+
+
+def parse_summary(stock, fragments) -> dict:
+    """Quote header and summary table record"""
+    header_html, summary_html = fragments
+    return {"summary": yahoo.parse_summary(stock, header_html, summary_html)}
+
+
+def parse_quote(stock, fragments) -> dict:
+    """Batch quote API result of one symbol"""
+    return json.loads(fragments[0])
+
+
+def parse_stats(stock, fragments) -> dict:
+    """Statistics tab record"""
+    return {"stats": quarterly_data.parse_stats(fragments[0])}
+
+
+def parse_timeseries(stock, fragments) -> dict:
+    """Statements from a timeseries API response"""
+    series = financials_json.timeseries_series(fragments[0])
+    return financials_json.statements(series)
+
+
+def parse_embedded(stock, fragments) -> dict:
+    """Statements from the store embedded in the financials page"""
+    series = financials_json.store_series(fragments[0])
+    return financials_json.statements(series) if series else {}
+
+
+def statement_parser(page_type):
+    """Parser for one statement tab"""
+
+    def parse_statement(stock, fragments) -> dict:
+        """Statement tab rows"""
+        return quarterly_data.parse_statement(fragments[0], page_type)
+
+    return parse_statement
+
+
+# * page type -> record parser, the same parsers the scrapers use
+PARSERS = {
+    "profile": parse_profile,
+    "summary": parse_summary,
+    "quote": parse_quote,
+    "stats": parse_stats,
+    "timeseries": parse_timeseries,
+    "embedded": parse_embedded,
+    **{page: statement_parser(page) for page in STATEMENT_PAGES},
+}
+
+
+class Meter:
+    """Pages, bytes, CPU seconds and step latencies of one task"""
+
+    def __init__(self):
+        self.pages = 0
+        self.bytes = 0
+        self.started = time.process_time()
+        self.steps = {"parse": [], "json_write": []}
+
+    def parse(self, stock, page_type, fragments) -> dict:
+        """Parse one page and count it"""
+        self.pages += 1
+        size = sum(len(fragment) for fragment in fragments)
+        self.bytes += size
+        start = time.perf_counter()
+        with tracing.span("parse", symbol=stock, page=page_type, bytes=size):
+            record = PARSERS[page_type](stock, fragments)
+        self.steps["parse"].append(time.perf_counter() - start)
+        return record
+
+    def write(self, path, data):
+        """Save a JSON file and time it"""
+        start = time.perf_counter()
+        with tracing.span("json_data"):
+            atomic_file.write_text(path, json.dumps(data))
+        self.wrote(time.perf_counter() - start)
+
+    def wrote(self, seconds):
+        """Count one JSON write"""
+        self.steps["json_write"].append(seconds)
+        tracing.observe("json_write", seconds)
+
+    def result(self) -> dict:
+        """Counters sent back to the main process, with the worker's span
+        histograms and event counters"""
+        return {
+            "pages": self.pages,
+            "bytes": self.bytes,
+            "cpu": time.process_time() - self.started,
+            "steps": self.steps,
+            "metrics": tracing.drain(),
+        }
+
+
+def new_totals() -> dict:
+    """Counters for a run of tasks"""
+    return {"pages": 0, "bytes": 0, "cpu": 0.0}
+
+
+def add_result(totals, result):
+    """Fold one task into the run, its step latencies into navigation's
+    and its metrics into tracing's"""
+    for key in totals:
+        totals[key] += result[key]
+    for step, timings in result["steps"].items():
+        for seconds in timings:
+            navigation.record_step(step, seconds)
+    tracing.merge(result["metrics"])
+
+
+def pool(workers=WORKERS) -> ProcessPoolExecutor:
+    """Parse pool. Spawned so workers don't share the parent's SQLite
+    connections or browser"""
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def write_summary(stock, pages, run=None, fetched=()) -> dict:
+    """Parse freshly fetched profile/summary fragments and save the JSON.
+    fetched, the fetch cache rows of the pages, are saved once it is on
+    disk so a parse that fails fetches them again. With a run id the stock
+    goes in the run journal once today's summary is on disk"""
+    meter = Meter()
+    records = {
+        page: meter.parse(stock, page, fragments)
+        for page, fragments in pages.items()
+    }
+    path = Path(f"stock_data/{stock}", f"{stock}.json")
+    stock_results = [records["profile"]] if "profile" in records else []
+    summary_data = records.get("summary")
+    if "quote" in records:
+        summary_data = quote_summary(
+            stock, records["quote"], summary_data, meter
+        )
+    # * a new file always gets a summary entry, empty like a timeout was
+    saved = manifest.get(stock)["summary_date"] is not None
+    if summary_data is None and not saved:
+        summary_data = {"summary": {}}
+    if stock_results or summary_data is not None:
+        start = time.perf_counter()
+        with tracing.span("json_data", symbol=stock, page="summary"):
+            yahoo.json_data(path, stock_results, summary_data)
+        meter.wrote(time.perf_counter() - start)
+    if fetched:
+        fetch_cache.save(fetched)
+    if run and ("summary" in records or "quote" in records):
+        run_journal.done(run, stock, "summary")
+    return meter.result()
+
+
+def quote_summary(stock, quote, page, meter) -> dict:
+    """Summary record from a batch quote. The fields the API lacks come
+    from the quote page scraped with it, or else the newest archived one"""
+    if page is None:
+        fragments = snapshot_archive.latest(stock, "summary")
+        page = fragments and meter.parse(stock, "summary", fragments)
+    page = page and page["summary"]
+    return {"summary": quote_api.summary(stock, quote, page)}
+
+
+def settle(futures, totals, done=None, wait=False):
+    """Fold the finished parse tasks into totals and drop them from futures,
+    waiting for every one with wait. done(stock, error) hears about each,
+    a stock without a task is done with nothing to parse"""
+    for stock, future in list(futures.items()):
+        if future is not None and not (wait or future.done()):
+            continue
+        del futures[stock]
+        failure = None
+        if future is not None:
+            try:
+                add_result(totals, future.result())
+            except Exception as error:
+                print(f"{stock} parse failed: {error!r}")
+                manifest.failed(stock, "parse", type(error).__name__)
+                failure = error
+        if done is not None:
+            done(stock, failure)
+
+
+def collect(futures, workers=WORKERS, totals=None, done=None) -> dict:
+    """Wait for the parse tasks of a run and print the throughput"""
+    began = time.perf_counter()
+    totals = totals or new_totals()
+    settle(futures, totals, done, wait=True)
+
+    report(totals, workers)
+    waited = time.perf_counter() - began
+    print(f"Parse stage finished {waited:.2f}s after the last fetch")
+    return totals
+
+
+def report(totals, workers):
+    """Print parse throughput per core"""
+    cpu = totals["cpu"]
+    per_core = totals["pages"] / cpu if cpu else 0.0
+    print(
+        f"Parse stage: {totals['pages']} pages,"
+        f" {totals['bytes'] / 2**20:.1f} MB on {workers} workers,"
+        f" {cpu:.2f}s CPU, {per_core:.0f} pages/s per core"
+    )
+
+
+def load_saved(path) -> list:
+    """JSON output already on disk, empty for a new stock"""
+    if not path.is_file():
+        return []
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def rebuild_summary(stock, snapshots) -> dict:
+    """<SYM>.json from archived profile, summary and batch quote fetches,
+    merged into the saved file. An archived day replaces the saved one,
+    days saved before the archive existed are kept"""
+    meter = Meter()
+    path = Path(f"stock_data/{stock}", f"{stock}.json")
+    saved = load_saved(path)
+    profiles = [hashes for page, _, hashes in snapshots if page == "profile"]
+    if profiles:
+        # * the newest profile is the one json_data would have kept
+        fragments = snapshot_archive.load(profiles[-1])
+        results = [meter.parse(stock, "profile", fragments)]
+    else:
+        results = [item for item in saved if "company" in item]
+    days = {
+        day: record
+        for item in saved
+        for day, record in item.items()
+        if day != "company"
+    }
+    by_day = defaultdict(dict)
+    for page, day, hashes in snapshots:
+        by_day[day][page] = hashes
+
+    # * a batch quote takes the fields the API lacks from the newest quote
+    # * page up to its day, like write_summary did
+    summary = None
+    for day in sorted(by_day):
+        fetched = by_day[day]
+        if "summary" in fetched:
+            summary = meter.parse(
+                stock, "summary", snapshot_archive.load(fetched["summary"])
+            )
+        if "quote" in fetched:
+            quote = meter.parse(
+                stock, "quote", snapshot_archive.load(fetched["quote"])
+            )
+            page = summary and summary["summary"]
+            days[day] = {"summary": quote_api.summary(stock, quote, page)}
+        elif "summary" in fetched:
+            days[day] = summary
+    # * json_data keeps the first day at index 1, newer days go in at 2
+    ordered = [{day: days[day]} for day in sorted(days)]
+    results += ordered[:1] + ordered[:0:-1]
+
+    path.parent.mkdir(exist_ok=True, parents=True)
+    meter.write(path, results)
+    manifest.update(stock, **manifest.summary_fields(results))
+    return meter.result()
+
+
+def quarter_key(quarter) -> tuple:
+    """Sort key of a quarter end like 2023-3-31"""
+    return tuple(int(part) for part in quarter.split("-"))
+
+
+def rebuild_quarterly(stock, snapshots) -> dict:
+    """quarterly.json from archived statistics and statement fetches,
+    merged into the saved file. An archived quarter replaces the saved one,
+    quarters saved before the archive existed are kept"""
+    meter = Meter()
+    by_day = defaultdict(dict)
+    for page, day, hashes in snapshots:
+        by_day[day][page] = hashes
+
+    quarters = {}
+    for day in sorted(by_day):
+        fetched = by_day[day]
+        if "stats" not in fetched:
+            continue
+
+        def parse(page):
+            """Parse one archived page of this fetch"""
+            return meter.parse(
+                stock, page, snapshot_archive.load(fetched[page])
+            )
+
+        record = parse("stats")
+        tables = {}
+        for source in ("timeseries", "embedded"):
+            if source in fetched:
+                tables = parse(source)
+                if any(tables.values()):
+                    break
+        if not any(tables.values()):
+            tables = {
+                page: parse(page) if page in fetched else {}
+                for page in STATEMENT_PAGES
+            }
+        record |= tables
+
+        # * a later fetch in the same quarter replaces the earlier one
+        quarter = quarterly_data.quarterly_date(datetime.fromisoformat(day))
+        quarters[quarter] = {quarter: [record]}
+
+    if not quarters:
+        return meter.result()
+
+    path = Path(f"stock_data/{stock}", "quarterly.json")
+    results = load_saved(path) or [{"quarterly": []}]
+    for item in results[0]["quarterly"]:
+        for quarter in item:
+            quarters.setdefault(quarter, item)
+    # * newest quarter first
+    results[0]["quarterly"] = [
+        quarters[quarter] for quarter in sorted(quarters, key=quarter_key)
+    ][::-1]
+    path.parent.mkdir(exist_ok=True, parents=True)
+    meter.write(path, results)
+    manifest.update(stock, **manifest.quarter_fields(results))
+    return meter.result()
+
+
+def reparse(symbols=None, workers=WORKERS):
+    """Rebuild the JSON output of every archived stock on the pool"""
+    snapshots = defaultdict(lambda: defaultdict(list))
+    for symbol, page, day, hashes in snapshot_archive.entries(
+        symbols=symbols
+    ):
+        kind = "summary" if page in SUMMARY_PAGES else "quarterly"
+        snapshots[symbol][kind].append((page, day, hashes))
+
+    began = time.perf_counter()
+    futures = {}
+    with pool(workers) as executor:
+        for symbol, kinds in snapshots.items():
+            for kind, rebuild in (
+                ("summary", rebuild_summary),
+                ("quarterly", rebuild_quarterly),
+            ):
+                if kinds[kind]:
+                    futures[f"{symbol} {kind}"] = executor.submit(
+                        rebuild, symbol, kinds[kind]
+                    )
+        totals = new_totals()
+        for name, future in futures.items():
+            try:
+                add_result(totals, future.result())
+            except Exception as error:
+                print(f"{name} reparse failed: {error!r}")
+
+    elapsed = time.perf_counter() - began
+    print(f"Reparsed {len(snapshots)} stocks in {elapsed:.2f}s")
+    report(totals, workers)
+
+
+def main():
+    """main starting point of program"""
+    if sys.argv[1:2] != ["reparse"]:
+        print("usage: python parse_stage.py reparse [SYMBOL ...]")
+        return
+
+    reparse(sys.argv[2:] or None)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,98 +1,214 @@
 """Get quarterly data from Yahoo Finance"""
 import json
-import time
 from datetime import datetime
 from pathlib import Path
 
-from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
 from playwright.sync_api import sync_playwright
 from rich import print
-from selectolax.parser import HTMLParser
+
+import atomic_file
+import extract
+import fetch_cache
+import financials_json
+import http_fetch
+import manifest
+import market_calendar
+import navigation
+import request_policy
+import run_journal
+import snapshot_archive
+import stock_store
+import tracing
 
 # * single stock
 # STOCKS = ["AAPL"]
 # * make list of stocks
 STOCKS = ["AAPL", "AMC", "AMZN", "F", "GOOGL", "MSFT"]
 
+# * point at a local fixture server for benchmarks
+BASE_URL = "https://finance.yahoo.com"
+# * "json" gets all three statements in one request, "html" scrapes 3 pages
+FINANCIALS_MODE = "json"
+# * "json" writes stock_data/<SYM>/quarterly.json
+# * "sqlite" appends to the store in stock_data/stocks.db
+STORAGE = "json"
+# * parts of a quarter that change when the company reports, stats has
+# * intraday values like market cap
+STATEMENTS = ["income", "balance", "cash"]
+
 
 def main():
     """main starting point of program"""
-
+    scrape(plan(STOCKS), run_journal.start("quarterly"))
+
+
+def plan(stocks, now=None) -> list:
+    """Stocks without a quarterly.json or missing the current quarter, from
+    the manifest in one query. A late reporter stays due until its quarter
+    is saved, the fetch cache spaces out the polls"""
+    if STORAGE == "sqlite":
+        return list(stocks)
+    now = now or datetime.now()
+    quarter = quarterly_date(now)
+    entries = manifest.rows(stocks)
+    saved = {stock: entry["quarter"] for stock, entry in entries.items()}
+    due = [stock for stock in stocks if saved.get(stock) != quarter]
+    print(f"{len(due)} of {len(stocks)} stocks due quarterly data")
+    return due
+
+
+def scrape(stocks, run=None, done=None):
+    """Scrape stocks as they come off the iterable, work_queue feeds it
+    leased symbols. done(stock, None) once a stock is saved"""
     with sync_playwright() as play_wright:
         browser = play_wright.chromium.launch()
-        context = browser.new_context(
-            user_agent=(
-                "Mozilla/5.0 (Macintosh; Intel Mac OS X 13_5)"
-                " AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0"
-                " Safari/537.36"
-            )
-        )
-        page = context.new_page()
-        page.set_default_timeout(120000)
+        page, nav_stats = navigation.new_page(browser)
 
-        for stock in STOCKS:
+        for stock in stocks:
             print(stock)
-            process_stocks(page, stock)
+            with tracing.span("stock", symbol=stock):
+                process_stocks(page, stock, run)
+            navigation.report(stock, nav_stats)
+            if done is not None:
+                done(stock, None)
 
         # * close browswer
         page.close()
+        http_fetch.close_client()
+        navigation.report_steps()
+        fetch_cache.report()
+        request_policy.report()
 
 
-def process_stocks(page, stock):
-    """Get all of the quarterly data from Yahoo Finance"""
+def process_stocks(page, stock, run=None):
+    """Get all of the quarterly data from Yahoo Finance. With a run id the
+    stock is skipped once the run journal has it"""
+    if run and run_journal.is_done(run, stock, "quarterly"):
+        print("Quarterly data already saved this run....")
+        return
+
+    if STORAGE == "sqlite":
+        store_stocks(page, stock)
+    else:
+        save_quarter(page, stock)
+    if run:
+        run_journal.done(run, stock, "quarterly")
+
 
+def save_quarter(page, stock):
+    """Fetch the quarter and add it to quarterly.json when it is new. The
+    fetch cache is only updated after the file is written, a crash in
+    between fetches the quarter again instead of losing it"""
     path = Path(f"stock_data/{stock}", "quarterly.json")
-    now = datetime.now()
-    month = now.month
 
     quarter_list = []
 
     # * if "quarterly.json" doesn't exist create folder and run quarterly_info
     # * if "quarterly.json" exsists check dates to add data or not
-    if not path.is_file():
+    if manifest.get(stock)["quarter"] is None:
         path.parent.mkdir(exist_ok=True, parents=True)
         quarter_list.append(quarterly_info(page, stock))
         quarterly_data = quarter_list
         # *  save data to json file
-        json_data(path, quarterly_data, isdate_quarterly=False)
+        with navigation.timed("json_write", symbol=stock, page="quarterly"):
+            json_data(path, quarterly_data, isdate_quarterly=False)
+        record_quarter(stock, quarter_list[0])
 
     else:
-        if check_quarterly_date(path, month):
+        # * polled recently, companies report weeks after quarter end
+        if fetch_cache.is_fresh(stock, "quarterly"):
+            print("Quarterly data is fresh....")
+            return
+
+        if check_quarterly_date(stock):
             quarterly_data = quarterly_info(page, stock)
+            if not quarter_changed(stock, quarterly_data):
+                # * starts the poll interval over
+                record_quarter(stock, quarterly_data)
+                print("Quarterly report not out yet....")
+                return
             # *  save data to json file
-            json_data(path, quarterly_data, isdate_quarterly=True)
+            with navigation.timed(
+                "json_write", symbol=stock, page="quarterly"
+            ):
+                json_data(path, quarterly_data, isdate_quarterly=True)
+            record_quarter(stock, quarterly_data)
 
         else:
             print("No new Quarterly data")
             return
 
 
-def check_quarterly_date(path, month):
-    """summary"""
-    # //TODO: only run quarterly end of month
-    # * if date is 1, 4, 7, 10 run quarterly_info()
-    # * else if quarterly date in .json file skip
-    quarter_month_list = [1, 4, 7, 10]
-    dates = []
-
-    # * if date in quarterly_date_list run code below
-    if month in quarter_month_list:
-        quarter_date = quarterly_date()
-        # * if .json check file quarterly date and compare to currently quarter
-        with path.open(mode="r", encoding="utf-8") as file:
-            # * place json data in results list
-            results = json.load(file)
-            quarterly = results[0]["quarterly"]
-            for item in quarterly:
-                for key in item:
-                    dates.append(key)
-            if quarter_date not in dates:
-                print("Quarterly data being extracted...")
-                return True
+def store_stocks(page, stock):
+    """Get the quarterly data and append it to the sqlite store"""
+    conn = stock_store.connect()
+
+    # * same rule as the json files, first run or a new quarter
+    has_stats = stock_store.has_page(conn, stock, "stats")
+    if has_stats:
+        if fetch_cache.is_fresh(stock, "quarterly"):
+            print("Quarterly data is fresh....")
+            return
+        if stock_store.has_date(conn, stock, "stats", quarterly_date()):
+            print("Quarterly data is already in the store")
+            return
+
+    quarterly_data = quarterly_info(page, stock)
+    if not quarter_changed(stock, quarterly_data) and has_stats:
+        record_quarter(stock, quarterly_data)
+        print("Quarterly report not out yet....")
+        return
+    stock_store.add_quarterly(conn, stock, quarterly_data)
+    record_quarter(stock, quarterly_data)
+
+
+def quarter_statements(quarterly_data) -> dict:
+    """The statements of a fetched quarter"""
+    ((stock_data,),) = quarterly_data.values()
+    return {key: stock_data.get(key) or {} for key in STATEMENTS}
+
+
+def quarter_fragments(quarterly_data) -> list:
+    """The quarter's statements as the fetch cache hashes them. Not the
+    quarter label, it moves on at quarter end before the report is out"""
+    return [json.dumps(quarter_statements(quarterly_data), sort_keys=True)]
+
+
+def quarter_changed(stock, quarterly_data) -> bool:
+    """Check if the quarter's statements differ from the last fetch, False
+    when none came back"""
+    if not any(quarter_statements(quarterly_data).values()):
+        return False
+    return fetch_cache.changed(
+        stock, "quarterly", quarter_fragments(quarterly_data)
+    )
+
+
+def record_quarter(stock, quarterly_data) -> bool:
+    """Hash the quarter's numbers, False when they match the last fetch"""
+    return fetch_cache.update(
+        stock, "quarterly", quarter_fragments(quarterly_data)
+    )
 
-            else:
-                print("Quarterly data is already in .json file")
-                return False
+
+def check_quarterly_date(stock):
+    """Check if the current quarter is due, the manifest has the last one
+    saved"""
+    # * compare the last saved quarter to the current quarter
+    if manifest.get(stock)["quarter"] != quarterly_date():
+        print("Quarterly data being extracted...")
+        return True
+
+    print("Quarterly data is already in .json file")
+    return False
+
+
+def reporting(now=None) -> bool:
+    """Check if companies may still be reporting the last quarter, inside
+    the fetch cache's reporting window after it ended"""
+    day = (now or datetime.now()).date()
+    since = day - market_calendar.last_quarter_end(day)
+    return since < fetch_cache.REPORTING_WINDOW
 
 
 def quarterly_info(page, stock):
@@ -111,32 +227,61 @@ def quarterly_info(page, stock):
 def stats(page, stock):
     """Get stock statistics data on yahoo finance"""
     print("Scraping Statistics Data....")
-    try:
-        stats_dict = {}
-        url_stats = "https://finance.yahoo.com/quote/{}/key-statistics?p={}"
-        page.goto(url_stats.format(stock, stock), timeout=0)
-        # * Get quarterly data
-        # * Call quarterly date funciton
-        html = page.inner_html("div#Main")
-        data = HTMLParser(html)
-        stats_info = data.css_first("table")
-        stats_table = stats_info.css("tbody tr")
-        for row in stats_table:
-            key = row.css_first("td").text().strip()
-            value = row.css("td")[2].text()
-            stats_dict.update({key: value})
-
-    except PlaywrightTimeoutError:
-        print("Timeout")
+    stats_dict = {}
+    url_stats = BASE_URL + "/quote/{}/key-statistics?p={}"
+    url = url_stats.format(stock, stock)
+    with tracing.span("fetch", symbol=stock, page="stats") as span:
+        result = request_policy.call(
+            "stats", url, lambda timeout: stats_html(page, url, timeout)
+        )
+        request_policy.record(stock, "stats", result)
+        if result.ok:
+            html = result.value
+            span.set(bytes=len(html))
+            snapshot_archive.save(stock, "stats", [html])
+            # * Get quarterly data
+            # * Call quarterly date funciton
+            with navigation.timed("parse"):
+                stats_dict = parse_stats(html)
+        else:
+            manifest.failed(stock, "stats", result.outcome)
+            span.set(outcome=result.outcome)
 
     return {"stats": stats_dict}
     # print(stats_dict)
 
 
+def stats_html(page, url, timeout):
+    """Statistics tab html over HTTP, or the browser when the page needs
+    it, within timeout ms"""
+    html = None
+    if http_fetch.use_http("stats"):
+        html = http_fetch.fetch_fragment(
+            url, "div#Main", timeout=timeout / 1000
+        )
+    # * fall back to the browser
+    if html is None:
+        navigation.goto(page, url, "div#Main", timeout)
+        with navigation.timed("inner_html"):
+            html = page.inner_html("div#Main")
+    return html
+
+
+def parse_stats(html) -> dict:
+    """Parse the statistics tab html"""
+    return extract.extract("stats", html)
+
+
 def financials(page, stock):
     """Get stock financal data on yahoo finance"""
     print("Scraping Financials Data....")
 
+    if FINANCIALS_MODE == "json":
+        financial_dict = financials_json.fetch(stock)
+        if financial_dict:
+            return financial_dict
+        print("No statement JSON, scraping statement pages....")
+
     financial_dict = {}
 
     income_data = income(page, stock)
@@ -156,78 +301,63 @@ def financials(page, stock):
 def income(page, stock) -> dict:
     """Get stock income statement data on yahoo finance"""
     print("Scraping Income Data....")
-    try:
-        income_dict = {}
-        url_financials = "https://finance.yahoo.com/quote/{}/financials?p={}"
-        page.goto(url_financials.format(stock, stock), timeout=0)
-        page.get_by_text("Quarterly").click()
-        time.sleep(2)
-        html = page.inner_html("div#Main")
-        data = HTMLParser(html)
-        income_info = data.css("div[data-test='fin-row']")
-        for item in income_info:
-            key = item.css_first("span").text()
-            value = item.css("div[data-test='fin-col']")[1].text()
-            income_dict.update({key: value})
-
-    except PlaywrightTimeoutError:
-        print("Timeout")
-
-    return income_dict
+    return statement(page, stock, "income", "/quote/{}/financials?p={}")
 
 
 def balance(page, stock) -> dict:
     """Get stock balance sheet data on yahoo finance"""
     print("Scraping Balance Data....")
-    try:
-        balance_dict = {}
-        url_financials = (
-            "https://finance.yahoo.com/quote/{}/balance-sheet?p={}"
-        )
-        page.goto(url_financials.format(stock, stock), timeout=0)
-        page.get_by_text("Quarterly").click()
-        time.sleep(2)
-        # * click quarterly button
-        html = page.inner_html("div#Main")
-        data = HTMLParser(html)
-        balance_info = data.css("div[data-test='fin-row']")
-        for item in balance_info:
-            key = item.css_first("span").text()
-            value = item.css_first("div[data-test='fin-col']").text()
-            balance_dict.update({key: value})
-
-    except PlaywrightTimeoutError:
-        print("Timeout")
-
-    return balance_dict
+    return statement(page, stock, "balance", "/quote/{}/balance-sheet?p={}")
 
 
 def cash(page, stock) -> dict:
     """Get stock cash flow data on yahoo finance"""
     print("Scraping Cash Flow Data....")
-    try:
-        cash_dict = {}
-        url_financials = "https://finance.yahoo.com/quote/{}/cash-flow?p={}"
-        page.goto(url_financials.format(stock, stock), timeout=0)
-        # * Click quarterly button
-        page.get_by_text("Quarterly").click()
-        time.sleep(2)
-        html = page.inner_html("div#Main")
-        data = HTMLParser(html)
-        cash_info = data.css("div[data-test='fin-row']")
-        for item in cash_info:
-            key = item.css_first("span").text()
-            value = item.css("div[data-test='fin-col']")[1].text()
-            cash_dict.update({key: value})
-
-    except PlaywrightTimeoutError:
-        print("Timeout")
-
-    return cash_dict
-
-
-def quarterly_date():
-    now = datetime.now()
+    return statement(page, stock, "cash", "/quote/{}/cash-flow?p={}")
+
+
+def statement(page, stock, page_type, url_path) -> dict:
+    """Quarterly view of a statement tab, archived then parsed"""
+    statement_dict = {}
+    url = (BASE_URL + url_path).format(stock, stock)
+    with tracing.span("fetch", symbol=stock, page=page_type) as span:
+        result = request_policy.call(
+            page_type,
+            url,
+            lambda timeout: statement_html(page, url, timeout),
+        )
+        request_policy.record(stock, page_type, result)
+        if result.ok:
+            html = result.value
+            span.set(bytes=len(html))
+            snapshot_archive.save(stock, page_type, [html])
+            with navigation.timed("parse"):
+                statement_dict = parse_statement(html, page_type)
+        else:
+            manifest.failed(stock, page_type, result.outcome)
+            span.set(outcome=result.outcome)
+
+    return statement_dict
+
+
+def statement_html(page, url, timeout):
+    """Statement tab html after the "Quarterly" click, within timeout ms
+    plus the click's own budget"""
+    navigation.goto(page, url, "div#Main", timeout)
+    # * click quarterly button
+    navigation.click_quarterly(page)
+    with navigation.timed("inner_html"):
+        return page.inner_html("div#Main")
+
+
+def parse_statement(html, page_type) -> dict:
+    """Parse statement rows, each statement reads its own fin-col"""
+    return extract.extract(page_type, html)
+
+
+def quarterly_date(now=None):
+    """Quarter end the data scraped on a day belongs to"""
+    now = now or datetime.now()
     month = now.month
     year = now.year
     # day = now.day
@@ -252,7 +382,8 @@ def quarterly_date():
 
 
 def json_data(path, quarterly_data, isdate_quarterly):
-    """Parse the stock data, save to json file"""
+    """Parse the stock data, save to json file. The manifest is updated
+    once the file is written"""
     print("Creating JSON data files....")
 
     results = []
@@ -268,14 +399,14 @@ def json_data(path, quarterly_data, isdate_quarterly):
 
         results.append(quarterly)
         # * write data to json file
-        with path.open(mode="w", encoding="utf-8") as file:
-            file.write(json.dumps(results))
+        atomic_file.write_text(path, json.dumps(results))
 
     else:
         # * write data to json file
         results.append({"quarterly": quarterly_data})
-        with path.open(mode="w", encoding="utf-8") as file:
-            file.write(json.dumps(results))
+        atomic_file.write_text(path, json.dumps(results))
+
+    manifest.update(path.parent.name, **manifest.quarter_fields(results))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,208 @@
+"""Summary data from Yahoo's multi-symbol quote API instead of one quote
+page per symbol. Hundreds of symbols come back in one request, made with
+the session cookie and crumb http_fetch keeps, and are mapped onto the
+keys parse_summary reads off the page. The few fields the API lacks are
+read from the quote page, which is only scraped again once it is older
+than PAGE_TTL"""
+import json
+from datetime import datetime, timedelta, timezone
+
+from rich import print
+
+import fetch_cache
+import http_fetch
+import navigation
+import request_policy
+import snapshot_archive
+import tracing
+
+# * point at a local fixture server for benchmarks
+QUERY_URL = "https://query1.finance.yahoo.com"
+# * symbols per request
+BATCH_SIZE = 200
+# * how old the quote page may get before it is scraped again for the
+# * fields the API lacks, they move slowly. None never scrapes it
+PAGE_TTL = timedelta(days=7)
+
+
+def price(value) -> str:
+    """Price the way the page shows it"""
+    return f"{value:,.2f}"
+
+
+def change(value) -> str:
+    """Signed price change"""
+    return f"{value:+,.2f}"
+
+
+def fraction(percent) -> str:
+    """Percent change as the fraction the page keeps in its value"""
+    return f"{percent / 100:.6f}"
+
+
+def order(value, size) -> str:
+    """Bid or ask, the API counts the size in lots of 100 shares"""
+    return f"{value:,.2f} x {size * 100}"
+
+
+def low_high(low, high) -> str:
+    """Low - high range"""
+    return f"{low:,.2f} - {high:,.2f}"
+
+
+def count(value) -> str:
+    """Share count with separators"""
+    return f"{int(value):,}"
+
+
+def abbreviate(value) -> str:
+    """Large number as 2.787T, 512.3B..."""
+    for suffix, size in (("T", 1e12), ("B", 1e9), ("M", 1e6)):
+        if abs(value) >= size:
+            return f"{value / size:,.3f}{suffix}"
+    return f"{value:,.0f}"
+
+
+def days(start, end) -> str:
+    """Earnings date, a range while it isn't confirmed"""
+    first, last = (
+        datetime.fromtimestamp(stamp, timezone.utc).strftime("%b %d, %Y")
+        for stamp in (start, end)
+    )
+    return first if first == last else f"{first} - {last}"
+
+
+def dividend(rate, percent) -> str:
+    """Forward dividend and yield"""
+    return f"{rate:,.2f} ({percent:.2f}%)"
+
+
+# * summary key -> (format, API fields it takes), in the page's order.
+# * None is a field the API lacks, it comes from the quote page
+FIELDS = {
+    "market_price": (price, ["regularMarketPrice"]),
+    "market_change": (change, ["regularMarketChange"]),
+    "market_percent": (fraction, ["regularMarketChangePercent"]),
+    "Previous Close": (price, ["regularMarketPreviousClose"]),
+    "Open": (price, ["regularMarketOpen"]),
+    "Bid": (order, ["bid", "bidSize"]),
+    "Ask": (order, ["ask", "askSize"]),
+    "Day's Range": (
+        low_high,
+        ["regularMarketDayLow", "regularMarketDayHigh"],
+    ),
+    "52 Week Range": (low_high, ["fiftyTwoWeekLow", "fiftyTwoWeekHigh"]),
+    "Volume": (count, ["regularMarketVolume"]),
+    "Avg. Volume": (count, ["averageDailyVolume3Month"]),
+    "Market Cap": (abbreviate, ["marketCap"]),
+    "Beta (5Y Monthly)": None,
+    "PE Ratio (TTM)": (price, ["trailingPE"]),
+    "EPS (TTM)": (price, ["epsTrailingTwelveMonths"]),
+    "Earnings Date": (
+        days,
+        ["earningsTimestampStart", "earningsTimestampEnd"],
+    ),
+    "Forward Dividend & Yield": (dividend, ["dividendRate", "dividendYield"]),
+    "Ex-Dividend Date": None,
+    "1y Target Est": None,
+}
+
+# * what the page shows when a field has no value
+MISSING = {"Forward Dividend & Yield": "N/A (N/A)"}
+
+
+def summary(stock, quote, page=None) -> dict:
+    """One API quote as the record parse_summary makes. Fields the API
+    lacks are taken from page, a parsed quote page, when there is one"""
+    page = page or {}
+    record = {"stock_symbol": stock}
+    for key, field in FIELDS.items():
+        if field is None:
+            if key in page:
+                record[key] = page[key]
+            continue
+        form, names = field
+        values = [quote.get(name) for name in names]
+        if None in values:
+            record[key] = MISSING.get(key, "N/A")
+        else:
+            record[key] = form(*values)
+    # * anything else the page has
+    for key, value in page.items():
+        record.setdefault(key, value)
+    return record
+
+
+def page_due(stock, now=None) -> bool:
+    """Check if the quote page is due a scrape for the fields the API
+    lacks"""
+    if PAGE_TTL is None:
+        return False
+    fetched_at = fetch_cache.fetched_at(stock, "summary")
+    if fetched_at is None:
+        return True
+    return (now or datetime.now()) - fetched_at >= PAGE_TTL
+
+
+def fetch(symbols) -> dict:
+    """symbol -> [quote JSON] for each symbol the API answered, BATCH_SIZE
+    symbols per request. Every quote is archived"""
+    quotes = {}
+    for start in range(0, len(symbols), BATCH_SIZE):
+        quotes |= fetch_batch(symbols[start : start + BATCH_SIZE])
+    return quotes
+
+
+def fetch_batch(symbols) -> dict:
+    """Quotes of up to BATCH_SIZE symbols in one request, through the
+    request policy. Empty when it gave up"""
+    url = QUERY_URL + "/v7/finance/quote"
+
+    def get(timeout, refresh=False):
+        """One request with the session's crumb"""
+        params = {
+            "symbols": ",".join(symbols),
+            "crumb": http_fetch.crumb(refresh),
+        }
+        with navigation.timed("http_fetch", page="quote") as span:
+            response = http_fetch.get_client().get(
+                url, params=params, timeout=timeout / 1000
+            )
+            span.set(bytes=len(response.content), symbols=len(symbols))
+        return response
+
+    def attempt(timeout):
+        """One request within timeout ms"""
+        response = get(timeout)
+        # * the cookie or crumb expired, a new session once
+        if response.status_code == 401:
+            print("Quote API wants a new crumb....")
+            response = get(timeout, refresh=True)
+        request_policy.check_status(response.status_code, url)
+        response.raise_for_status()
+        return response.text
+
+    print(f"Fetching {len(symbols)} quotes....")
+    with tracing.span("fetch", page="quote", symbols=len(symbols)) as span:
+        result = request_policy.call("quote", url, attempt)
+        request_policy.record(f"{len(symbols)} symbols", "quote", result)
+        if not result.ok:
+            span.set(outcome=result.outcome)
+            return {}
+        try:
+            found = json.loads(result.value)["quoteResponse"]["result"]
+        except (ValueError, KeyError, TypeError) as error:
+            print(f"Quote API failed: {error!r}")
+            return {}
+
+    quotes = {}
+    for quote in found:
+        symbol = quote.get("symbol")
+        if symbol in symbols:
+            text = json.dumps(quote, sort_keys=True)
+            snapshot_archive.save(symbol, "quote", [text])
+            quotes[symbol] = [text]
+    missing = len(symbols) - len(quotes)
+    if missing:
+        print(f"{missing} symbols not in the quote response")
+    return quotes
@@ -0,0 +1,172 @@
+"""Token bucket scheduler for the Google Sheets API. Spends the per-minute
+read and write quota as fast as it refills and backs off with jitter when
+Sheets answers 429 / RESOURCE_EXHAUSTED"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from gspread.exceptions import APIError
+from rich import print
+
+import tracing
+
+# * Sheets API default quota per user
+READS_PER_MINUTE = 60
+WRITES_PER_MINUTE = 60
+# * worksheet updates running at the same time
+IN_FLIGHT = 8
+MAX_RETRIES = 6
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 64.0
+
+
+class TokenBucket:
+    """At most capacity tokens in any period seconds. Sheets counts quota
+    over a sliding minute, so burst plus refill per period is capacity"""
+
+    def __init__(self, capacity, period=60.0, burst=None):
+        self.capacity = burst or max(1, capacity // 10)
+        self.rate = max(capacity - self.capacity, 1) / period
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self):
+        """Add the tokens earned since the last call"""
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    def acquire(self) -> float:
+        """Take a token, waiting for one if needed. Returns seconds waited"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                self.refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def drain(self):
+        """Server said we're over quota, spend what we think is left"""
+        with self.lock:
+            self.refill()
+            self.tokens = 0.0
+
+
+def is_quota_error(error) -> bool:
+    """Check for 429 / RESOURCE_EXHAUSTED from the Sheets API"""
+    response = getattr(error, "response", None)
+    if getattr(response, "status_code", None) == 429:
+        return True
+    return "RESOURCE_EXHAUSTED" in str(error)
+
+
+class QuotaScheduler:
+    """Run Sheets calls inside the read/write budget. The worker pool is
+    opened by start and closed by shutdown, once per run"""
+
+    def __init__(
+        self,
+        reads=READS_PER_MINUTE,
+        writes=WRITES_PER_MINUTE,
+        period=60.0,
+        in_flight=IN_FLIGHT,
+    ):
+        self.buckets = {
+            "read": TokenBucket(reads, period),
+            "write": TokenBucket(writes, period),
+        }
+        self.in_flight = in_flight
+        self.executor = None
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Counters start over"""
+        with self.lock:
+            self.started = time.monotonic()
+            self.stats = {
+                "read": 0,
+                "write": 0,
+                "throttled": 0,
+                "retries": 0,
+                "waited": 0.0,
+                "backoff": 0.0,
+            }
+
+    def start(self):
+        """Open the worker pool for a run, the counters start over"""
+        self.reset()
+        self.executor = ThreadPoolExecutor(max_workers=self.in_flight)
+
+    def add(self, key, amount=1):
+        """Thread safe counter update"""
+        with self.lock:
+            self.stats[key] += amount
+
+    def call(self, kind, func, *args, **kwargs):
+        """Run one API call of kind "read" or "write" within quota"""
+        bucket = self.buckets[kind]
+        for attempt in range(MAX_RETRIES + 1):
+            self.add("waited", bucket.acquire())
+            try:
+                result = func(*args, **kwargs)
+            except APIError as error:
+                if not is_quota_error(error) or attempt == MAX_RETRIES:
+                    raise
+                # * full jitter exponential backoff
+                bucket.drain()
+                delay = random.uniform(
+                    0, min(BACKOFF_CAP, BACKOFF_BASE * 2**attempt)
+                )
+                self.add("throttled")
+                self.add("retries")
+                tracing.count("retries", "sheets")
+                self.add("backoff", delay)
+                time.sleep(delay)
+                continue
+
+            self.add(kind)
+            return result
+
+    def submit(self, func, *args, **kwargs):
+        """Run func on the pool, its API calls share the budget"""
+        if self.executor is None:
+            self.start()
+        return self.executor.submit(func, *args, **kwargs)
+
+    def shutdown(self):
+        """Wait for everything in flight and close the pool"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+    def metrics(self) -> dict:
+        """Counters plus calls per second since start"""
+        elapsed = time.monotonic() - self.started
+        with self.lock:
+            metrics = dict(self.stats)
+        metrics["elapsed"] = elapsed
+        metrics["calls_per_sec"] = (
+            (metrics["read"] + metrics["write"]) / elapsed if elapsed else 0.0
+        )
+        return metrics
+
+    def report(self):
+        """Print throughput and backoff"""
+        metrics = self.metrics()
+        print(
+            f"Sheets API: {metrics['read']} reads, {metrics['write']} writes"
+            f" in {metrics['elapsed']:.1f}s"
+            f" ({metrics['calls_per_sec']:.2f}/s),"
+            f" {metrics['throttled']} throttled,"
+            f" {metrics['backoff']:.1f}s backoff,"
+            f" {metrics['waited']:.1f}s waiting on quota"
+        )
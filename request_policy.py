@@ -0,0 +1,337 @@
+"""Request policy for page fetches. Every page type gets a deadline its
+attempts share, timeouts and errors are retried with jittered backoff
+inside it, and a circuit breaker per host stops every fetch once Yahoo
+starts throttling. Callers get a Result instead of an exception, so one
+bad page is a recorded failure and a bad day still ends on time"""
+import asyncio
+import random
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+import httpx
+from playwright.sync_api import Error as PlaywrightError
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+from rich import print
+
+import tracing
+
+# * seconds all attempts at a page may take, retries and backoff included
+DEADLINES = {
+    "profile": 60,
+    "summary": 60,
+    "stats": 60,
+    "income": 90,
+    "balance": 90,
+    "cash": 90,
+    # * every statement in one response, from the API or the page
+    "timeseries": 60,
+    "embedded": 60,
+    # * one request for a whole batch of symbols
+    "quote": 60,
+}
+DEFAULT_DEADLINE = 60
+MAX_ATTEMPTS = 3
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 16.0
+
+# * responses that mean we are being throttled
+THROTTLE_STATUSES = {429, 503}
+# * throttled responses in a row that open a host's breaker
+BREAKER_THRESHOLD = 3
+# * seconds an open breaker refuses calls, doubled each time a trial fails
+BREAKER_COOLDOWN = 60.0
+BREAKER_COOLDOWN_CAP = 900.0
+
+# * send a duplicate HTTP request when the first is slower than usual
+HEDGE = False
+# * seconds to wait before hedging until there are enough samples for p95
+HEDGE_AFTER = 2.0
+HEDGE_SAMPLES = 20
+
+# * outcomes of a call
+OK = "ok"
+TIMEOUT = "timeout"
+THROTTLED = "throttled"
+FAILED = "failed"
+CIRCUIT_OPEN = "circuit_open"
+
+# * outcome -> tracing event
+EVENTS = {
+    TIMEOUT: "timeouts",
+    THROTTLED: "throttled",
+    FAILED: "failures",
+    CIRCUIT_OPEN: "circuit_open",
+}
+
+OUTCOMES = Counter()
+# * (symbol, page type, outcome, error) of the latest pages that failed
+FAILURES = deque(maxlen=500)
+
+_breakers = {}
+_lock = threading.Lock()
+_hedge_pool = None
+
+
+class Throttled(Exception):
+    """Yahoo answered with a throttling status"""
+
+
+class Result:
+    """Outcome of one page fetch, value is set when it is OK"""
+
+    def __init__(self, outcome, value=None, attempts=0, error=None):
+        self.outcome = outcome
+        self.value = value
+        self.attempts = attempts
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        """Check if the page was fetched"""
+        return self.outcome == OK
+
+    def __repr__(self):
+        return f"Result({self.outcome!r}, attempts={self.attempts})"
+
+
+class CircuitBreaker:
+    """Opens after threshold throttled calls in a row. While open every
+    call is refused, after the cooldown one trial call goes through:
+    success closes it, another throttle opens it for twice as long and any
+    other failure opens it again for the same cooldown"""
+
+    def __init__(self, host, threshold=None, cooldown=None):
+        self.host = host
+        self.threshold = threshold or BREAKER_THRESHOLD
+        self.cooldown = cooldown or BREAKER_COOLDOWN
+        self.throttled = 0
+        self.opened_at = None
+        self.trial = False
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Check if a call may go out now"""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            reopens = self.opened_at + self.cooldown
+            if self.trial or time.monotonic() < reopens:
+                return False
+            # * half open, this call is the trial
+            self.trial = True
+            return True
+
+    def success(self):
+        """A call went through, close the breaker"""
+        with self.lock:
+            if self.opened_at is not None:
+                print(f"Circuit closed for {self.host}")
+                self.cooldown = BREAKER_COOLDOWN
+            self.throttled = 0
+            self.opened_at = None
+            self.trial = False
+
+    def failure(self):
+        """A call was throttled"""
+        with self.lock:
+            self.throttled += 1
+            if self.trial:
+                self.cooldown = min(self.cooldown * 2, BREAKER_COOLDOWN_CAP)
+            elif self.throttled < self.threshold or self.opened_at:
+                return
+            self.opened_at = time.monotonic()
+            self.trial = False
+            print(
+                f"[red]Circuit open for {self.host},"
+                f" refusing fetches for {self.cooldown:.0f}s[/red]"
+            )
+            tracing.count("circuit_opened")
+
+    def inconclusive(self):
+        """A call failed without being throttled. If it was the trial the
+        breaker opens again, so a later call gets the next trial"""
+        with self.lock:
+            if not self.trial:
+                return
+            self.opened_at = time.monotonic()
+            self.trial = False
+
+
+def breaker(url) -> CircuitBreaker:
+    """Shared breaker of a url's host"""
+    host = urlsplit(url).hostname or ""
+    with _lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(host)
+        return _breakers[host]
+
+
+def check_status(status, url):
+    """Raise Throttled for a throttling status code"""
+    if status in THROTTLE_STATUSES:
+        raise Throttled(f"{status} from {url}")
+
+
+def classify(error) -> str:
+    """Outcome of an attempt that raised"""
+    if isinstance(error, Throttled):
+        return THROTTLED
+    if isinstance(error, (PlaywrightTimeoutError, httpx.TimeoutException)):
+        return TIMEOUT
+    return FAILED
+
+
+# * errors worth another attempt, anything else is a bug and is raised
+RETRY_ERRORS = (Throttled, PlaywrightError, httpx.HTTPError)
+
+
+class Attempts:
+    """Deadline, attempt count and backoff of one call"""
+
+    def __init__(self, page_type, url):
+        self.breaker = breaker(url)
+        self.deadline = time.monotonic() + DEADLINES.get(
+            page_type, DEFAULT_DEADLINE
+        )
+        self.page_type = page_type
+        self.count = 0
+        self.outcome = TIMEOUT
+        self.error = None
+
+    def next(self) -> bool:
+        """Check if another attempt may go out"""
+        if self.count >= MAX_ATTEMPTS or self.remaining() <= 0:
+            return False
+        if not self.breaker.allow():
+            self.outcome = CIRCUIT_OPEN
+            return False
+        self.count += 1
+        return True
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline"""
+        return self.deadline - time.monotonic()
+
+    def timeout(self) -> int:
+        """Playwright timeout in ms for the next attempt"""
+        return max(int(self.remaining() * 1000), 1)
+
+    def failed(self, error) -> float:
+        """Note a failed attempt, returns the seconds to back off"""
+        self.outcome = classify(error)
+        self.error = error
+        if self.outcome == THROTTLED:
+            self.breaker.failure()
+        else:
+            self.breaker.inconclusive()
+        if self.count >= MAX_ATTEMPTS:
+            return 0.0
+        tracing.count("retries", self.page_type)
+        # * full jitter exponential backoff, never past the deadline
+        delay = random.uniform(
+            0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (self.count - 1))
+        )
+        return max(min(delay, self.remaining()), 0.0)
+
+    def succeeded(self, value) -> Result:
+        """Result of the attempt that worked"""
+        self.breaker.success()
+        return Result(OK, value, self.count)
+
+    def result(self) -> Result:
+        """Result once the attempts ran out"""
+        return Result(self.outcome, None, self.count, self.error)
+
+
+def call(page_type, url, attempt) -> Result:
+    """Run attempt(timeout_ms) until it returns, inside the page type's
+    deadline"""
+    attempts = Attempts(page_type, url)
+    while attempts.next():
+        try:
+            value = attempt(attempts.timeout())
+        except RETRY_ERRORS as error:
+            time.sleep(attempts.failed(error))
+            continue
+        except BaseException:
+            # * a bug, the trial must not hold the breaker half open
+            attempts.breaker.inconclusive()
+            raise
+        return attempts.succeeded(value)
+    return attempts.result()
+
+
+async def call_async(page_type, url, attempt) -> Result:
+    """call for an async attempt(timeout_ms)"""
+    attempts = Attempts(page_type, url)
+    while attempts.next():
+        try:
+            value = await attempt(attempts.timeout())
+        except RETRY_ERRORS as error:
+            await asyncio.sleep(attempts.failed(error))
+            continue
+        except BaseException:
+            # * a bug, the trial must not hold the breaker half open
+            attempts.breaker.inconclusive()
+            raise
+        return attempts.succeeded(value)
+    return attempts.result()
+
+
+def record(stock, page_type, result):
+    """Count the outcome, keep failures for the report"""
+    OUTCOMES[result.outcome] += 1
+    if result.ok:
+        return
+    print(f"{page_type.title()} {result.outcome.replace('_', ' ')}....")
+    tracing.count(EVENTS[result.outcome], page_type)
+    FAILURES.append((stock, page_type, result.outcome, repr(result.error)))
+
+
+def report():
+    """Print outcomes and the pages that failed"""
+    if not OUTCOMES:
+        return
+    print(f"Request policy: {dict(OUTCOMES)}")
+    for stock, page_type, outcome, error in FAILURES:
+        print(f"  {stock} {page_type}: {outcome} {error}")
+
+
+def hedge_delay(timings) -> float:
+    """p95 of the step's latencies so far, HEDGE_AFTER until enough"""
+    if not timings or len(timings) < HEDGE_SAMPLES:
+        return HEDGE_AFTER
+    ordered = sorted(timings)
+    return ordered[int(len(ordered) * 0.95)]
+
+
+def hedged(func, timings=None):
+    """func(), and with HEDGE a second func() once the first is slower
+    than the p95 of timings. The first to succeed wins"""
+    global _hedge_pool
+
+    if not HEDGE:
+        return func()
+    with _lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(max_workers=8)
+
+    pending = {_hedge_pool.submit(func)}
+    done, pending = wait(pending, timeout=hedge_delay(timings))
+    if not done:
+        tracing.count("hedges")
+        pending.add(_hedge_pool.submit(func))
+    error = None
+    while done or pending:
+        for future in done:
+            if future.exception() is None:
+                # * the loser finishes in the background
+                return future.result()
+            error = future.exception()
+        if not pending:
+            break
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+    raise error
@@ -0,0 +1,132 @@
+"""Run journal. A scrape run (job and day) records each output unit
+(symbol and page) once its file is saved, so a run restarted after a crash
+or a kill skips the units that are already done. The archived fragments a
+run fetched are recorded too, a restart parses those instead of fetching
+again:
+
+    python run_journal.py [JOB]
+"""
+import json
+import sys
+from datetime import date, datetime
+
+from rich import print
+
+import stock_store
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS run_journal (
+    run TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    page TEXT NOT NULL,
+    finished_at TEXT NOT NULL,
+    PRIMARY KEY (run, symbol, page)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS run_fetches (
+    run TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    page TEXT NOT NULL,
+    hashes TEXT NOT NULL,
+    PRIMARY KEY (run, symbol, page)
+) WITHOUT ROWID;
+"""
+stock_store.register(SCHEMA)
+
+
+def connect():
+    """Store connection, the journal tables come with it"""
+    return stock_store.connect()
+
+
+def run_id(job, day=None) -> str:
+    """One run of a job per day, a restart the same day resumes it"""
+    return f"{job}:{day or date.today()}"
+
+
+def start(job, day=None) -> str:
+    """Open today's run of a job, older runs of it are dropped"""
+    run = run_id(job, day)
+    conn = connect()
+    for table in ("run_journal", "run_fetches"):
+        conn.execute(
+            f"DELETE FROM {table} WHERE run LIKE ? AND run != ?",
+            (f"{job}:%", run),
+        )
+    conn.commit()
+    saved = len(finished(run))
+    if saved:
+        print(f"Resuming {run}, {saved} units already saved")
+    return run
+
+
+def is_done(run, symbol, page) -> bool:
+    """Check if a unit was saved by this run"""
+    row = (
+        connect()
+        .execute(
+            "SELECT 1 FROM run_journal"
+            " WHERE run = ? AND symbol = ? AND page = ?",
+            (run, symbol, page),
+        )
+        .fetchone()
+    )
+    return row is not None
+
+
+def done(run, symbol, page):
+    """Record a unit once its output is on disk"""
+    conn = connect()
+    conn.execute(
+        "INSERT OR REPLACE INTO run_journal VALUES (?, ?, ?, ?)",
+        (run, symbol, page, datetime.now().isoformat()),
+    )
+    conn.commit()
+
+
+def fetched(run, symbol, page, hashes):
+    """Record the archive hashes of a page this run fetched"""
+    conn = connect()
+    conn.execute(
+        "INSERT OR REPLACE INTO run_fetches VALUES (?, ?, ?, ?)",
+        (run, symbol, page, json.dumps(hashes)),
+    )
+    conn.commit()
+
+
+def fetches(run, symbol, page):
+    """Archive hashes of the page this run fetched, None if it didn't"""
+    row = (
+        connect()
+        .execute(
+            "SELECT hashes FROM run_fetches"
+            " WHERE run = ? AND symbol = ? AND page = ?",
+            (run, symbol, page),
+        )
+        .fetchone()
+    )
+    return None if row is None else json.loads(row[0])
+
+
+def finished(run) -> list:
+    """(symbol, page) of every unit saved by a run"""
+    return (
+        connect()
+        .execute(
+            "SELECT symbol, page FROM run_journal WHERE run = ?"
+            " ORDER BY finished_at",
+            (run,),
+        )
+        .fetchall()
+    )
+
+
+def main():
+    """main starting point of program"""
+    jobs = sys.argv[1:] or ["summary", "quarterly"]
+    for job in jobs:
+        run = run_id(job)
+        print(f"{run}: {len(finished(run))} units saved")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,26 @@
 """Playwright scrape Yahoo Finance. Selectorlax to parse HTML.
 Create JSON files"""
+import itertools
 import json
 from datetime import date
-from pathlib import Path
 
-from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
 from playwright.sync_api import sync_playwright
 from rich import print
-from selectolax.parser import HTMLParser
+
+import atomic_file
+import extract
+import fetch_cache
+import http_fetch
+import manifest
+import market_calendar
+import navigation
+import parse_stage
+import quote_api
+import request_policy
+import run_journal
+import snapshot_archive
+import stock_store
+import tracing
 
 # //TODO:
 
@@ -16,70 +29,311 @@ from selectolax.parser import HTMLParser
 # * make list of stocks
 STOCKS = ["AAPL", "AMC", "AMZN", "F", "GOOGL", "MSFT"]
 
+# * point at a local fixture server for benchmarks
+BASE_URL = "https://finance.yahoo.com"
+# * "json" writes stock_data/<SYM>/<SYM>.json (google_sheets_stock reads it)
+# * "sqlite" appends to the store in stock_data/stocks.db
+STORAGE = "json"
+# * "batch" reads summaries from the multi-symbol quote API, "page" scrapes
+# * every quote page
+SUMMARY_SOURCE = "batch"
+
+# * page type -> (url, fragments kept from the page)
+PAGES = {
+    "profile": ("/quote/{}/profile?p={}", ["div[data-test='qsp-profile']"]),
+    "summary": (
+        "/quote/{}?p={}",
+        ["div#quote-header-info", "div#quote-summary"],
+    ),
+}
+
 
 def main():
     """main starting point of program"""
+    if not market_calendar.is_trading_day():
+        print("Market closed today, nothing to scrape")
+        return
+    scrape(plan(STOCKS), run_journal.start("summary"))
 
-    with sync_playwright() as play_wright:
+
+def plan(stocks) -> list:
+    """Stocks without today's summary, from the manifest in one query"""
+    if STORAGE == "sqlite":
+        return list(stocks)
+    today = str(date.today())
+    entries = manifest.rows(stocks)
+    due = [
+        stock
+        for stock in stocks
+        if stock not in entries or entries[stock]["summary_date"] != today
+    ]
+    print(f"{len(due)} of {len(stocks)} stocks due a summary")
+    return due
+
+
+def scrape(stocks, run=None, done=None):
+    """Scrape stocks as they come off the iterable, work_queue feeds it
+    leased symbols. done(stock, error) once a stock's JSON is saved"""
+    with sync_playwright() as play_wright, parse_stage.pool() as pool:
         browser = play_wright.chromium.launch()
-        context = browser.new_context(
-            user_agent=(
-                "Mozilla/5.0 (Macintosh; Intel Mac OS X 13_5)"
-                " AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0"
-                " Safari/537.36"
-            )
-        )
-        page = context.new_page()
-        page.set_default_timeout(120000)
+        page, nav_stats = navigation.new_page(browser)
 
-        for stock in STOCKS:
+        futures = {}
+        totals = parse_stage.new_totals()
+        for stock, quotes in with_quotes(stocks):
             print(stock)
-            process_stocks(page, stock)
+            with tracing.span("stock", symbol=stock):
+                futures[stock] = process_stocks(
+                    page, stock, pool, run, quotes
+                )
+            navigation.report(stock, nav_stats)
+            parse_stage.settle(futures, totals, done)
 
         # * close browswer
         page.close()
+        http_fetch.close_client()
+        parse_stage.collect(futures, totals=totals, done=done)
+        fetch_cache.report()
+        request_policy.report()
+
+
+def batched() -> bool:
+    """Check if summaries come from the batch quote API"""
+    return SUMMARY_SOURCE == "batch" and STORAGE == "json"
+
+
+def with_quotes(stocks):
+    """(stock, quotes) as stocks come off the iterable. In batch mode the
+    quotes of the next BATCH_SIZE stocks come in one request, otherwise
+    quotes is None"""
+    if not batched():
+        # * one at a time, work_queue leases them as they are taken
+        for stock in stocks:
+            yield stock, None
+        return
+
+    stocks = iter(stocks)
+    while True:
+        chunk = list(itertools.islice(stocks, quote_api.BATCH_SIZE))
+        if not chunk:
+            return
+        quotes = quote_api.fetch(chunk)
+        for stock in chunk:
+            yield stock, quotes
+
+
+def process_stocks(page, stock, pool=None, run=None, quotes=None):
+    """Get all of the stock data from Yahoo Finance. With a parse pool the
+    fragments are parsed and saved there, returns its future. With a run id
+    the stock is skipped once the run journal has it, and pages fetched
+    before a crash come from the snapshot archive instead of the network.
+    With batch quotes the summary comes from them instead of the page"""
+    if STORAGE == "sqlite":
+        store_stocks(page, stock)
+        return None
+
+    if run and run_journal.is_done(run, stock, "summary"):
+        print("Summary data already saved this run....")
+        return None
+
+    # * the batch quote stands in for the summary page
+    page_types = [
+        page_type
+        for page_type in PAGES
+        if quotes is None or page_type != "summary"
+    ]
+    pages, due = due_pages(stock, page_types, run)
+    for page_type, cache in due.items():
+        pages[page_type] = fetch_page(
+            page, stock, page_type, cache=cache, run=run
+        )
+    if quotes is not None:
+        pages |= quote_pages(page, stock, quotes, run)
+    return save_pages(stock, pages, pool, run)
+
+
+def due_pages(stock, page_types=PAGES, run=None) -> tuple:
+    """(pages, due) of a stock. pages are the fragments this run fetched
+    before it died, due is page type -> cache flag of the pages to fetch.
+    A saved page inside its TTL is in neither"""
+    # * if no .json file run profile and summary, otherwise only the pages
+    # * past their TTL (summary is good for the trading day). The manifest
+    # * knows if there is a file without touching it, and if the file was
+    # * saved while the profile timed out
+    entry = manifest.get(stock)
+    saved = {
+        "profile": entry["profile_hash"] is not None,
+        "summary": entry["summary_date"] is not None,
+    }
+    pages = {}
+    due = {}
+    for page_type in page_types:
+        fresh = fetch_cache.is_fresh(stock, page_type)
+        # * fetched by this run before it died, not yet saved
+        resumed = resume(stock, page_type, run) if run and not fresh else None
+        if resumed is not None:
+            pages[page_type] = resumed
+        elif saved[page_type] and fresh:
+            print(f"{page_type.title()} data is fresh....")
+        else:
+            due[page_type] = saved[page_type]
+    return pages, due
+
+
+def save_pages(stock, pages, pool=None, run=None):
+    """Parse and save the fetched pages to the json file, on the pool while
+    the next stock is fetched. The cache rows are saved with it. Returns
+    the pool's future"""
+    pages = {key: value for key, value in pages.items() if value is not None}
+    task = (stock, pages, run, fetch_cache.take(stock))
+    if pool is None:
+        parse_stage.write_summary(*task)
+        return None
+    return pool.submit(parse_stage.write_summary, *task)
+
+
+def quote_pages(page, stock, quotes, run=None) -> dict:
+    """The stock's batch quote, with the quote page when it is due for the
+    fields the API lacks. The page alone when the batch has no quote"""
+    if stock not in quotes:
+        print("No batch quote, scraping the page....")
+        return {"summary": fetch_page(page, stock, "summary", run=run)}
+
+    pages = {"quote": quotes[stock]}
+    if quote_api.page_due(stock):
+        pages["summary"] = fetch_page(page, stock, "summary", run=run)
+    return pages
+
+
+def resume(stock, page_type, run):
+    """Fragments this run fetched and archived before it died without
+    saving them, the cache saves them with the output. None if there are
+    none. Pages archived by other runs or ad-hoc lookups aren't used"""
+    hashes = run_journal.fetches(run, stock, page_type)
+    if hashes is None:
+        return None
+    fragments = snapshot_archive.load(hashes)
+    print(f"{page_type.title()} data from the archive....")
+    fetch_cache.update(stock, page_type, fragments, defer=True)
+    return fragments
+
+
+def store_stocks(page, stock):
+    """Get the stock data and append it to the sqlite store"""
+    conn = stock_store.connect()
+    today = str(date.today())
 
+    # * new stock, or a changed profile past its TTL
+    has_profile = stock_store.has_page(conn, stock, "profile")
+    if not has_profile or not fetch_cache.is_fresh(stock, "profile"):
+        company = profile(page, stock, cache=has_profile)
+        if company is not None:
+            stock_store.add_record(
+                conn, stock, today, "profile", company["company"]
+            )
+            fetch_cache.save(fetch_cache.take(stock))
+
+    # * already scraped today, skip the summary page
+    if stock_store.has_date(conn, stock, "summary", today):
+        print("No New Data....")
+        return
+
+    summary_data = summary(page, stock)
+    if summary_data is None:
+        return
+    stock_store.add_record(
+        conn, stock, today, "summary", summary_data["summary"]
+    )
+    fetch_cache.save(fetch_cache.take(stock))
+
+
+def profile(page, stock, cache=False):
+    """Get stock profile data on yahoo finance. None on a timeout or, with
+    cache, when the profile hasn't changed since the last fetch"""
+    fragments = fetch_page(page, stock, "profile", cache)
+    if fragments is None:
+        return None
+    return {"company": parse_profile(fragments[0])}
+
+
+def fetch_page(page, stock, page_type, cache=False, run=None, archive=True):
+    """Fetch and archive the fragments of a page, journaled against a run
+    id so a restart of the run can parse them. None when the request
+    policy gave up on it or, with cache, when nothing changed since the
+    last fetch. Without archive nothing is kept"""
+    print(f"Scraping {page_type.title()} Data....")
+    url_path, selectors = PAGES[page_type]
+    url = (BASE_URL + url_path).format(stock, stock)
+    with tracing.span("fetch", symbol=stock, page=page_type) as span:
+        result = request_policy.call(
+            page_type,
+            url,
+            lambda timeout: fetch_html(
+                page, url, selectors, (stock, page_type), cache, timeout
+            ),
+        )
+        request_policy.record(stock, page_type, result)
+        if not result.ok:
+            manifest.failed(stock, page_type, result.outcome)
+            span.set(outcome=result.outcome)
+            return None
+
+        fragments = result.value
+        if fragments == fetch_cache.UNCHANGED:
+            print(f"{page_type.title()} unchanged....")
+            span.set(outcome="unchanged")
+            return None
+
+        span.set(bytes=sum(len(fragment) for fragment in fragments))
+        if archive:
+            hashes = snapshot_archive.save(stock, page_type, fragments)
+            if run:
+                run_journal.fetched(run, stock, page_type, hashes)
+        return fragments
+
+
+def fetch_html(
+    page, url, selectors, cache_key, cache, timeout=navigation.PAGE_TIMEOUT
+):
+    """Get the html of each selector over HTTP, or the browser when the page
+    needs it, within timeout ms. With cache, fetch_cache.UNCHANGED when
+    nothing changed. A changed hash is held until the output is saved"""
+    fragments = None
+    if http_fetch.use_http(cache_key[1]):
+        fragments = http_fetch.fetch_fragments(
+            url,
+            selectors,
+            cache_key if cache else None,
+            timeout / 1000,
+            defer=True,
+        )
+        # * nothing to compare against, still record the hash
+        if fragments is not None and not cache:
+            fetch_cache.update(*cache_key, fragments, defer=True)
 
-def process_stocks(page, stock):
-    """Get all of the stock data from Yahoo Finance"""
-    # * if "stock.json" exsists skip profile function but run others
-    # * change path to new stock_data and stock folder
-    path = Path(f"stock_data/{stock}", f"{stock}.json")
-    stock_results = []
-
-    # * if no .json file run profile & quarterly_info
-    if not path.is_file():
-        path.parent.mkdir(exist_ok=True, parents=True)
-        stock_results.append(profile(page, stock))  # data from profile tab
-
-    summary_data = summary(page, stock)  # data from summary tab
-
-    # *  save data to json file
-    json_data(path, stock_results, summary_data)
-
+    # * fall back to the browser
+    if fragments is None:
+        navigation.goto(page, url, selectors[-1], timeout)
+        with navigation.timed("inner_html") as span:
+            fragments = [page.inner_html(selector) for selector in selectors]
+            span.set(bytes=sum(len(fragment) for fragment in fragments))
+        changed = fetch_cache.update(*cache_key, fragments, defer=True)
+        if not changed and cache:
+            return fetch_cache.UNCHANGED
 
-def profile(page, stock):
-    """Get stock profile data on yahoo finance"""
-    print("Scraping Profile Data....")
-    try:
-        url_profile = "https://finance.yahoo.com/quote/{}/profile?p={}"
-        page.goto(url_profile.format(stock, stock), timeout=0)
-        html = page.inner_html("div[data-test='qsp-profile']")
-        data = HTMLParser(html)
-        info = company_details(data)
-        sector = company_sector_data(data)
-        company = info | sector
+    return fragments
 
-    except PlaywrightTimeoutError:
-        print("Timeout")
 
-    return {"company": company}
+def parse_profile(html) -> dict:
+    """Parse the profile tab html into company info and sector data"""
+    record = extract.extract("profile", html)
+    company = company_details(record.pop("name"), record.pop("address"))
+    # * what is left is the sector, industry and employees pairs
+    return company | record
 
 
-def company_details(data) -> dict:
-    """Parse html to gather company info"""
-    company_name = data.css_first("h3").text()
-    company_info = data.css_first("p").text(separator="*")
+def company_details(company_name, company_info) -> dict:
+    """Split the "*" joined address lines into company info"""
     company_list = company_info.split("*")
     if len(company_list) > 5:
         company_list.pop(0)
@@ -102,72 +356,43 @@ def company_details(data) -> dict:
     return company
 
 
-def company_sector_data(data) -> dict:
-    """Parse html to gather company sector data"""
-    company_profile_data = data.css("p:nth-child(2)")
-    for item in company_profile_data:
-        sector_key = item.css("span")[0].text()
-        sector_value = item.css("span")[1].text()
-        industry_key = item.css("span")[2].text()
-        industry_value = item.css("span")[3].text()
-        employees_key = item.css("span")[4].text()
-        employees_value = item.css("span")[5].text()
-
-        sector = {
-            sector_key: sector_value,
-            industry_key: industry_value,
-            employees_key: employees_value,
-        }
-
-        return sector
-
-
-def summary(page, stock):
-    """Get stock summary data on yahoo finance"""
-    print("Scraping Summary Data....")
-    try:
-        stock_dict = {}
-
-        url_summary = "https://finance.yahoo.com/quote/{}?p={}"
-        page.goto(url_summary.format(stock, stock), timeout=0)
-        html = page.inner_html("div#quote-header-info")
-        data = HTMLParser(html)
-        # stock_name = data.css_first("h1").text()
-        # stock_symbol = re.search(r"\(([^)]+)", stock_name).group(1)
-        market_price = data.css_first(
-            "fin-streamer[data-test='qsp-price']"
-        ).text()
-        market_price_change = data.css_first(
-            "fin-streamer[data-test='qsp-price-change']"
-        ).text()
-        market_price_regchange = data.css_first(
-            "fin-streamer[data-field='regularMarketChangePercent']"
-        ).attrs["value"]
-        stock_dict.update({"stock_symbol": stock})
-        stock_dict.update({"market_price": market_price})
-        stock_dict.update({"market_change": market_price_change})
-        stock_dict.update({"market_percent": market_price_regchange})
-
-        html = page.inner_html("div#quote-summary")
-        data = HTMLParser(html)
-        table = data.css("table tr")
-        for row in table:
-            key = row.css("td")[0].text()
-            value = row.css("td")[1].text()
-            stock_dict.update({key: value})
-
-    except PlaywrightTimeoutError:
-        print("Timeout")
-
-    return {"summary": stock_dict}
+def summary(page, stock, cache=False):
+    """Get stock summary data on yahoo finance. None on a timeout or, with
+    cache, when the quote hasn't changed since the last fetch"""
+    fragments = fetch_page(page, stock, "summary", cache)
+    if fragments is None:
+        return None
+    header_html, summary_html = fragments
+    return {"summary": parse_summary(stock, header_html, summary_html)}
+
+
+def parse_summary(stock, header_html, summary_html) -> dict:
+    """Parse the quote header and summary table html"""
+    stock_dict = {"stock_symbol": stock}
+    stock_dict.update(extract.extract("header", header_html))
+    stock_dict.update(extract.extract("summary", summary_html))
+    return stock_dict
 
 
 def json_data(path, stock_results, summary_data):
-    """Parse the stock data, save to json file"""
+    """Parse the stock data, save to json file. The manifest is updated
+    once the file is written"""
     print("Creating JSON data files....")
 
     results = []
     today = str(date.today())
+    stock = path.stem
+
+    # * today's summary is saved and the profile is the one on file, no
+    # * need to open it
+    entry = manifest.get(stock)
+    profile_hash = manifest.digest(stock_results[0]) if stock_results else None
+    if entry["summary_date"] == today and profile_hash in (
+        None,
+        entry["profile_hash"],
+    ):
+        print("No New Data....")
+        return
     # * insert new quarterly data
     # * results[1]["quarterly"][0]
     # * insert {date & data} to quarterly list
@@ -188,23 +413,36 @@ def json_data(path, stock_results, summary_data):
             for key in item:
                 date_list.append(key)
 
-        # * check if todays date in saved data. true skip false add new data
-        if today not in date_list:
-            # * insert data into list at index#
-            results.insert(2, {today: summary_data})
-            # * write data to json file
-            with path.open(mode="w", encoding="utf-8") as file:
-                file.write(json.dumps(results))
+        # * refreshed profile replaces the saved one, a file saved while
+        # * the profile timed out gets it in front of its first day
+        if stock_results and "company" in results[0]:
+            results[0] = stock_results[0]
+        elif stock_results:
+            results.insert(0, stock_results[0])
 
-        else:
+        # * check if todays date in saved data. true skip false add new data
+        if summary_data is not None and today not in date_list:
+            # * insert data into list after the first day
+            newest = 2 if "company" in results[0] else 1
+            results.insert(newest, {today: summary_data})
+        elif not stock_results:
             print("No New Data....")
+            # * the file was ahead of the manifest
+            manifest.update(stock, **manifest.summary_fields(results))
+            return
+
+        # * write data to json file
+        atomic_file.write_text(path, json.dumps(results))
 
     else:
         # * append new stock data to list
         stock_results.append({today: summary_data})
+        results = stock_results
         # * write data to json file
-        with path.open(mode="w", encoding="utf-8") as file:
-            file.write(json.dumps(stock_results))
+        path.parent.mkdir(exist_ok=True, parents=True)
+        atomic_file.write_text(path, json.dumps(results))
+
+    manifest.update(stock, **manifest.summary_fields(results))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,228 @@
+"""Async Playwright engine. Scrape many stocks at once with a pool of
+browser contexts and pages. Same JSON files, run journal, fetch cache and
+parse pool as scrap_yahoo_finance"""
+import argparse
+import asyncio
+from datetime import date
+
+from playwright.async_api import async_playwright
+from rich import print
+
+import fetch_cache
+import manifest
+import market_calendar
+import navigation
+import parse_stage
+import request_policy
+import run_journal
+import scrap_yahoo_finance as yahoo
+import snapshot_archive
+import stock_store
+import tracing
+
+# * number of pages scraping at the same time
+WORKERS = 4
+# * pages are spread across this many browser contexts
+CONTEXTS = 2
+# * max symbols waiting in the queue
+QUEUE_SIZE = 100
+
+
+def main():
+    """main starting point of program"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--contexts", type=int, default=CONTEXTS)
+    parser.add_argument("stocks", nargs="*", default=yahoo.STOCKS)
+    args = parser.parse_args()
+    if not market_calendar.is_trading_day():
+        print("Market closed today, nothing to scrape")
+        return
+
+    stocks = yahoo.plan(args.stocks)
+    asyncio.run(
+        run(
+            stocks,
+            args.workers,
+            args.contexts,
+            run_journal.start("summary"),
+        )
+    )
+
+
+async def run(stocks, workers=WORKERS, contexts=CONTEXTS, run=None):
+    """Scrape every stock with a bounded queue feeding a pool of pages.
+    Fragments are parsed and saved on the parse pool, journaled against
+    the run id like scrap_yahoo_finance"""
+    contexts = max(1, min(contexts, workers))
+
+    with parse_stage.pool() as pool:
+        futures = {}
+        totals = parse_stage.new_totals()
+        async with async_playwright() as play_wright:
+            browser = await play_wright.chromium.launch()
+            context_list = [
+                await browser.new_context(user_agent=navigation.USER_AGENT)
+                for _ in range(contexts)
+            ]
+
+            queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+            tasks = []
+            for number in range(workers):
+                page = await context_list[number % contexts].new_page()
+                page.set_default_timeout(navigation.PAGE_TIMEOUT)
+                tasks.append(
+                    asyncio.create_task(
+                        worker(page, queue, pool, run, futures, totals)
+                    )
+                )
+
+            # * put blocks when the queue is full so the symbol list is fed
+            # * lazily
+            for stock in stocks:
+                await queue.put(stock)
+            # * one stop marker per worker
+            for _ in tasks:
+                await queue.put(None)
+
+            await asyncio.gather(*tasks)
+
+            # * close browswer
+            await browser.close()
+        parse_stage.collect(futures, totals=totals)
+    fetch_cache.report()
+    request_policy.report()
+
+
+async def worker(page, queue, pool=None, run=None, futures=None, totals=None):
+    """Take stocks off the queue until the stop marker. Parse tasks go in
+    futures, the finished ones are folded into totals"""
+    futures = {} if futures is None else futures
+    totals = parse_stage.new_totals() if totals is None else totals
+    nav_stats = await navigation.install_async(page)
+    while True:
+        stock = await queue.get()
+        if stock is None:
+            queue.task_done()
+            break
+
+        print(stock)
+        try:
+            with tracing.span("stock", symbol=stock):
+                futures[stock] = await process_stocks(page, stock, pool, run)
+        except Exception as error:
+            # * one bad stock shouldn't stop the worker
+            print(f"{stock} failed: {error!r}")
+        navigation.report(stock, nav_stats)
+        parse_stage.settle(futures, totals)
+        queue.task_done()
+
+    await page.close()
+
+
+async def process_stocks(page, stock, pool=None, run=None):
+    """Get all of the stock data from Yahoo Finance, the same pages and
+    files as scrap_yahoo_finance.process_stocks. Returns the parse pool's
+    future"""
+    if yahoo.STORAGE == "sqlite":
+        await store_stocks(page, stock)
+        return None
+
+    if run and run_journal.is_done(run, stock, "summary"):
+        print("Summary data already saved this run....")
+        return None
+
+    pages, due = yahoo.due_pages(stock, run=run)
+    for page_type, cache in due.items():
+        pages[page_type] = await fetch_page(page, stock, page_type, cache, run)
+    return yahoo.save_pages(stock, pages, pool, run)
+
+
+async def store_stocks(page, stock):
+    """Get the stock data and append it to the sqlite store"""
+    conn = stock_store.connect()
+    today = str(date.today())
+
+    # * new stock, or a changed profile past its TTL
+    has_profile = stock_store.has_page(conn, stock, "profile")
+    if not has_profile or not fetch_cache.is_fresh(stock, "profile"):
+        company = await profile(page, stock, cache=has_profile)
+        if company is not None:
+            stock_store.add_record(
+                conn, stock, today, "profile", company["company"]
+            )
+            fetch_cache.save(fetch_cache.take(stock))
+
+    # * already scraped today, skip the summary page
+    if stock_store.has_date(conn, stock, "summary", today):
+        print("No New Data....")
+        return
+
+    summary_data = await summary(page, stock)
+    if summary_data is None:
+        return
+    stock_store.add_record(
+        conn, stock, today, "summary", summary_data["summary"]
+    )
+    fetch_cache.save(fetch_cache.take(stock))
+
+
+async def profile(page, stock, cache=False):
+    """Get stock profile data on yahoo finance. None on a timeout or, with
+    cache, when the profile hasn't changed since the last fetch"""
+    fragments = await fetch_page(page, stock, "profile", cache)
+    if fragments is None:
+        return None
+    return {"company": yahoo.parse_profile(fragments[0])}
+
+
+async def summary(page, stock, cache=False):
+    """Get stock summary data on yahoo finance. None on a timeout or, with
+    cache, when the quote hasn't changed since the last fetch"""
+    fragments = await fetch_page(page, stock, "summary", cache)
+    if fragments is None:
+        return None
+    return {"summary": yahoo.parse_summary(stock, *fragments)}
+
+
+async def fetch_page(page, stock, page_type, cache=False, run=None):
+    """Fetch and archive the fragments of a page through the request
+    policy, journaled against a run id. None when it gave up or, with
+    cache, when nothing changed since the last fetch. A changed hash is
+    held until the output is saved"""
+    url_path, selectors = yahoo.PAGES[page_type]
+    url = (yahoo.BASE_URL + url_path).format(stock, stock)
+
+    async def attempt(timeout):
+        """One navigation within timeout ms"""
+        await navigation.goto_async(page, url, selectors[-1], timeout)
+        with tracing.span("inner_html"):
+            fragments = [
+                await page.inner_html(selector) for selector in selectors
+            ]
+        changed = fetch_cache.update(stock, page_type, fragments, defer=True)
+        if not changed and cache:
+            return fetch_cache.UNCHANGED
+        return fragments
+
+    with tracing.span("fetch", symbol=stock, page=page_type) as span:
+        result = await request_policy.call_async(page_type, url, attempt)
+        request_policy.record(stock, page_type, result)
+        if not result.ok:
+            manifest.failed(stock, page_type, result.outcome)
+            span.set(outcome=result.outcome)
+            return None
+        fragments = result.value
+        if fragments == fetch_cache.UNCHANGED:
+            print(f"{page_type.title()} unchanged....")
+            span.set(outcome="unchanged")
+            return None
+        span.set(bytes=sum(len(fragment) for fragment in fragments))
+        hashes = snapshot_archive.save(stock, page_type, fragments)
+        if run:
+            run_journal.fetched(run, stock, page_type, hashes)
+        return fragments
+
+
+if __name__ == "__main__":
+    main()
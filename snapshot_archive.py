@@ -0,0 +1,323 @@
+"""Raw page fragments as they came off the network. Each fragment is stored
+once under its sha256, zstd compressed with a dictionary trained per page
+type (the pages are mostly shared boilerplate) and appended to a monthly
+pack file. An index in the store maps (symbol, page type, date) to the
+fragments of that fetch, so records can be parsed again without scraping:
+
+    python snapshot_archive.py train [PAGE ...]
+    python snapshot_archive.py migrate
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+from datetime import date
+from pathlib import Path
+
+import zstandard
+from rich import print
+
+import stock_store
+
+ARCHIVE_DIR = Path("stock_data", "snapshots")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    symbol TEXT NOT NULL,
+    page TEXT NOT NULL,
+    date TEXT NOT NULL,
+    hashes TEXT NOT NULL,
+    PRIMARY KEY (symbol, page, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS snapshot_objects (
+    hash TEXT PRIMARY KEY,
+    page TEXT NOT NULL,
+    pack TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    dictionary INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS snapshot_dictionaries (
+    id INTEGER PRIMARY KEY,
+    page TEXT NOT NULL,
+    data BLOB NOT NULL
+);
+"""
+stock_store.register(SCHEMA)
+
+LEVEL = 9
+DICT_SIZE = 112 * 1024
+# * fragments of a page type archived before its dictionary is trained
+TRAIN_AFTER = 200
+TRAIN_SAMPLES = 1000
+
+# * dictionary id -> (compressor, decompressor), 0 is no dictionary
+_codecs = {}
+
+
+def main():
+    """main starting point of program"""
+    if sys.argv[1:2] == ["migrate"]:
+        migrate()
+        return
+    if sys.argv[1:2] != ["train"]:
+        print("usage: python snapshot_archive.py train [PAGE ...] | migrate")
+        return
+
+    pages = sys.argv[2:] or [
+        page
+        for (page,) in connect().execute(
+            "SELECT DISTINCT page FROM snapshot_objects"
+        )
+    ]
+    for page in pages:
+        train(page)
+    report()
+
+
+def connect():
+    """Store connection, the snapshot tables come with it"""
+    return stock_store.connect()
+
+
+def codec(dictionary) -> tuple:
+    """Compressor and decompressor for a dictionary id"""
+    if dictionary not in _codecs:
+        if dictionary == 0:
+            data = None
+        else:
+            (blob,) = (
+                connect()
+                .execute(
+                    "SELECT data FROM snapshot_dictionaries WHERE id = ?",
+                    (dictionary,),
+                )
+                .fetchone()
+            )
+            data = zstandard.ZstdCompressionDict(blob)
+        _codecs[dictionary] = (
+            zstandard.ZstdCompressor(level=LEVEL, dict_data=data),
+            zstandard.ZstdDecompressor(dict_data=data),
+        )
+    return _codecs[dictionary]
+
+
+def current_dictionary(page) -> int:
+    """Newest dictionary of a page type, trains one once enough fragments
+    are archived. 0 when there isn't one yet"""
+    conn = connect()
+    row = conn.execute(
+        "SELECT MAX(id) FROM snapshot_dictionaries WHERE page = ?", (page,)
+    ).fetchone()
+    if row[0] is not None:
+        return row[0]
+
+    (count,) = conn.execute(
+        "SELECT COUNT(*) FROM snapshot_objects WHERE page = ?", (page,)
+    ).fetchone()
+    if count >= TRAIN_AFTER:
+        return train(page)
+    return 0
+
+
+def train(page, samples=TRAIN_SAMPLES) -> int:
+    """Train a dictionary on the newest fragments of a page type. Older
+    objects keep the dictionary they were written with"""
+    conn = connect()
+    hashes = [
+        digest
+        for (digest,) in conn.execute(
+            "SELECT hash FROM snapshot_objects WHERE page = ?"
+            " ORDER BY pack DESC, position DESC LIMIT ?",
+            (page, samples),
+        )
+    ]
+    if len(hashes) < 10:
+        print(f"Not enough {page} snapshots to train a dictionary")
+        return 0
+
+    trained = zstandard.train_dictionary(
+        DICT_SIZE, [get(digest).encode() for digest in hashes]
+    )
+    cursor = conn.execute(
+        "INSERT INTO snapshot_dictionaries (page, data) VALUES (?, ?)",
+        (page, trained.as_bytes()),
+    )
+    conn.commit()
+    print(f"Trained {page} dictionary on {len(hashes)} snapshots")
+    return cursor.lastrowid
+
+
+def pack_path(pack) -> Path:
+    """Append only file holding a month of objects"""
+    return ARCHIVE_DIR / "packs" / f"{pack}.pack"
+
+
+def put(fragment, page) -> str:
+    """Save one fragment if it isn't archived yet, returns its hash"""
+    data = fragment.encode()
+    digest = hashlib.sha256(data).hexdigest()
+    conn = connect()
+    found = conn.execute(
+        "SELECT 1 FROM snapshot_objects WHERE hash = ?", (digest,)
+    ).fetchone()
+    if found:
+        return digest
+
+    dictionary = current_dictionary(page)
+    compressed = codec(dictionary)[0].compress(data)
+    pack = date.today().strftime("%Y-%m")
+    path = pack_path(pack)
+    path.parent.mkdir(exist_ok=True, parents=True)
+    # * O_APPEND keeps writers from different processes apart
+    handle = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(handle, compressed)
+        offset = os.lseek(handle, 0, os.SEEK_CUR) - len(compressed)
+    finally:
+        os.close(handle)
+
+    conn.execute(
+        "INSERT OR IGNORE INTO snapshot_objects VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (digest, page, pack, offset, len(compressed), len(data), dictionary),
+    )
+    return digest
+
+
+def get(digest) -> str:
+    """One archived fragment"""
+    row = (
+        connect()
+        .execute(
+            "SELECT pack, position, length, dictionary FROM snapshot_objects"
+            " WHERE hash = ?",
+            (digest,),
+        )
+        .fetchone()
+    )
+    pack, offset, length, dictionary = row
+    with pack_path(pack).open(mode="rb") as file:
+        file.seek(offset)
+        compressed = file.read(length)
+    return codec(dictionary)[1].decompress(compressed).decode()
+
+
+def migrate(root=None) -> int:
+    """Move the single gzip files objects were saved as before the pack
+    files into the packs, once. Returns how many were moved"""
+    # * only this one-off step reads the old format
+    import gzip
+
+    root = root or ARCHIVE_DIR / "objects"
+    if not root.is_dir():
+        return 0
+
+    # * the old files don't say their page type, the index does
+    pages = {
+        digest: page
+        for _, page, _, hashes in entries()
+        for digest in hashes
+    }
+    moved = 0
+    for path in sorted(root.glob("*/*.gz")):
+        fragment = gzip.decompress(path.read_bytes()).decode()
+        put(fragment, pages.get(path.name.removesuffix(".gz"), "unknown"))
+        moved += 1
+    connect().commit()
+    shutil.rmtree(root)
+    print(f"Moved {moved} snapshots into the pack files")
+    return moved
+
+
+def save(symbol, page, fragments, day=None) -> list:
+    """Archive the fragments of one fetch, returns their hashes"""
+    day = str(day or date.today())
+    hashes = [put(fragment, page) for fragment in fragments]
+    conn = connect()
+    conn.execute(
+        "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?)",
+        (symbol, page, day, json.dumps(hashes)),
+    )
+    conn.commit()
+    return hashes
+
+
+def load(hashes) -> list:
+    """Fragments of one fetch, in the order they were saved"""
+    return [get(digest) for digest in hashes]
+
+
+def fetch(symbol, page, day):
+    """Fragments saved for a symbol, page type and date, None if none"""
+    row = (
+        connect()
+        .execute(
+            "SELECT hashes FROM snapshots"
+            " WHERE symbol = ? AND page = ? AND date = ?",
+            (symbol, page, str(day)),
+        )
+        .fetchone()
+    )
+    return None if row is None else load(json.loads(row[0]))
+
+
+def latest(symbol, page):
+    """Fragments of a symbol's newest fetch of a page type, None if none"""
+    row = (
+        connect()
+        .execute(
+            "SELECT hashes FROM snapshots WHERE symbol = ? AND page = ?"
+            " ORDER BY date DESC LIMIT 1",
+            (symbol, page),
+        )
+        .fetchone()
+    )
+    return None if row is None else load(json.loads(row[0]))
+
+
+def entries(pages=None, symbols=None) -> list:
+    """Every (symbol, page, date, hashes) in the index, oldest first"""
+    rows = connect().execute(
+        "SELECT symbol, page, date, hashes FROM snapshots"
+        " ORDER BY symbol, date, page"
+    )
+    return [
+        (symbol, page, day, json.loads(hashes))
+        for symbol, page, day, hashes in rows
+        if (pages is None or page in pages)
+        and (symbols is None or symbol in symbols)
+    ]
+
+
+def stats() -> dict:
+    """Raw and stored bytes of the unique objects, fetches indexed"""
+    conn = connect()
+    objects, raw, stored = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(length), 0)"
+        " FROM snapshot_objects"
+    ).fetchone()
+    (fetches,) = conn.execute("SELECT COUNT(*) FROM snapshots").fetchone()
+    return {
+        "fetches": fetches,
+        "objects": objects,
+        "raw": raw,
+        "stored": stored,
+        "ratio": raw / stored if stored else 0.0,
+    }
+
+
+def report():
+    """Print the archive size"""
+    archive = stats()
+    print(
+        f"Snapshots: {archive['fetches']} fetches, {archive['objects']}"
+        f" unique fragments, {archive['raw'] / 2**20:.1f} MB raw,"
+        f" {archive['stored'] / 2**20:.1f} MB stored"
+        f" ({archive['ratio']:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""SQLite store for scraped data. One row per symbol, date, page and field
+so a daily scrape is an append instead of rewriting every JSON file"""
+import argparse
+import json
+import sqlite3
+from pathlib import Path
+
+import pandas as pd
+from rich import print
+
+DB_PATH = Path("stock_data", "stocks.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    symbol TEXT NOT NULL,
+    date TEXT NOT NULL,
+    page TEXT NOT NULL,
+    field TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (symbol, page, date, field)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS observations_by_date
+    ON observations (page, date, symbol);
+CREATE TABLE IF NOT EXISTS numbers (
+    symbol TEXT NOT NULL,
+    page TEXT NOT NULL,
+    date TEXT NOT NULL,
+    field TEXT NOT NULL,
+    value REAL,
+    unit TEXT NOT NULL,
+    scale REAL NOT NULL,
+    is_null INTEGER NOT NULL,
+    PRIMARY KEY (symbol, page, date, field)
+) WITHOUT ROWID;
+"""
+
+# * pages saved by quarterly_data under the quarter date
+QUARTERLY_PAGES = ["stats", "income", "balance", "cash"]
+
+# * table scripts of the modules sharing the store, run when a path opens
+SCHEMAS = [SCHEMA]
+
+_connections = {}
+
+
+def register(schema):
+    """Add a module's tables to the store, created once when a path is
+    opened. Stores already open get them now"""
+    SCHEMAS.append(schema)
+    for conn in _connections.values():
+        conn.executescript(schema)
+
+
+def connect(path=DB_PATH) -> sqlite3.Connection:
+    """Open (once per run) and set up the store with every registered
+    table. Keyed by the absolute path, a run that changes folder gets the
+    store of the new one"""
+    path = Path(path).resolve()
+    if path not in _connections:
+        path.parent.mkdir(exist_ok=True, parents=True)
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        for schema in SCHEMAS:
+            conn.executescript(schema)
+        _connections[path] = conn
+    return _connections[path]
+
+
+def has_date(conn, symbol, page, day) -> bool:
+    """Check if a page is already saved for a symbol and date"""
+    row = conn.execute(
+        "SELECT 1 FROM observations"
+        " WHERE symbol = ? AND page = ? AND date = ? LIMIT 1",
+        (symbol, page, day),
+    ).fetchone()
+    return row is not None
+
+
+def has_page(conn, symbol, page) -> bool:
+    """Check if a page was ever saved for a symbol"""
+    row = conn.execute(
+        "SELECT 1 FROM observations WHERE symbol = ? AND page = ? LIMIT 1",
+        (symbol, page),
+    ).fetchone()
+    return row is not None
+
+
+def page_dates(conn, symbol, page) -> list:
+    """Dates saved for a symbol and page, newest first"""
+    rows = conn.execute(
+        "SELECT DISTINCT date FROM observations"
+        " WHERE symbol = ? AND page = ? ORDER BY date DESC",
+        (symbol, page),
+    )
+    return [row[0] for row in rows]
+
+
+def pages(conn) -> list:
+    """Page types in the store, one seek on the by-date index per page
+    instead of a scan of every row"""
+    return [
+        page
+        for (page,) in conn.execute(
+            "WITH RECURSIVE pages(page) AS ("
+            " SELECT MIN(page) FROM observations"
+            " UNION ALL SELECT (SELECT MIN(page) FROM observations"
+            "  WHERE page > pages.page) FROM pages WHERE page IS NOT NULL"
+            ") SELECT page FROM pages WHERE page IS NOT NULL"
+        )
+    ]
+
+
+def add_record(conn, symbol, day, page, record, commit=True) -> bool:
+    """Append one page of fields. False if (symbol, page, date) is saved"""
+    if has_date(conn, symbol, page, day):
+        return False
+
+    conn.executemany(
+        "INSERT OR IGNORE INTO observations VALUES (?, ?, ?, ?, ?)",
+        [
+            (symbol, day, page, field, value)
+            for field, value in record.items()
+        ],
+    )
+    if commit:
+        conn.commit()
+    return True
+
+
+def add_quarterly(conn, symbol, quarterly_data, commit=True) -> bool:
+    """Append the {quarter: [{stats, income, balance, cash}]} dict"""
+    added = False
+    for quarter, pages in quarterly_data.items():
+        for page in QUARTERLY_PAGES:
+            record = pages[0].get(page) or {}
+            added |= add_record(
+                conn, symbol, quarter, page, record, commit=False
+            )
+    if commit:
+        conn.commit()
+    return added
+
+
+def read_frame(conn, page, symbols=None, start=None, end=None):
+    """One page for many symbols and dates as a wide DataFrame, indexed by
+    (symbol, date) with a column per field"""
+    query = (
+        "SELECT symbol, date, field, value FROM observations WHERE page = ?"
+    )
+    params = [page]
+    if symbols:
+        query += f" AND symbol IN ({','.join('?' * len(symbols))})"
+        params.extend(symbols)
+    if start:
+        query += " AND date >= ?"
+        params.append(start)
+    if end:
+        query += " AND date <= ?"
+        params.append(end)
+
+    frame = pd.read_sql_query(query, conn, params=params)
+    return frame.pivot(
+        index=["symbol", "date"], columns="field", values="value"
+    )
+
+
+def migrate_stock(conn, folder):
+    """Copy one stock_data/<SYM> folder into the store"""
+    symbol = folder.name
+    stock_path = folder / f"{symbol}.json"
+    if stock_path.is_file():
+        results = json.loads(stock_path.read_text(encoding="utf-8"))
+        dates = [key for item in results for key in item if key != "company"]
+        for item in results:
+            for key, value in item.items():
+                if key == "company":
+                    # * profile is saved under the first scrape date
+                    page, day = "profile", min(dates)
+                else:
+                    page, day, value = "summary", key, value["summary"]
+                add_record(conn, symbol, day, page, value, commit=False)
+
+    quarterly_path = folder / "quarterly.json"
+    if quarterly_path.is_file():
+        results = json.loads(quarterly_path.read_text(encoding="utf-8"))
+        for quarterly in results[0]["quarterly"]:
+            add_quarterly(conn, symbol, quarterly, commit=False)
+
+    conn.commit()
+
+
+def migrate_json(conn, root=Path("stock_data")):
+    """One-shot copy of the JSON layout into the store"""
+    folders = sorted(path for path in Path(root).iterdir() if path.is_dir())
+    for folder in folders:
+        print(f"Migrating {folder.name}....")
+        migrate_stock(conn, folder)
+    print(f"Migrated {len(folders)} stocks")
+
+
+def main():
+    """main starting point of program"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("command", choices=["migrate"])
+    parser.add_argument("--root", default="stock_data")
+    parser.add_argument("--db", default=str(DB_PATH))
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        migrate_json(connect(args.db), args.root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+"""Tracing spans for the scrape hot path. Off unless TRACE_FILE or
+METRICS_FILE is set, then every span is a JSON line in TRACE_FILE and
+span latency histograms plus timeout, retry and cache hit counters are
+written to METRICS_FILE in Prometheus text format when the run ends
+(METRICS_PORT serves them on /metrics while it runs):
+
+    TRACE_FILE=trace.jsonl METRICS_FILE=scrape.prom python quarterly_data.py
+    python tracing.py slowest trace.jsonl
+"""
+import atexit
+import contextvars
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from rich import print
+
+TRACE_FILE = os.environ.get("TRACE_FILE")
+METRICS_FILE = os.environ.get("METRICS_FILE")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 0))
+
+# * seconds, goto and Sheets calls run long so the top buckets are wide
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# * attributes a span takes from its parent when it doesn't set its own
+INHERITED = ("symbol", "page")
+
+ENABLED = False
+
+_sink = None
+_lock = threading.Lock()
+_ids = itertools.count(1)
+_current = contextvars.ContextVar("span", default=None)
+# * (span, page) -> [bucket counts..., +Inf count, sum]
+_histograms = {}
+# * (span, outcome) -> count
+_outcomes = {}
+# * (event, page) -> count
+_events = {}
+
+
+class Span:
+    """One timed operation, written out when the block ends"""
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.outcome = None
+        self.parent = _current.get()
+        if self.parent is not None:
+            for key in INHERITED:
+                if key in self.parent.attributes:
+                    attributes.setdefault(key, self.parent.attributes[key])
+        # * parse workers count from 1 too, the pid keeps ids apart
+        self.id = f"{os.getpid()}-{next(_ids)}"
+
+    def set(self, outcome=None, **attributes):
+        """Add attributes, or an outcome other than ok/timeout/error"""
+        if outcome is not None:
+            self.outcome = outcome
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.token = _current.set(self)
+        self.started = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, kind, error, traceback):
+        seconds = time.perf_counter() - self.start
+        _current.reset(self.token)
+        if kind is not None:
+            self.outcome = "timeout" if "Timeout" in kind.__name__ else "error"
+        outcome = self.outcome or "ok"
+        observe(self.name, seconds, self.attributes.get("page"), outcome)
+        if _sink is not None:
+            line = json.dumps(
+                {
+                    "span": self.name,
+                    "id": self.id,
+                    "parent": self.parent and self.parent.id,
+                    "pid": os.getpid(),
+                    "start": round(self.started, 6),
+                    "seconds": round(seconds, 6),
+                    "outcome": outcome,
+                    **self.attributes,
+                },
+                default=str,
+            )
+            with _lock:
+                _sink.write(line + "\n")
+        return False
+
+
+class NoopSpan:
+    """Stands in for every span while tracing is off"""
+
+    def set(self, outcome=None, **attributes):
+        """Nothing to record"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, kind, error, traceback):
+        return False
+
+
+NOOP = NoopSpan()
+
+
+def span(name, **attributes):
+    """Context manager timing a block. symbol, page and bytes are the usual
+    attributes, symbol and page carry over to child spans"""
+    if not ENABLED:
+        return NOOP
+    return Span(name, attributes)
+
+
+def observe(name, seconds, page=None, outcome="ok"):
+    """Add a latency to the histograms, for steps timed somewhere else"""
+    if not ENABLED:
+        return
+    with _lock:
+        counts = _histograms.setdefault(
+            (name, page or ""), [0] * (len(BUCKETS) + 1) + [0.0]
+        )
+        for index, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                counts[index] += 1
+        counts[len(BUCKETS)] += 1
+        counts[-1] += seconds
+        key = (name, outcome)
+        _outcomes[key] = _outcomes.get(key, 0) + 1
+
+
+def count(event, page=None, amount=1):
+    """Bump an event counter: timeouts, retries, cache_hits"""
+    if not ENABLED:
+        return
+    with _lock:
+        key = (event, page or "")
+        _events[key] = _events.get(key, 0) + amount
+
+
+def drain() -> dict:
+    """Take the histograms and counters recorded so far, so a parse worker
+    can send them back to the main process"""
+    with _lock:
+        taken = {
+            "histograms": dict(_histograms),
+            "outcomes": dict(_outcomes),
+            "events": dict(_events),
+        }
+        _histograms.clear()
+        _outcomes.clear()
+        _events.clear()
+    return taken
+
+
+def merge(taken):
+    """Add histograms and counters drained in another process"""
+    if not ENABLED or not taken:
+        return
+    with _lock:
+        for key, counts in taken["histograms"].items():
+            totals = _histograms.setdefault(key, [0] * len(counts))
+            for index, value in enumerate(counts):
+                totals[index] += value
+        for key, total in taken["outcomes"].items():
+            _outcomes[key] = _outcomes.get(key, 0) + total
+        for key, total in taken["events"].items():
+            _events[key] = _events.get(key, 0) + total
+
+
+def labels(**pairs) -> str:
+    """Prometheus label set, empty values left out"""
+    text = ",".join(
+        f'{key}="{value}"' for key, value in pairs.items() if value != ""
+    )
+    return f"{{{text}}}" if text else ""
+
+
+def metrics_text() -> str:
+    """Everything counted so far in Prometheus text format"""
+    lines = [
+        "# HELP scraper_span_seconds Latency of traced spans",
+        "# TYPE scraper_span_seconds histogram",
+    ]
+    with _lock:
+        for (name, page), counts in sorted(_histograms.items()):
+            for bound, total in zip(BUCKETS + ("+Inf",), counts):
+                bucket = labels(span=name, page=page, le=bound)
+                lines.append(f"scraper_span_seconds_bucket{bucket} {total}")
+            series = labels(span=name, page=page)
+            lines.append(f"scraper_span_seconds_sum{series} {counts[-1]:.6f}")
+            lines.append(
+                f"scraper_span_seconds_count{series} {counts[len(BUCKETS)]}"
+            )
+
+        lines += [
+            "# HELP scraper_spans_total Finished spans by outcome",
+            "# TYPE scraper_spans_total counter",
+        ]
+        for (name, outcome), total in sorted(_outcomes.items()):
+            series = labels(span=name, outcome=outcome)
+            lines.append(f"scraper_spans_total{series} {total}")
+
+        lines += [
+            "# HELP scraper_events_total Timeouts, retries and cache hits",
+            "# TYPE scraper_events_total counter",
+        ]
+        for (event, page), total in sorted(_events.items()):
+            series = labels(event=event, page=page)
+            lines.append(f"scraper_events_total{series} {total}")
+
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path):
+    """Save the metrics for the node exporter textfile collector"""
+    path = Path(path)
+    temp = path.with_name(path.name + ".tmp")
+    temp.write_text(metrics_text(), encoding="utf-8")
+    # * the collector never sees a half written file
+    os.replace(temp, path)
+
+
+def serve_metrics(port):
+    """Serve /metrics from a background thread"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = metrics_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def enable(trace_file=None, metrics_file=None, metrics_port=0):
+    """Turn tracing on. Spans are only counted without a trace file"""
+    global ENABLED, _sink, METRICS_FILE
+
+    if trace_file:
+        # * line buffered append, parse workers write to the same file
+        _sink = open(trace_file, mode="a", encoding="utf-8", buffering=1)
+    METRICS_FILE = metrics_file
+    if metrics_port:
+        serve_metrics(metrics_port)
+    ENABLED = True
+
+
+def close():
+    """Write the metrics file and close the trace file"""
+    global ENABLED, _sink
+
+    if not ENABLED:
+        return
+    if METRICS_FILE:
+        write_metrics(METRICS_FILE)
+    if _sink is not None:
+        _sink.close()
+        _sink = None
+    ENABLED = False
+
+
+def slowest(path, top=10):
+    """Print the slowest symbols and the latency of each span"""
+    by_symbol = {}
+    by_span = {}
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            record = json.loads(line)
+            by_span.setdefault(record["span"], []).append(record["seconds"])
+            # * only root spans so nested time isn't counted twice
+            if record["parent"] is None and "symbol" in record:
+                by_symbol[record["symbol"]] = (
+                    by_symbol.get(record["symbol"], 0.0) + record["seconds"]
+                )
+
+    print(f"[bold]Slowest {top} symbols[/bold]")
+    ranked = sorted(by_symbol.items(), key=lambda item: -item[1])
+    for symbol, seconds in ranked[:top]:
+        print(f"  {symbol:>8}: {seconds:.2f}s")
+
+    print("[bold]Spans[/bold]")
+    for name, timings in sorted(
+        by_span.items(), key=lambda item: -sum(item[1])
+    ):
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(
+            f"  {name:>14}: {len(timings)} runs,"
+            f" p50 {timings[len(timings) // 2]:.3f}s, p95 {p95:.3f}s,"
+            f" total {sum(timings):.1f}s"
+        )
+
+
+def main():
+    """main starting point of program"""
+    if sys.argv[1:2] != ["slowest"] or len(sys.argv) < 3:
+        print("usage: python tracing.py slowest TRACE_FILE [TOP]")
+        return
+
+    slowest(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 10)
+
+
+# * parse workers add spans to the trace and hand their metrics back with
+# * each task's result, the parent owns the metrics file and port
+if multiprocessing.parent_process() is not None:
+    if TRACE_FILE or METRICS_FILE or METRICS_PORT:
+        enable(TRACE_FILE)
+elif TRACE_FILE or METRICS_FILE or METRICS_PORT:
+    enable(TRACE_FILE, METRICS_FILE, METRICS_PORT)
+    atexit.register(close)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""Shared work queue so several workers split one run of a scraper. Every
+worker fills the day's queue with the symbol list (only the first one
+adds rows), then leases symbols for a while, scrapes them and marks them
+done. A worker that dies or stalls loses its lease and the symbols go to
+whoever asks next. The queue is a table in stock_data/stocks.db, so the
+workers write to the same store. They must run on one host: SQLite's WAL
+mode needs shared memory and doesn't work over a network filesystem:
+
+    python work_queue.py summary|quarterly|historical [--worker NAME]
+    python work_queue.py status [JOB]
+"""
+import argparse
+import itertools
+import os
+import socket
+import time
+
+from rich import print
+
+import derived_series
+import historical_data
+import http_fetch
+import market_calendar
+import quarterly_data
+import quote_api
+import run_journal
+import scrap_yahoo_finance as yahoo
+import stock_store
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS work_queue (
+    queue TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    state TEXT NOT NULL,
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    PRIMARY KEY (queue, symbol)
+) WITHOUT ROWID;
+"""
+stock_store.register(SCHEMA)
+
+# * seconds a worker holds a symbol before others may take it over
+LEASE_TIMEOUT = 600
+# * a symbol that failed or lost its lease this often is given up on
+MAX_ATTEMPTS = 3
+# * seconds between checks while other workers still hold leases
+POLL = 1
+# * historical symbols leased at once, downloaded on the thread pool
+HISTORY_BATCH = 32
+
+# * job -> symbols of a run, the manifest drops the ones already saved
+JOBS = {
+    "summary": lambda: yahoo.plan(yahoo.STOCKS),
+    "quarterly": lambda: quarterly_data.plan(quarterly_data.STOCKS),
+    "historical": lambda: historical_data.SYMBOLS,
+}
+
+
+def connect():
+    """Store connection, the queue table comes with it"""
+    return stock_store.connect()
+
+
+def worker_name() -> str:
+    """Host and process id, unique across the workers of a run"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def fill(queue, symbols) -> int:
+    """Add the symbols not queued yet, returns how many were added"""
+    conn = connect()
+    added = conn.executemany(
+        "INSERT OR IGNORE INTO work_queue (queue, symbol, state)"
+        " VALUES (?, ?, 'ready')",
+        [(queue, symbol) for symbol in symbols],
+    ).rowcount
+    conn.commit()
+    return added
+
+
+def lease(queue, worker, count=1, timeout=LEASE_TIMEOUT) -> list:
+    """Lease up to count ready symbols, or ones whose lease ran out, fewest
+    attempts first. One UPDATE, so two workers never get the same one"""
+    now = time.time()
+    conn = connect()
+    conn.execute(
+        "UPDATE work_queue SET state = 'failed', error = 'lease expired'"
+        " WHERE queue = ? AND state = 'leased' AND lease_until < ?"
+        " AND attempts >= ?",
+        (queue, now, MAX_ATTEMPTS),
+    )
+    symbols = [
+        symbol
+        for (symbol,) in conn.execute(
+            "UPDATE work_queue SET state = 'leased', worker = ?,"
+            " lease_until = ?, attempts = attempts + 1"
+            " WHERE queue = ? AND symbol IN ("
+            "  SELECT symbol FROM work_queue WHERE queue = ?"
+            "  AND (state = 'ready'"
+            "   OR (state = 'leased' AND lease_until < ?))"
+            "  ORDER BY attempts, symbol LIMIT ?"
+            " ) RETURNING symbol",
+            (worker, now + timeout, queue, queue, now, count),
+        ).fetchall()
+    ]
+    conn.commit()
+    return sorted(symbols)
+
+
+def finish(queue, symbol, worker, error=None):
+    """Mark a leased symbol done, or ready again after an error until it
+    runs out of attempts. Either way a worker whose lease was taken over
+    leaves the new holder's lease alone"""
+    conn = connect()
+    if error is None:
+        conn.execute(
+            "UPDATE work_queue SET state = 'done', error = NULL"
+            " WHERE queue = ? AND symbol = ? AND state = 'leased'"
+            " AND worker = ?",
+            (queue, symbol, worker),
+        )
+    else:
+        conn.execute(
+            "UPDATE work_queue SET error = ?, state = CASE"
+            " WHEN attempts >= ? THEN 'failed' ELSE 'ready' END"
+            " WHERE queue = ? AND symbol = ? AND state = 'leased'"
+            " AND worker = ?",
+            (repr(error), MAX_ATTEMPTS, queue, symbol, worker),
+        )
+    conn.commit()
+
+
+def renew(queue, worker, timeout=LEASE_TIMEOUT):
+    """Start the lease of every symbol a worker still holds over, so a
+    batch leased at once doesn't run out while it waits its turn"""
+    conn = connect()
+    conn.execute(
+        "UPDATE work_queue SET lease_until = ?"
+        " WHERE queue = ? AND worker = ? AND state = 'leased'",
+        (time.time() + timeout, queue, worker),
+    )
+    conn.commit()
+
+
+def next_expiry(queue, worker):
+    """Seconds until another worker's lease runs out, None when no one
+    else holds a lease"""
+    (until,) = (
+        connect()
+        .execute(
+            "SELECT MIN(lease_until) FROM work_queue"
+            " WHERE queue = ? AND state = 'leased' AND worker != ?",
+            (queue, worker),
+        )
+        .fetchone()
+    )
+    return None if until is None else max(0.0, until - time.time())
+
+
+def batches(queue, worker, count=1, timeout=LEASE_TIMEOUT):
+    """Lists of symbols leased to a worker until the queue runs dry. While
+    others still hold leases it waits, and takes a straggler's symbols
+    over once its lease runs out"""
+    while True:
+        symbols = lease(queue, worker, count, timeout)
+        if symbols:
+            yield symbols
+            continue
+        wait = next_expiry(queue, worker)
+        if wait is None:
+            return
+        time.sleep(min(wait + 0.1, POLL))
+
+
+def consume(queue, worker, timeout=LEASE_TIMEOUT):
+    """Symbols leased one at a time, for the scrapers that take a stock
+    at a time"""
+    return itertools.chain.from_iterable(
+        batches(queue, worker, 1, timeout)
+    )
+
+
+def status(queue) -> dict:
+    """Symbols per state"""
+    return dict(
+        connect()
+        .execute(
+            "SELECT state, COUNT(*) FROM work_queue WHERE queue = ?"
+            " GROUP BY state",
+            (queue,),
+        )
+        .fetchall()
+    )
+
+
+def workers(queue) -> dict:
+    """Symbols done per worker"""
+    return dict(
+        connect()
+        .execute(
+            "SELECT worker, COUNT(*) FROM work_queue"
+            " WHERE queue = ? AND state = 'done' GROUP BY worker",
+            (queue,),
+        )
+        .fetchall()
+    )
+
+
+def work(job, worker, timeout=LEASE_TIMEOUT, threads=None):
+    """Take part in today's run of a job until its queue is drained"""
+    if job != "historical" and not market_calendar.is_trading_day():
+        print("Market closed today, nothing to scrape")
+        return
+
+    queue = run_journal.run_id(job)
+    added = fill(queue, JOBS[job]())
+    print(f"{worker} working on {queue}, {added} symbols queued")
+
+    def done(symbol, error):
+        """Hand a finished symbol back to the queue, the leases still held
+        start over"""
+        finish(queue, symbol, worker, error)
+        renew(queue, worker, timeout)
+
+    if job == "summary":
+        run = run_journal.start(job)
+        # * one lease per batch quote request
+        count = quote_api.BATCH_SIZE if yahoo.batched() else 1
+        leased = batches(queue, worker, count, timeout)
+        yahoo.scrape(itertools.chain.from_iterable(leased), run, done)
+    elif job == "quarterly":
+        run = run_journal.start(job)
+        quarterly_data.scrape(
+            consume(queue, worker, timeout=timeout), run, done
+        )
+    else:
+        download_history(queue, worker, timeout, threads)
+
+    print(f"{worker} finished, {queue}: {status(queue)}")
+
+
+def download_history(queue, worker, timeout, threads=None):
+    """historical_data on leased batches of symbols"""
+    threads = threads or historical_data.WORKERS
+    downloaded = []
+
+    def done(symbol, error):
+        """Hand a finished symbol back to the queue, the leases still held
+        start over"""
+        finish(queue, symbol, worker, error)
+        renew(queue, worker, timeout)
+        if error is None:
+            downloaded.append(symbol)
+
+    for leased in batches(
+        queue, worker, max(threads, HISTORY_BATCH), timeout
+    ):
+        historical_data.download_all(
+            leased, historical_data.START, workers=threads, done=done
+        )
+    http_fetch.close_client()
+    if historical_data.STORAGE == "ohlcv" and downloaded:
+        derived_series.update(downloaded)
+
+
+def main():
+    """main starting point of program"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("job", choices=[*JOBS, "status"])
+    parser.add_argument("status_job", nargs="?", default=None)
+    parser.add_argument("--worker", default=None)
+    parser.add_argument("--lease", type=float, default=LEASE_TIMEOUT)
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.job == "status":
+        for job in [args.status_job] if args.status_job else JOBS:
+            queue = run_journal.run_id(job)
+            print(f"{queue}: {status(queue)} done by {workers(queue)}")
+        return
+
+    work(args.job, args.worker or worker_name(), args.lease, args.threads)
+
+
+if __name__ == "__main__":
+    main()